@@ -0,0 +1,337 @@
+"""Read-only HTTP query API over the dashboard's prepared dataset.
+
+Serves the snapshot the dashboard shows (from the background refresher), so other
+tools can query it without running the Streamlit script:
+
+    GET /health                         refresh state and snapshot version
+    GET /filters?team=Team%20Kathy      filter options, narrowed like the dashboard filters
+    GET /summary?form=Form%201          summary aggregates of a selection
+    GET /students/<id or name>          a student's records, rankings and progress
+    GET /rows?period=2.1&limit=500      paginated rows of a selection
+
+Selections use the keys of filters.FILTER_COLUMNS (repeat a key for several values)
+plus marks_min / marks_max. /rows also takes offset, limit and a comma separated list
+of columns. Tables are returned as JSON, or as an Arrow IPC stream with ?format=arrow
+or "Accept: application/vnd.apache.arrow.stream". Every response except /health carries
+an ETag tied to the snapshot, so a request with a matching If-None-Match gets a 304
+until the data changes.
+
+Enable it next to the dashboard with [api] in secrets, or run it on its own:
+
+    python api.py --port 8502
+
+On its own it serves the snapshot the running dashboard persists ([refresh] cache_path)
+and never loads or refreshes the data itself.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from data_loader import subject_columns
+from filters import apply_filters, closed_partitions, filter_options, selection_from_params, summarize
+from frame_codec import export_table, table_to_ipc
+from identity import normalize_names
+from student_profiles import compute_progress, student_ids, student_progress
+
+logger = logging.getLogger(__name__)
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+
+class ApiError(Exception):
+    """A request that cannot be answered; status is the HTTP status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_selection(params):
+    """Filter selection from query parameters"""
+    try:
+        return selection_from_params(params)
+    except ValueError:
+        raise ApiError(400, "marks_min and marks_max must be finite numbers")
+
+def _int_param(params, name, default, maximum=None):
+    try:
+        value = int(params.get(name, [default])[0])
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if value < 0:
+        raise ApiError(400, f"{name} must not be negative")
+    return min(value, maximum) if maximum is not None else value
+
+def frame_records(df):
+    """JSON-ready list of row dicts; NaN becomes null"""
+    df = df.loc[:, ~df.columns.duplicated()]
+    return json.loads(df.to_json(orient="records", date_format="iso", default_handler=str))
+
+
+class QueryService:
+    """Answers API queries from the refresher's current snapshot"""
+
+    def __init__(self, refresher, subjects=subject_columns):
+        self.refresher = refresher
+        self.subjects = subjects
+        self._lock = threading.Lock()
+        # Closed history partitions read for the current snapshot, keyed by (version, partitions)
+        self._history_frames = {}
+
+    def snapshot(self):
+        snapshot = self.refresher.get_snapshot()
+        if snapshot is None:
+            raise ApiError(503, "Data is still loading")
+        return snapshot
+
+    @staticmethod
+    def etag(snapshot, path, fmt):
+        """Validator of one response: the same request against the same snapshot has the same ETag"""
+        digest = hashlib.sha1(f"{snapshot.version}|{snapshot.loaded_at}|{path}|{fmt}".encode()).hexdigest()
+        return f'"{digest[:24]}"'
+
+    def view(self, snapshot, selection):
+        """Prepared rows to filter, including closed history periods the selection asks for"""
+        dataset = snapshot.dataset
+        partitions = closed_partitions(dataset.history, selection)
+        if not partitions:
+            return dataset.df_main
+        key = (snapshot.version, partitions)
+        with self._lock:
+            frame = self._history_frames.get(key)
+        if frame is None:
+            frame = dataset.history.load(partitions)
+            with self._lock:
+                self._history_frames = {k: v for k, v in self._history_frames.items() if k[0] == snapshot.version}
+                self._history_frames[key] = frame
+        return pd.concat([dataset.df_main, frame], ignore_index=True)
+
+    # ---- Endpoints ----
+    def health(self, snapshot, params):
+        status = self.refresher.status()
+        return {key: status[key] for key in ["state", "version", "loaded_at", "snapshot_age_seconds", "last_error"]}
+
+    def filters(self, snapshot, params):
+        selection = parse_selection(params)
+        options = filter_options(snapshot.dataset.df_main, selection)
+        history = snapshot.dataset.history
+        if history is not None:
+            # Closed periods are not in memory but can still be selected, as on the dashboard
+            teams = [selection["team"]] if selection.get("team", "All") != "All" else None
+            options["period"] = sorted(set(options["period"]) | {period for _, period in history.closed_partitions(teams)})
+        return {"version": snapshot.version, "options": options}
+
+    def summary(self, snapshot, params):
+        selection = parse_selection(params)
+        filtered = apply_filters(self.view(snapshot, selection), selection)
+        return {"version": snapshot.version, "summary": summarize(filtered, self.subjects)}
+
+    @staticmethod
+    def find_student(df, name):
+        """Student ID of a name in any of its spellings; 404 when unknown, 409 when several students share it"""
+        matches = student_ids(df)[normalize_names(df["Student"]) == normalize_names(pd.Series([name])).iloc[0]]
+        matches = sorted(matches.dropna().unique())
+        if not matches:
+            raise ApiError(404, f"Unknown student: {name}")
+        if len(matches) > 1:
+            raise ApiError(409, f"Several students are named {name}; use a Student ID: {', '.join(matches)}")
+        return matches[0]
+
+    def student(self, snapshot, params, name):
+        dataset = snapshot.dataset
+        student_index = dataset.student_index
+        key = name.strip()
+        if key not in student_index:
+            key = self.find_student(dataset.df_main, name)
+        positions = student_index[key]
+        records = dataset.df_main.iloc[positions]
+        rankings = dataset.rankings.iloc[positions]
+        progress = student_progress(dataset.progress, key)
+        closed = dataset.history.load_student(key) if dataset.history is not None else pd.DataFrame()
+        if not closed.empty:
+            progress = student_progress(compute_progress(pd.concat([closed, records], ignore_index=True), self.subjects), key)
+        return {
+            "version": snapshot.version,
+            "student_id": key,
+            "student": str(records["Student"].iloc[-1]).strip(),
+            "records": records.join(rankings, rsuffix=" (rank)"),
+            "history": closed,
+            "progress": progress,
+        }
+
+    def rows(self, snapshot, params):
+        selection = parse_selection(params)
+        filtered = apply_filters(self.view(snapshot, selection), selection)
+        if "columns" in params:
+            columns = [col for col in ",".join(params["columns"]).split(",") if col]
+            unknown = [col for col in columns if col not in filtered.columns]
+            if unknown:
+                raise ApiError(400, f"Unknown columns: {', '.join(unknown)}")
+            filtered = filtered[columns]
+        offset = _int_param(params, "offset", 0)
+        limit = _int_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+        return {
+            "version": snapshot.version,
+            "total": len(filtered),
+            "offset": offset,
+            "limit": limit,
+            "rows": filtered.iloc[offset:offset + limit],
+        }
+
+    def route(self, path, params):
+        """Return (handler, extra args) for a request path"""
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["health"]:
+            return self.health, ()
+        if parts == ["filters"]:
+            return self.filters, ()
+        if parts == ["summary"]:
+            return self.summary, ()
+        if parts == ["rows"]:
+            return self.rows, ()
+        if len(parts) == 2 and parts[0] == "students" and parts[1]:
+            return self.student, (parts[1],)
+        raise ApiError(404, f"Unknown endpoint: {path}")
+
+
+# ---- HTTP ----
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    server_version = "StudentDashboardAPI/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        service = self.server.service
+        try:
+            accept = self.headers.get("Accept", "")
+            fmt = params.get("format", ["arrow" if ARROW_MIME in accept else "json"])[0]
+            if fmt not in ("json", "arrow"):
+                raise ApiError(400, "format must be json or arrow")
+            handler, args = service.route(url.path, params)
+            snapshot = service.snapshot()
+            # Health reports refresh state and snapshot age, which change without a new version
+            etag = service.etag(snapshot, self.path, fmt) if handler != service.health else None
+            if etag and etag in [tag.strip().removeprefix("W/") for tag in self.headers.get("If-None-Match", "").split(",")]:
+                self._send(304, None, None, etag)
+                return
+            result = handler(snapshot, params, *args)
+            if fmt == "arrow":
+                self._send_arrow(result, etag)
+            else:
+                self._send_json(200, result, etag)
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            logger.exception("API request %s failed", self.path)
+            self._send_json(500, {"error": str(e)})
+
+    def _send(self, status, body, content_type, etag=None, headers=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        if body is not None:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def _send_json(self, status, result, etag=None):
+        result = {
+            key: frame_records(value) if isinstance(value, pd.DataFrame) else value
+            for key, value in result.items()
+        }
+        self._send(status, json.dumps(result).encode(), "application/json", etag)
+
+    def _send_arrow(self, result, etag):
+        # The first table of a result is the payload; scalar fields travel as headers
+        tables = [key for key, value in result.items() if isinstance(value, pd.DataFrame)]
+        if not tables:
+            raise ApiError(406, "This endpoint is only available as JSON")
+        headers = {
+            f"X-{key.replace('_', '-').title()}": value for key, value in result.items()
+            if not isinstance(value, (pd.DataFrame, dict, list))
+        }
+        body = table_to_ipc(export_table(result[tables[0]]))
+        self._send(200, body, ARROW_MIME, etag, headers)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class ApiServer:
+    """The query API served from a daemon thread"""
+
+    def __init__(self, refresher, host="127.0.0.1", port=8502):
+        self.service = QueryService(refresher)
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Bind the port and start serving; raises OSError if the port is taken"""
+        self._server = ThreadingHTTPServer((self.host, self.port), ApiRequestHandler)
+        self._server.daemon_threads = True
+        self._server.service = self.service
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="query-api", daemon=True)
+        self._thread.start()
+        logger.info("Query API listening on %s", self.url)
+        return self
+
+    def join(self):
+        """Block until the server stops"""
+        self._thread.join()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main(argv=None):
+    from settings import DEFAULT_SECRETS_PATH, create_snapshot_reader, load_secrets
+
+    parser = argparse.ArgumentParser(description="Read-only query API for the student performance dataset")
+    parser.add_argument("--secrets", default=DEFAULT_SECRETS_PATH, help="path to secrets.toml")
+    parser.add_argument("--host", help="interface to bind (default from [api], else 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="port to listen on (default from [api], else 8502)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    secrets = load_secrets(args.secrets)
+    api_config = dict(secrets.get("api", {}))
+    # The dashboard owns the data; loading it here too would write the same cache files
+    reader = create_snapshot_reader(secrets)
+    if reader.get_snapshot() is None:
+        logger.warning("No snapshot at %s yet; answering 503 until the dashboard has loaded the data", reader.cache_path)
+    server = ApiServer(
+        reader,
+        host=args.host or api_config.get("host", "127.0.0.1"),
+        port=args.port or api_config.get("port", 8502),
+    ).start()
+    try:
+        server.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""Data loading and preparation for the Student Performance Analysis Dashboard.
+
+Everything in here is free of Streamlit calls so it can run both inside the
+script and from the background refresh worker.
+"""
+import fnmatch
+import io
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import sheet_parser
+from identity import ID_COLUMN, StudentRegistry
+from rankings import compute_rankings, earlier_positions, ranking_inputs, update_rankings
+from snapshot_store import diff_rows, drop_closed, group_index, group_revisions, match_rows, touched_rows
+from student_profiles import build_student_index, compute_progress, student_ids, student_name_mask, update_progress
+from validation import (
+    ANOMALY_COLUMNS, PROVENANCE_COLUMNS, QualityReport, add_provenance, dedupe_high_school,
+    unmatched_join_rows, validate_rows,
+)
+
+# Spellings of "not available" used in the workbooks, all meaning the student did not sit the paper
+NOT_APPEARED_VALUES = {
+    'NA': 'Not Appeared',
+    'N/A': 'Not Appeared',
+    'N.A': 'Not Appeared',
+    'n/a': 'Not Appeared',
+    'na': 'Not Appeared',
+    'n.a': 'Not Appeared',
+    'N.A.': 'Not Appeared',
+    'N/A/': 'Not Appeared'
+}
+
+subject_columns = [
+    "Maths", "English", "Kiswahili", "Chemistry", "Biology", "Physics", "CRE", "Geography",
+    "History", "Agriculture", "Business Studies", "French", "Computer studies", "Home Science",
+    "Woodwork"
+]
+
+# Prepared data handed to the dashboard; messages are (level, text) pairs to show the user.
+# With a history store, df_main only holds the open periods and history serves the rest.
+# rankings is aligned to df_main's index (see rankings.compute_rankings); student_index
+# and progress are the per-student lookups of student_profiles; quality is the
+# validation.QualityReport of this load. diff is the snapshot_store.SnapshotDiff from
+# the previous load (None on the first) and revisions the revision of every
+# Team/Period group, which only changes when the group's rows or rankings do.
+Dataset = namedtuple(
+    "Dataset",
+    ["df_main", "high_school_unique_students", "dropout_df", "messages", "history", "rankings",
+     "student_index", "progress", "quality", "diff", "revisions"],
+    defaults=[None, None, None, None, None, None, None],
+)
+
+# A team results workbook; revision is None when it is unknown (no per-file caching then)
+WorkbookEntry = namedtuple("WorkbookEntry", ["file_id", "name", "team", "revision"])
+
+# Parsed team workbooks keyed by (file_id, revision), shared by every refresh in this process
+_workbook_cache = {}
+_workbook_cache_lock = threading.Lock()
+
+
+class DataLoadError(Exception):
+    """Raised when no usable dataset can be built"""
+
+
+def read_workbook(file_content):
+    """Parse Excel bytes into a dict of sheet name -> DataFrame"""
+    return pd.read_excel(io.BytesIO(file_content), sheet_name=None, engine='openpyxl')
+
+
+# ---- Team Workbooks ----
+def team_name_from_file(file_name, names=None):
+    """Derive the team name from a workbook name, e.g. 'Team Kathy Results.xlsx' -> 'Team Kathy'"""
+    if names and file_name in names:
+        return names[file_name]
+    stem = os.path.splitext(file_name)[0]
+    stem = re.sub(r"\s*results?\s*$", "", stem, flags=re.IGNORECASE)
+    return stem.strip(" .-_") or stem
+
+def safe_revision(source, file_id):
+    """Revision of a file, or None if the source cannot tell (disables per-file caching)"""
+    try:
+        return source.revision(file_id)
+    except Exception:
+        return None
+
+def list_team_workbooks(source, file_ids, teams_config):
+    """List the team result workbooks to load.
+
+    With a configured `folder` every workbook in it matching `pattern` is one team;
+    otherwise fall back to the three configured team files.
+    """
+    teams_config = dict(teams_config or {})
+    pattern = teams_config.get("pattern", "*Results*.xlsx")
+    names = dict(teams_config.get("names", {}))
+    folder = teams_config.get("folder") or teams_config.get("folder_id")
+    if not folder:
+        return [
+            WorkbookEntry(file_ids[key], f"{team} Results", team, safe_revision(source, file_ids[key]))
+            for key, team in [("team_kathy", "Team Kathy"), ("team_kelly", "Team Kelly"), ("team_lissette", "Team Lissette")]
+        ]
+    return sorted(
+        (WorkbookEntry(f.file_id, f.name, team_name_from_file(f.name, names), f.revision)
+         for f in source.list_files(folder) if fnmatch.fnmatch(f.name, pattern)),
+        key=lambda entry: entry.name,
+    )
+
+def fetch_revisions(source, file_ids, teams_config=None):
+    """Fetch the current revision of every source file (metadata only, no download)"""
+    revisions = {}
+    for entry in list_team_workbooks(source, file_ids, teams_config):
+        revisions[entry.file_id] = entry.revision or source.revision(entry.file_id)
+    for key in ["high_school_data", "dropout_data"]:
+        if file_ids.get(key):
+            revisions[file_ids[key]] = source.revision(file_ids[key])
+    return revisions
+
+def clean_team_sheet(df, team):
+    """Tag a parsed sheet with its team and normalize "not available" markers (runs in pool workers)"""
+    df["Team Name"] = team
+    # Replace NA, N/A, and similar values with "Not Appeared" across all columns
+    return df.replace(NOT_APPEARED_VALUES)
+
+def parse_team_workbook(file_content, team, processes=None, file_name=None):
+    """Parse one team workbook into a list of per-sheet DataFrames tagged with the team and their source"""
+    sheets = sheet_parser.parse_workbook(file_content, clean_team_sheet, (team,), processes=processes)
+    return [add_provenance(df, file_name, sheet_name) for sheet_name, df in sheets.items()]
+
+def load_team_workbook(entry, fetch_fn, processes=None):
+    """Fetch and parse a workbook, reusing the parsed sheets while its revision is unchanged"""
+    key = (entry.file_id, entry.revision)
+    if entry.revision is not None:
+        with _workbook_cache_lock:
+            if key in _workbook_cache:
+                return _workbook_cache[key]
+    dfs = parse_team_workbook(fetch_fn(entry.file_id), entry.team, processes, entry.name)
+    if entry.revision is not None:
+        with _workbook_cache_lock:
+            _workbook_cache[key] = dfs
+    return dfs
+
+def load_team_workbooks(entries, fetch_fn, messages, max_workers=8, processes=None):
+    """Fetch all team workbooks concurrently with at most max_workers in flight.
+
+    Downloads overlap in threads; the CPU-bound parsing is spread over a pool of
+    `processes` worker processes (serial when 1 or when no pool can be started).
+    """
+    # Forget parsed workbooks that are no longer current
+    current = {(entry.file_id, entry.revision) for entry in entries}
+    with _workbook_cache_lock:
+        for key in [key for key in _workbook_cache if key not in current]:
+            del _workbook_cache[key]
+
+    dfs = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(entries) or 1))) as executor:
+        futures = [executor.submit(load_team_workbook, entry, fetch_fn, processes) for entry in entries]
+        # Collect in listing order so the concatenated data is deterministic
+        for entry, future in zip(entries, futures):
+            try:
+                team_dfs = future.result()
+                if team_dfs:
+                    dfs.extend(team_dfs)
+                else:
+                    messages.append(("warning", f"Could not load data for {entry.team}"))
+            except Exception as e:
+                messages.append(("error", f"Error loading {entry.team} data: {str(e)}"))
+    return dfs
+
+
+# ---- Load Data ----
+def assign_student_ids(df_main, high_school_df, registry):
+    """Add a shared Student ID to the team rows and the High School Data Sheet rows.
+
+    Summary rows and rows without a name get no ID.
+    """
+    frames = [df_main] if high_school_df is None else [df_main, high_school_df]
+    named = {i: frame[student_name_mask(frame["Student"])] for i, frame in enumerate(frames) if "Student" in frame.columns}
+    # Frames without a valid name leave no level to select in the resolved IDs
+    named = {i: rows for i, rows in named.items() if not rows.empty}
+    ids = registry.resolve(pd.concat(named)) if named else pd.Series(dtype="string")
+    for i, frame in enumerate(frames):
+        frame[ID_COLUMN] = ids.xs(i).reindex(frame.index) if i in named else pd.NA
+    return df_main, high_school_df
+
+def load_raw_data(source, file_ids, messages, teams_config=None, ingest_config=None, anomalies=None, identities=None):
+    """Load team results, high school data and dropout data from the data source.
+
+    Students are identified across all sheets with `identities` (a StudentRegistry)
+    and the High School Data Sheet is joined on Student ID. Anomalies of that join
+    are appended to `anomalies`.
+    """
+    anomalies = anomalies if anomalies is not None else []
+    identities = identities or StudentRegistry()
+    teams_config = dict(teams_config or {})
+    ingest_config = dict(ingest_config or {})
+    entries = list_team_workbooks(source, file_ids, teams_config)
+    dfs = load_team_workbooks(
+        entries, source.read, messages,
+        max_workers=teams_config.get("max_parallel", 8),
+        processes=ingest_config.get("processes"),
+    )
+
+    if not dfs:
+        raise DataLoadError("No team data could be loaded.")
+
+    df_main = pd.concat(dfs, ignore_index=True)
+
+    # Load High School Data Sheet (only if file ID is provided and not placeholder)
+    high_school_file_id = file_ids.get("high_school_data", "")
+    high_school_df = None
+    high_school_unique_students = None
+    if high_school_file_id:
+        try:
+            high_school_data = read_workbook(source.read(high_school_file_id))
+        except Exception as e:
+            messages.append(("error", f"Error downloading High School Data: {str(e)}"))
+            high_school_data = None
+        if high_school_data:
+            # Get the first sheet if multiple sheets exist
+            sheet_name, high_school_df = next(iter(high_school_data.items()))
+            high_school_df = high_school_df.rename(columns={"Name": "Student"})
+            # Also replace NA/N/A values in the high school data sheet
+            high_school_df = high_school_df.replace(NOT_APPEARED_VALUES)
+            high_school_df = add_provenance(high_school_df, "High School Data Sheet", sheet_name)
+        else:
+            messages.append(("warning", "Could not load High School Data Sheet"))
+    else:
+        messages.append(("info", "High School Data Sheet not configured - using team data only"))
+
+    df_main, high_school_df = assign_student_ids(df_main, high_school_df, identities)
+    if high_school_df is not None:
+        high_school_unique_students = high_school_df[ID_COLUMN].nunique()
+        high_school_df, duplicates = dedupe_high_school(high_school_df[high_school_df[ID_COLUMN].notna()])
+        anomalies.append(duplicates)
+        # The team spelling of the name is kept
+        df_main = df_main.merge(
+            high_school_df.drop(columns=PROVENANCE_COLUMNS + ["Student"]), how="left", on=ID_COLUMN, indicator="_high_school_match"
+        )
+        anomalies.append(unmatched_join_rows(df_main, df_main["_high_school_match"] == "both"))
+        df_main = df_main.drop(columns="_high_school_match")
+
+    # Load Dropout Data
+    dropout_file_id = file_ids.get("dropout_data", "")
+    dropout_df = None
+    if dropout_file_id:
+        try:
+            dropout_excel = read_workbook(source.read(dropout_file_id))
+        except Exception as e:
+            messages.append(("error", f"Error downloading Dropout Data: {str(e)}"))
+            dropout_excel = None
+        if dropout_excel:
+            # Use the first sheet
+            sheet_name = list(dropout_excel.keys())[0]
+            dropout_df = dropout_excel[sheet_name]
+
+    return df_main, high_school_unique_students, dropout_df
+
+
+# ---- Prepare Data ----
+GRADE_REMARKS = {
+    **dict.fromkeys(["B", "B+", "A-", "A"], "Exceeding Expectation"),
+    **dict.fromkeys(["C+", "B-"], "Meeting Expectation"),
+    **dict.fromkeys(["C", "C-", "D+", "D", "D-", "E"], "Below Expectation"),
+}
+
+def subject_scores(df):
+    """Numeric subject scores in 0-100; empty, "Not Appeared" and anything else become NaN"""
+    existing = [col for col in subject_columns if col in df.columns]
+    scores = df[existing].apply(pd.to_numeric, errors="coerce")
+    return scores.where((scores >= 0) & (scores <= 100))
+
+def all_subjects_empty(df):
+    """Rows where every subject is empty, NaN or "Not Appeared" (these are dropped)"""
+    existing = [col for col in subject_columns if col in df.columns]
+    text = df[existing].astype("string").apply(lambda col: col.str.strip())
+    has_data = (df[existing].notna() & text.ne("").fillna(False) & text.ne("Not Appeared").fillna(False)).any(axis=1)
+    return ~has_data
+
+def calculate_m_percentage(df):
+    """Overall percentage (M%) of each row from its valid subject scores, 0 when there are none"""
+    return subject_scores(df).mean(axis=1).round(2).fillna(0.0)
+
+def grade_to_remark(grades):
+    """Remark for each Mean Grade; grades outside GRADE_REMARKS are "Unknown" """
+    return grades.astype("string").str.strip().str.upper().map(GRADE_REMARKS).fillna("Unknown").astype(object)
+
+def prepare_data(df_main):
+    """Clean the merged data and add the derived M% and Remark columns"""
+    # ---- Clean up duplicate columns after merge ----
+    if "Form_x" in df_main.columns or "Form_y" in df_main.columns:
+        df_main["Form"] = df_main.get("Form_x", pd.Series(dtype=object)).combine_first(df_main.get("Form_y", pd.Series(dtype=object)))
+        df_main = df_main.drop(columns=[col for col in ["Form_x", "Form_y"] if col in df_main.columns])
+    if "School_x" in df_main.columns or "School_y" in df_main.columns:
+        df_main["School"] = df_main.get("School_x", pd.Series(dtype=object)).combine_first(df_main.get("School_y", pd.Series(dtype=object)))
+        df_main = df_main.drop(columns=[col for col in ["School_x", "School_y"] if col in df_main.columns])
+
+    # ---- Data Cleaning ----
+    if "School" in df_main.columns and "Student" in df_main.columns:
+        df_main = df_main[~(df_main["School"].isna() & df_main["Student"].isna())]
+        df_main = df_main[~((df_main["School"].astype(str).str.strip() == "") & (df_main["Student"].astype(str).str.strip() == ""))]
+    elif "Student" in df_main.columns:
+        df_main = df_main[~(df_main["Student"].isna())]
+        df_main = df_main[~(df_main["Student"].astype(str).str.strip() == "")]
+
+    df_main = df_main[~all_subjects_empty(df_main)].reset_index(drop=True)
+
+    # ---- Calculate M% (Overall Percentage) from Subject Scores ----
+    df_main["M%"] = calculate_m_percentage(df_main)
+
+    # ---- Add Remark Column Based on Mean Grade ----
+    if "Mean Grade" in df_main.columns:
+        df_main["Remark"] = grade_to_remark(df_main["Mean Grade"])
+
+    return df_main
+
+def prepare_dropouts(dropout_df):
+    """Tidy the dropout sheet into Student Name / Dropout Period / Reason rows"""
+    df = dropout_df.copy()
+    # Try to fix columns if they are misaligned due to extra header rows
+    # Find the row where 'Student Name' appears and use it as header
+    header_row_idx = None
+    for idx, row in df.iterrows():
+        if 'Student Name' in row.values and 'Dropout Period' in row.values and 'Reason' in row.values:
+            header_row_idx = idx
+            break
+    if header_row_idx is not None:
+        df.columns = df.iloc[header_row_idx]
+        df = df.iloc[header_row_idx+1:]
+        df = df.reset_index(drop=True)
+    # Only keep the needed columns
+    needed_cols = ["Student Name", "Dropout Period", "Reason"]
+    df = df[[col for col in needed_cols if col in df.columns]]
+    # Remove rows where Student Name or Reason is empty or None
+    df = df[df["Student Name"].astype(str).str.strip() != ""]
+    df = df[df["Reason"].astype(str).str.strip() != ""]
+    # Format Dropout Period if needed (e.g., show as 'Aug-25')
+    if "Dropout Period" in df.columns:
+        df["Dropout Period"] = pd.to_datetime(df["Dropout Period"], errors='coerce').dt.strftime('%b-%y')
+    return df
+
+def closed_baseline(history):
+    """Class positions in the latest closed period of each team (see rankings.earlier_positions),
+    from which the oldest open period's rank changes are computed"""
+    closed = history.closed_partitions()
+    latest = set(dict(closed).values())
+    partitions = [(team, period) for team, period in closed if period in latest]
+    frame = history.load(partitions) if partitions else pd.DataFrame()
+    return earlier_positions(frame, subject_columns) if not frame.empty else None
+
+def derive_dataset(df_main, previous=None, history=None):
+    """Rankings, progress, diff and group revisions of prepared rows.
+
+    With the previous Dataset they are updated from its results: only the school
+    cohorts and students the diff touched are recomputed. With a history store, rank
+    changes of the oldest open period count from the latest closed one.
+    """
+    earlier = closed_baseline(history) if history is not None else None
+    diff = positions = None
+    if previous is not None and previous.df_main is not None:
+        positions = match_rows(previous.df_main, df_main)
+        diff = diff_rows(previous.df_main, df_main, positions)
+    if diff is None or set(previous.df_main.columns) != set(df_main.columns):
+        rankings = compute_rankings(df_main, subject_columns, earlier)
+        progress = compute_progress(df_main, subject_columns)
+        touched = group_index(df_main)
+    else:
+        rankings, reranked = update_rankings(
+            previous.rankings, df_main, positions, touched_rows(diff, ranking_inputs(subject_columns)),
+            subject_columns, earlier,
+        )
+        students = student_ids(touched_rows(diff, [ID_COLUMN, "Student", "Period", "M%"] + subject_columns)).dropna()
+        progress = update_progress(previous.progress, df_main, students, subject_columns)
+        touched = group_index(touched_rows(diff)).append(group_index(df_main[reranked.to_numpy()]))
+    revisions = group_revisions(previous.revisions if previous is not None else None, df_main, touched)
+    if diff is not None and history is not None:
+        diff = drop_closed(diff, history.closed_partitions())
+    return rankings, progress, diff, revisions
+
+def load_dataset(source, file_ids, teams_config=None, ingest_config=None, history=None, identities=None, previous=None):
+    """Fetch and prepare the full dataset; safe to call from a worker thread.
+
+    With a HistoryStore only new or changed Team/Period partitions are prepared.
+    identities is the StudentRegistry that assigns Student IDs (IDs are not
+    remembered between loads without one). previous is the Dataset of the last load,
+    whose rankings and progress are updated rather than recomputed.
+    """
+    try:
+        source.connect()
+    except Exception as e:
+        raise DataLoadError(f"Cannot connect to {source.label}. Please check your data source configuration. ({str(e)})")
+    messages = []
+    anomalies = []
+    df_main, high_school_unique_students, dropout_df = load_raw_data(
+        source, file_ids, messages, teams_config, ingest_config, anomalies, identities
+    )
+    df_main, row_anomalies, quarantined = validate_rows(df_main, subject_columns)
+    anomalies = pd.concat([frame for frame in anomalies + [row_anomalies] if not frame.empty] or [row_anomalies], ignore_index=True)
+    quality = QualityReport(anomalies[ANOMALY_COLUMNS], quarantined)
+    if len(anomalies):
+        messages.append(("info", f"Data quality: {len(anomalies)} issues found at ingest, {len(quarantined)} rows quarantined. See the Data Quality tab."))
+    if history is not None:
+        df_main = history.sync(df_main, prepare_data, messages)
+    else:
+        df_main = prepare_data(df_main)
+    rankings, progress, diff, revisions = derive_dataset(df_main, previous, history)
+    return Dataset(
+        df_main, high_school_unique_students, dropout_df, messages, history, rankings,
+        build_student_index(df_main), progress, quality, diff, revisions,
+    )
@@ -0,0 +1,217 @@
+"""Pluggable sources for the workbooks the dashboard is built from.
+
+Every backend offers the same small API: bulk listing of a folder, a cheap revision
+(etag) check per file, and streaming reads. The backend is chosen in config:
+
+    [data_source]
+    backend = "drive"   # "drive", "local" or "s3"
+"""
+import io
+import os
+import threading
+from collections import namedtuple
+
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseDownload
+
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+CHUNK_SIZE = 1024 * 1024
+
+# A file in a source; revision changes whenever the content changes
+SourceFile = namedtuple("SourceFile", ["file_id", "name", "revision"])
+
+
+class DataSource:
+    """Base class for workbook sources"""
+    label = "data source"
+
+    def connect(self):
+        """Fail early if the source cannot be reached"""
+
+    def list_files(self, folder):
+        """List the files directly inside a folder as SourceFile tuples"""
+        raise NotImplementedError
+
+    def revision(self, file_id):
+        """Return the current revision of one file without downloading it"""
+        raise NotImplementedError
+
+    def open(self, file_id):
+        """Yield the content of a file as a stream of byte chunks"""
+        raise NotImplementedError
+
+    def read(self, file_id):
+        """Return the full content of a file as bytes"""
+        return b"".join(self.open(file_id))
+
+
+# ---- Google Drive ----
+def build_drive_service(credentials_info):
+    """Build a Google Drive client from service account credentials"""
+    credentials = Credentials.from_service_account_info(
+        dict(credentials_info),
+        scopes=DRIVE_SCOPES
+    )
+    return build('drive', 'v3', credentials=credentials)
+
+
+class DriveSource(DataSource):
+    """Files in Google Drive, addressed by file ID; folders are Drive folder IDs"""
+    label = "Google Drive"
+
+    def __init__(self, credentials_info):
+        self.credentials_info = dict(credentials_info)
+        # httplib2 is not thread-safe, so each thread gets its own client
+        self._local = threading.local()
+
+    @property
+    def service(self):
+        if getattr(self._local, "service", None) is None:
+            self._local.service = build_drive_service(self.credentials_info)
+        return self._local.service
+
+    def connect(self):
+        return self.service
+
+    def list_files(self, folder):
+        files = []
+        page_token = None
+        while True:
+            response = self.service.files().list(
+                q=f"'{folder}' in parents and trashed = false",
+                fields="nextPageToken, files(id, name, md5Checksum, modifiedTime)",
+                pageSize=1000,
+                pageToken=page_token,
+            ).execute()
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return [SourceFile(f["id"], f["name"], f.get("md5Checksum") or f.get("modifiedTime")) for f in files]
+
+    def revision(self, file_id):
+        meta = self.service.files().get(fileId=file_id, fields="md5Checksum,modifiedTime").execute()
+        return meta.get("md5Checksum") or meta.get("modifiedTime")
+
+    def open(self, file_id):
+        request = self.service.files().get_media(fileId=file_id)
+        file_io = io.BytesIO()
+        downloader = MediaIoBaseDownload(file_io, request, chunksize=CHUNK_SIZE)
+        done = False
+        while done is False:
+            status, done = downloader.next_chunk()
+            yield file_io.getvalue()
+            file_io.seek(0)
+            file_io.truncate()
+
+
+# ---- Local Directory ----
+class LocalDirectorySource(DataSource):
+    """Files under a local directory (e.g. a mirror of the Drive folder), addressed by relative path"""
+    label = "local directory"
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, file_id):
+        path = os.path.abspath(os.path.join(self.root, file_id))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"{file_id} is outside {self.root}")
+        return path
+
+    @staticmethod
+    def _revision(stat):
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def connect(self):
+        if not os.path.isdir(self.root):
+            raise FileNotFoundError(f"{self.root} does not exist")
+
+    def list_files(self, folder):
+        files = []
+        for entry in os.scandir(self._path(folder or ".")):
+            if entry.is_file():
+                file_id = os.path.relpath(entry.path, self.root)
+                files.append(SourceFile(file_id, entry.name, self._revision(entry.stat())))
+        return files
+
+    def revision(self, file_id):
+        return self._revision(os.stat(self._path(file_id)))
+
+    def open(self, file_id):
+        with open(self._path(file_id), "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+
+# ---- S3-Compatible Object Store ----
+class ObjectStoreSource(DataSource):
+    """Objects in an S3-compatible bucket (AWS S3, or a local stand-in such as MinIO), addressed by key"""
+    label = "object store"
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region_name=None,
+                 aws_access_key_id=None, aws_secret_access_key=None):
+        try:
+            import boto3
+        except ImportError:
+            raise ImportError("The s3 data source needs boto3: pip install boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+        )
+
+    def _key(self, file_id):
+        return f"{self.prefix}/{file_id}" if self.prefix else file_id
+
+    def connect(self):
+        self.client.head_bucket(Bucket=self.bucket)
+
+    def list_files(self, folder):
+        folder_prefix = self._key(folder.strip("/")) + "/" if folder else (f"{self.prefix}/" if self.prefix else "")
+        files = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=folder_prefix, Delimiter="/"):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                file_id = key[len(self.prefix) + 1:] if self.prefix else key
+                files.append(SourceFile(file_id, key.rsplit("/", 1)[-1], obj["ETag"].strip('"')))
+        return [f for f in files if f.name]
+
+    def revision(self, file_id):
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(file_id))["ETag"].strip('"')
+
+    def open(self, file_id):
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(file_id))["Body"]
+        try:
+            for chunk in body.iter_chunks(CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+
+def create_source(config, credentials_info=None):
+    """Create the data source selected by the [data_source] config section"""
+    config = dict(config or {})
+    backend = config.get("backend", "drive")
+    if backend == "drive":
+        return DriveSource(credentials_info)
+    if backend == "local":
+        return LocalDirectorySource(config["root"])
+    if backend == "s3":
+        return ObjectStoreSource(
+            config["bucket"],
+            prefix=config.get("prefix", ""),
+            endpoint_url=config.get("endpoint_url"),
+            region_name=config.get("region_name"),
+            aws_access_key_id=config.get("aws_access_key_id"),
+            aws_secret_access_key=config.get("aws_secret_access_key"),
+        )
+    raise ValueError(f"Unknown data source backend: {backend}")
@@ -0,0 +1,139 @@
+"""Batch at-risk early-warning scoring.
+
+Every student is scored in one vectorized pass over the prepared dataset from four
+signals: the slope of M% across periods, the number of subjects below the pass mark
+in the latest period, how often subjects are "Not Appeared", and proximity to the
+dropout list (being on it, or the share of classmates who are).
+"""
+import numpy as np
+import pandas as pd
+
+from identity import ID_COLUMN, normalize_names
+from rankings import period_numbers
+from student_profiles import student_ids, student_name_mask
+
+DEFAULT_THRESHOLDS = {
+    "below_score": 60,          # a subject score below this counts against the student
+    "decline_per_period": 5.0,  # an M% drop of this many points per period is maximum trend risk
+    "not_appeared_rate": 0.25,  # this share of "Not Appeared" subjects is maximum attendance risk
+    "high_risk": 0.6,           # risk score at or above this is "High"
+    "medium_risk": 0.35,        # risk score at or above this is "Medium"
+}
+
+DEFAULT_WEIGHTS = {
+    "trend": 0.35,
+    "below": 0.3,
+    "not_appeared": 0.15,
+    "dropout": 0.2,
+}
+
+
+def trend_slopes(students, periods, scores):
+    """Least-squares slope of score per period step for each student.
+
+    Periods are placed on an ordinal axis (1st, 2nd, ... period overall) and only the
+    last record per student and period is used, as in the progress trend.
+    """
+    frame = pd.DataFrame({"student": students, "period": periods, "score": scores})
+    frame = frame[frame["score"] > 0]
+    frame = (
+        frame.sort_values(["student", "period"], kind="stable")
+        .drop_duplicates(["student", "period"], keep="last")
+    )
+    frame["x"] = frame["period"].rank(method="dense")
+    frame["xy"] = frame["x"] * frame["score"]
+    frame["xx"] = frame["x"] * frame["x"]
+    sums = frame.groupby("student").agg(
+        n=("x", "size"), sx=("x", "sum"), sy=("score", "sum"), sxy=("xy", "sum"), sxx=("xx", "sum")
+    )
+    denominator = sums["n"] * sums["sxx"] - sums["sx"] ** 2
+    slope = (sums["n"] * sums["sxy"] - sums["sx"] * sums["sy"]) / denominator.where(denominator != 0)
+    return slope.where(sums["n"] > 1)
+
+def score_students(df, subjects, dropout_names=None, thresholds=None, weights=None, earlier=None):
+    """Score every student in df and return the at-risk table, highest risk first.
+
+    earlier holds rows of periods that are not in df (e.g. closed history periods);
+    they only count in the M% trend of students scored from df.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    if df.empty or "Student" not in df.columns:
+        return pd.DataFrame()
+
+    student = student_ids(df)
+    period = period_numbers(df["Period"]) if "Period" in df.columns else pd.Series(0.0, index=df.index)
+    m_score = pd.to_numeric(df["M%"], errors="coerce") if "M%" in df.columns else pd.Series(np.nan, index=df.index)
+
+    existing = [subject for subject in subjects if subject in df.columns]
+    raw = df[existing]
+    scores = raw.apply(pd.to_numeric, errors="coerce")
+    scores = scores.where((scores >= 0) & (scores <= 100))
+    not_appeared = raw.apply(lambda col: col.astype("string").str.strip().eq("Not Appeared")).fillna(False)
+    rows = pd.DataFrame({
+        "student": student,
+        "period": period,
+        "below": (scores < thresholds["below_score"]).sum(axis=1),
+        "scored": scores.notna().sum(axis=1),
+        "not_appeared": not_appeared.sum(axis=1),
+    }, index=df.index)
+    rows = rows[student_name_mask(df["Student"]) & student.notna()]
+
+    # Latest record of each student carries the descriptive columns and the below-threshold count
+    latest_index = rows.sort_values(["student", "period"], kind="stable").drop_duplicates("student", keep="last").index
+    info_cols = [col for col in ["Student", ID_COLUMN, "Team Name", "School", "Form", "Period", "M%"] if col in df.columns]
+    table = df.loc[latest_index, info_cols].rename(columns={"Period": "Latest Period", "M%": "Latest M%"})
+    table.index = rows.loc[latest_index, "student"].to_numpy()
+
+    latest = rows.loc[latest_index].set_index("student")
+    totals = rows.groupby("student")[["scored", "not_appeared"]].sum()
+    labels = df.loc[rows.index, "Period"] if "Period" in df.columns else pd.Series(pd.NA, index=rows.index)
+    trend = pd.DataFrame({"student": rows["student"], "period": labels, "score": m_score.loc[rows.index]})
+    if earlier is not None and not earlier.empty and {"Student", "Period", "M%"} <= set(earlier.columns):
+        earlier_trend = pd.DataFrame({
+            "student": student_ids(earlier),
+            "period": earlier["Period"],
+            "score": pd.to_numeric(earlier["M%"], errors="coerce"),
+        })
+        trend = pd.concat([earlier_trend[earlier_trend["student"].isin(table.index)], trend], ignore_index=True)
+    # Earlier and current periods are ordered together, so they share one axis
+    trend["period"] = period_numbers(trend["period"])
+    slope = trend_slopes(trend["student"], trend["period"], trend["score"]).reindex(table.index)
+    sat = totals["scored"] + totals["not_appeared"]
+    not_appeared_rate = (totals["not_appeared"] / sat.where(sat > 0)).fillna(0.0).reindex(table.index)
+    below_share = (latest["below"] / latest["scored"].where(latest["scored"] > 0)).fillna(0.0)
+
+    # Dropout proximity: 1 for students on the list under any of their spellings,
+    # otherwise the share of classmates on it
+    dropout_names = pd.Series([] if dropout_names is None else list(dropout_names), dtype="string")
+    dropout_set = set(normalize_names(dropout_names).dropna())
+    listed = normalize_names(df.loc[rows.index, "Student"]).isin(dropout_set)
+    on_list = listed.groupby(rows["student"]).any().reindex(table.index, fill_value=False).astype(bool)
+    peer_keys = [table[col].astype(str) for col in ["School", "Form"] if col in table.columns]
+    if peer_keys:
+        group_total = on_list.groupby(peer_keys).transform("sum")
+        group_size = on_list.groupby(peer_keys).transform("size")
+        peer_share = ((group_total - on_list) / (group_size - 1).where(group_size > 1)).fillna(0.0)
+    else:
+        peer_share = pd.Series(0.0, index=table.index)
+    proximity = peer_share.where(~on_list, 1.0)
+
+    components = pd.DataFrame({
+        "trend": (-slope / thresholds["decline_per_period"]).clip(0, 1).fillna(0.0),
+        "below": below_share.reindex(table.index).clip(0, 1),
+        "not_appeared": (not_appeared_rate / thresholds["not_appeared_rate"]).clip(0, 1),
+        "dropout": proximity,
+    })
+    weight = pd.Series(weights)[components.columns]
+    risk = (components * weight).sum(axis=1) / weight.sum()
+
+    table["M% Trend / Period"] = slope.round(1)
+    table[f"Subjects Below {thresholds['below_score']}%"] = latest["below"].reindex(table.index).astype(int)
+    table["Not Appeared %"] = (not_appeared_rate * 100).round(1)
+    table["On Dropout List"] = on_list
+    table["Classmates on Dropout List %"] = (peer_share * 100).round(1)
+    table["Risk Score"] = (risk * 100).round(1)
+    table["Risk Level"] = np.select(
+        [risk >= thresholds["high_risk"], risk >= thresholds["medium_risk"]], ["High", "Medium"], default="Low"
+    )
+    return table.sort_values("Risk Score", ascending=False).reset_index(drop=True)
@@ -0,0 +1,168 @@
+"""Filter selections shared by the dashboard and the query API.
+
+A selection is a dict keyed like FILTER_COLUMNS: "team" is a single team name ("All"
+or missing means every team) and the other keys are lists of values. "marks" is an
+optional (low, high) range on M%, (0, 100) by default as on the Overall Analysis view.
+In URLs a selection is written as query parameters: a key repeated for several
+values, and marks as marks_min / marks_max.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from student_profiles import student_ids
+
+# Filter keys in the order the dashboard cascades them
+FILTER_COLUMNS = {
+    "team": "Team Name",
+    "form": "Form",
+    "period": "Period",
+    "school": "School",
+    "grade": "Mean Grade",
+    "donor": "Donor",
+    "county": "Home County",
+}
+
+DEFAULT_MARKS = (0, 100)
+
+# The dashboard's Period filter takes at most this many periods
+MAX_PERIODS = 5
+
+# Query parameters of a selection, in the dashboard URL and the query API
+SELECTION_PARAMS = list(FILTER_COLUMNS) + ["marks_min", "marks_max"]
+
+
+def selected_values(selection, key):
+    """Selected values of one filter as strings; empty when the filter is not set"""
+    values = selection.get(key)
+    if values is None:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    return [str(value) for value in values if not (key == "team" and value == "All")]
+
+def canonical_selection(selection):
+    """Complete selection in one form for equal views: every key set, sorted unique strings,
+    at most MAX_PERIODS periods and marks as whole percents within 0-100"""
+    canonical = {"team": str(selection.get("team") or "All")}
+    for key in FILTER_COLUMNS:
+        if key != "team":
+            canonical[key] = sorted(set(selected_values(selection, key)))
+    canonical["period"] = canonical["period"][:MAX_PERIODS]
+    low, high = (min(max(int(round(value)), 0), 100) for value in selection.get("marks") or DEFAULT_MARKS)
+    canonical["marks"] = (min(low, high), max(low, high))
+    return canonical
+
+def selection_key(selection):
+    """Hashable form of the canonical selection, used as a cache key"""
+    return tuple(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in canonical_selection(selection).items()
+    )
+
+def selection_from_params(params):
+    """Selection from query parameters, each a list of values as parse_qs returns them.
+
+    Raises ValueError when marks_min or marks_max is not a finite number.
+    """
+    selection = {key: params[key] for key in FILTER_COLUMNS if key in params}
+    if "team" in selection:
+        selection["team"] = selection["team"][0]
+    if "marks_min" in params or "marks_max" in params:
+        marks = (float(params.get("marks_min", [0])[0]), float(params.get("marks_max", [100])[0]))
+        # "inf" and "nan" parse as floats but cannot be rounded to a whole percent
+        if not all(math.isfinite(value) for value in marks):
+            raise ValueError("marks_min and marks_max must be finite numbers")
+        selection["marks"] = marks
+    return selection
+
+def selection_to_params(selection):
+    """Query parameters of the canonical selection; filters at their default are left out"""
+    selection = canonical_selection(selection)
+    params = {"team": [selection["team"]]} if selection["team"] != "All" else {}
+    params.update((key, selection[key]) for key in FILTER_COLUMNS if key != "team" and selection[key])
+    if selection["marks"] != DEFAULT_MARKS:
+        params["marks_min"], params["marks_max"] = ([str(value)] for value in selection["marks"])
+    return params
+
+def filter_mask(df, selection, keys=None):
+    """Boolean mask of the rows matching the selection on the given filter keys (all by default)"""
+    mask = pd.Series(True, index=df.index)
+    for key in FILTER_COLUMNS if keys is None else keys:
+        values = selected_values(selection, key)
+        column = FILTER_COLUMNS[key]
+        if values and column in df.columns:
+            mask &= df[column].astype(str).isin(values)
+    return mask
+
+def apply_filters(df, selection):
+    """Rows of df matching a selection, including the M% range"""
+    mask = filter_mask(df, selection)
+    low, high = selection.get("marks") or DEFAULT_MARKS
+    if "M%" in df.columns:
+        mask &= (df["M%"] >= low) & (df["M%"] <= high)
+    return df[mask]
+
+def filter_options(df, selection):
+    """Available values of every filter, each narrowed by the filters before it"""
+    options = {}
+    keys = list(FILTER_COLUMNS)
+    for i, key in enumerate(keys):
+        column = FILTER_COLUMNS[key]
+        if column not in df.columns:
+            options[key] = []
+            continue
+        values = df.loc[filter_mask(df, selection, keys[:i]), column]
+        options[key] = sorted(str(value) for value in values.dropna().unique())
+    return options
+
+def closed_partitions(history, selection):
+    """Closed (team, period) partitions of the history store that a selection needs"""
+    periods = selected_values(selection, "period")
+    if history is None or not periods:
+        return ()
+    teams = selected_values(selection, "team") or None
+    return tuple(
+        (team, period) for team, period in history.closed_partitions(teams)
+        if period in periods
+    )
+
+def selection_revisions(revisions, selection):
+    """Revisions of the (team, period) groups a selection can show rows from, as a
+    hashable tuple; unchanged while no refresh touches those groups"""
+    teams = {value.strip() for value in selected_values(selection, "team")}
+    periods = {value.strip() for value in selected_values(selection, "period")}
+    return tuple(sorted(
+        (group, revision) for group, revision in revisions.items()
+        if (not teams or group[0] in teams) and (not periods or group[1] in periods)
+    ))
+
+def numeric_subjects(df, subjects):
+    """Copy of df with subject columns numeric ("Not Appeared" and other text become NaN)"""
+    df = df.copy()
+    for col in subjects:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].replace("Not Appeared", np.nan), errors='coerce')
+    return df
+
+def summarize(df, subjects):
+    """Summary aggregates of a filtered selection, as shown on the Overall Analysis view"""
+    numeric = numeric_subjects(df, subjects)
+    existing = [subject for subject in subjects if subject in numeric.columns]
+    summary = {
+        "records": len(df),
+        "students": int(student_ids(df).nunique()) if "Student" in df.columns else 0,
+        "schools": int(df["School"].nunique()) if "School" in df.columns else 0,
+        "average_m": float(df["M%"].mean()) if "M%" in df.columns and df["M%"].notna().any() else None,
+        "subject_averages": {
+            subject: round(float(value), 2) for subject, value in numeric[existing].mean().items() if pd.notna(value)
+        },
+        "remark_counts": {},
+        "grade_counts": {},
+    }
+    if "Remark" in df.columns:
+        summary["remark_counts"] = {str(k): int(v) for k, v in df["Remark"].value_counts().items()}
+    if "Mean Grade" in df.columns:
+        summary["grade_counts"] = {str(k): int(v) for k, v in df["Mean Grade"].value_counts().items()}
+    return summary
@@ -0,0 +1,64 @@
+"""Generated fixture workbooks and app secrets over them.
+
+Shared by the tests (tests/conftest.py) and the load test: a folder of team, High
+School Data Sheet and Dropouts workbooks, read through the local data source in
+place of Google Drive, with every cache kept in a work directory.
+"""
+import os
+import random
+
+import pandas as pd
+
+FIXTURE_FILES = {
+    "high_school_data": "High School Data Sheet.xlsx",
+    "dropout_data": "Dropouts.xlsx",
+}
+FIXTURE_SUBJECTS = [
+    "Maths", "English", "Kiswahili", "Chemistry", "Biology", "Physics", "CRE", "Geography",
+    "History", "Business Studies",
+]
+FIXTURE_GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "E"]
+
+
+def write_fixtures(root, teams=3, periods=3, students=60, seed=0):
+    """Write team, high school and dropout workbooks under root"""
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    roster = []
+    for t in range(teams):
+        team = f"Team {t + 1}"
+        with pd.ExcelWriter(os.path.join(root, f"{team} Results.xlsx")) as writer:
+            for p in range(periods):
+                period = f"{p // 2 + 1}.{p % 2 + 1}"
+                rows = []
+                for i in range(students):
+                    row = {"Student": f"{team} Student {i}", "School": f"School {i % 5}", "Form": f"Form {i % 4 + 1}", "Period": period}
+                    for subject in FIXTURE_SUBJECTS:
+                        row[subject] = rng.choice([rng.randint(20, 98)] * 8 + ["NA", ""])
+                    row["Mean Grade"] = rng.choice(FIXTURE_GRADES)
+                    rows.append(row)
+                pd.DataFrame(rows).to_excel(writer, sheet_name=f"P{period}", index=False)
+        roster += [(f"{team} Student {i}", f"School {i % 5}", f"Form {i % 4 + 1}") for i in range(students)]
+
+    pd.DataFrame([
+        {"Name": name, "Donor": rng.choice(["Donor A", "Donor B"]), "Home County": rng.choice(["Nairobi", "Kisumu", "Mombasa"]),
+         "School": school, "Form": form}
+        for name, school, form in roster
+    ]).to_excel(os.path.join(root, FIXTURE_FILES["high_school_data"]), index=False)
+    dropouts = [["Dropouts", None, None], ["Student Name", "Dropout Period", "Reason"]]
+    dropouts += [[name, "2025-08-01", "Fees"] for name, _, _ in rng.sample(roster, max(1, len(roster) // 50))]
+    pd.DataFrame(dropouts).to_excel(os.path.join(root, FIXTURE_FILES["dropout_data"]), index=False, header=False)
+
+def app_secrets(root, work_dir):
+    """Secrets of a load-test app: every *Results*.xlsx under root is a team, and caches stay out of the real .cache"""
+    file_ids = {key: name for key, name in FIXTURE_FILES.items() if os.path.exists(os.path.join(root, name))}
+    return {
+        "data_source": {"backend": "local", "root": root, "files": file_ids},
+        "teams": {"folder": ".", "pattern": "*Results*.xlsx"},
+        "ingest": {"processes": 1},
+        "refresh": {
+            "interval_seconds": 24 * 3600, "poll_seconds": 24 * 3600,
+            "cache_path": os.path.join(work_dir, "snapshot.pkl"), "versions_path": os.path.join(work_dir, "versions"),
+        },
+        "identity": {"path": os.path.join(work_dir, "student_ids.csv")},
+    }
@@ -0,0 +1,172 @@
+"""Lossless Arrow encoding of the workbook DataFrames.
+
+Excel columns often mix numbers with text such as "Not Appeared"; Arrow cannot hold
+those directly, so each mixed column is split into typed parts and rebuilt on decode.
+Frames Arrow cannot represent at all fall back to pickle.
+"""
+import json
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow ships with streamlit
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning "Arrow cannot hold this frame", which trigger the pickle fallback
+_ARROW_ERRORS = (TypeError, ValueError) + ((pa.ArrowException,) if pa is not None else ())
+
+
+def _value_kind(value):
+    """Classify a cell value: 'n' null, 's' string, 'i' integer, 'f' float, 'o' anything else"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "n"
+    if isinstance(value, str):
+        return "s"
+    if isinstance(value, (bool, np.bool_)):
+        return "o"
+    if isinstance(value, (int, np.integer)):
+        return "i"
+    if isinstance(value, (float, np.floating)):
+        return "f"
+    return "o"
+
+def frame_to_table(df):
+    """Convert a DataFrame to an Arrow table; raises TypeError if it cannot round-trip"""
+    arrays = {}
+    mixed = {}
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i].reset_index(drop=True)
+        key = f"c{i}"
+        if series.dtype != object:
+            arrays[key] = pa.array(series, from_pandas=True)
+            continue
+        kinds = series.map(_value_kind)
+        present = set(kinds.unique())
+        if "o" in present:
+            raise TypeError(f"column {df.columns[i]!r} holds values Arrow cannot round-trip")
+        mixed[key] = sorted(present - {"n"})
+        arrays[f"{key}:k"] = pa.array(kinds.to_numpy(dtype=str))
+        arrays[f"{key}:s"] = pa.array(series.where(kinds == "s"), type=pa.string(), from_pandas=True)
+        arrays[f"{key}:i"] = pa.array(series.where(kinds == "i"), type=pa.int64(), from_pandas=True)
+        arrays[f"{key}:f"] = pa.array(series.where(kinds == "f"), type=pa.float64(), from_pandas=True)
+    table = pa.table(arrays) if arrays else pa.table({"__rows": pa.nulls(len(df))})
+    return table.replace_schema_metadata({
+        "columns": pickle.dumps(list(df.columns)),
+        "mixed": json.dumps(mixed),
+    })
+
+def table_to_frame(table):
+    """Rebuild the DataFrame encoded by frame_to_table"""
+    metadata = table.schema.metadata
+    columns = pickle.loads(metadata[b"columns"])
+    mixed = json.loads(metadata[b"mixed"])
+    data = {}
+    for i in range(len(columns)):
+        key = f"c{i}"
+        if key not in mixed:
+            data[i] = table.column(key).to_pandas()
+            continue
+        kinds = table.column(f"{key}:k").to_numpy(zero_copy_only=False)
+        values = np.full(table.num_rows, np.nan, dtype=object)
+        for kind in mixed[key]:
+            mask = kinds == kind
+            # integer_object_nulls keeps integers as ints instead of upcasting to float
+            part = table.column(f"{key}:{kind}").to_pandas(integer_object_nulls=True)
+            values[mask] = part.to_numpy(dtype=object)[mask]
+        data[i] = pd.Series(values, dtype=object)
+    df = pd.DataFrame(data, index=pd.RangeIndex(table.num_rows))
+    df.columns = columns
+    return df
+
+
+# ---- IPC Buffers ----
+def encode_frame(df):
+    """Serialize a DataFrame as ("arrow", ipc_bytes), falling back to ("pickle", bytes)"""
+    if pa is None:
+        return "pickle", pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        return "arrow", table_to_ipc(frame_to_table(df))
+    except _ARROW_ERRORS as e:
+        logger.debug("Falling back to pickle for frame: %s", e)
+        return "pickle", pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode_frame(encoded):
+    """Rebuild a DataFrame produced by encode_frame"""
+    fmt, payload = encoded
+    if fmt == "pickle":
+        return pickle.loads(payload)
+    return table_to_frame(pa.ipc.open_stream(payload).read_all())
+
+
+# ---- Files ----
+def write_frame(df, path_stem):
+    """Write a DataFrame to `<path_stem>.parquet` (or `.pkl` if Arrow cannot hold it), atomically"""
+    os.makedirs(os.path.dirname(path_stem) or ".", exist_ok=True)
+    try:
+        if pq is None:
+            raise TypeError("pyarrow is not installed")
+        table = frame_to_table(df)
+        path = f"{path_stem}.parquet"
+        pq.write_table(table, f"{path}.tmp")
+        stale = f"{path_stem}.pkl"
+    except _ARROW_ERRORS as e:
+        logger.debug("Writing %s as pickle: %s", path_stem, e)
+        path = f"{path_stem}.pkl"
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        stale = f"{path_stem}.parquet"
+    os.replace(f"{path}.tmp", path)
+    if os.path.exists(stale):
+        os.remove(stale)
+    return path
+
+def read_frame(path_stem, columns=None, filters=None):
+    """Read a frame written by write_frame, keeping rows matching (column, op, value) filters"""
+    if os.path.exists(f"{path_stem}.parquet"):
+        table = pq.read_table(f"{path_stem}.parquet")
+        df = table_to_frame(table)
+    else:
+        with open(f"{path_stem}.pkl", "rb") as f:
+            df = pickle.load(f)
+    if filters:
+        for column, op, value in filters:
+            if column not in df.columns:
+                return df.iloc[0:0]
+            if op == "==":
+                df = df[df[column] == value]
+            elif op == "in":
+                df = df[df[column].isin(value)]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+    return df
+
+
+# ---- Export ----
+def export_table(df):
+    """Plain Arrow table for consumers outside the app; mixed number/text columns become text"""
+    arrays = []
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i].reset_index(drop=True)
+        try:
+            arrays.append(pa.array(series, from_pandas=True))
+        except _ARROW_ERRORS:
+            arrays.append(pa.array(series.astype("string"), from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+def table_to_ipc(table):
+    """Serialize an Arrow table as an IPC stream"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,201 @@
+"""Rolling multi-period history of the prepared dataset.
+
+The store keeps one partition per Team/Period under `root`:
+
+    root/manifest.json
+    root/Team=Team%20Kathy/Period=2.1/part.parquet
+
+Each refresh fingerprints the raw rows of every partition and only prepares and
+writes partitions that are new or changed. Only the most recent `open_periods`
+periods of each team stay open; older periods are closed, no longer take edits of
+their source rows (only changed Student IDs are applied to them), and are read back
+lazily when a filter or a student trend needs them.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from urllib.parse import quote
+
+import pandas as pd
+
+from frame_codec import read_frame, write_frame
+from identity import ID_COLUMN
+from rankings import period_sort_key
+from validation import PROVENANCE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+MISSING_PERIOD = ""
+
+
+def period_label(period):
+    """Canonical text form of a Period value, as used in filters and partition names"""
+    return MISSING_PERIOD if pd.isna(period) else str(period)
+
+def fingerprint(df):
+    """Content hash of a frame, independent of its index"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def source_fingerprint(rows):
+    """Fingerprint of a partition's source content: where rows sit in the sheet and their IDs do not count"""
+    return fingerprint(rows.drop(columns=PROVENANCE_COLUMNS + [ID_COLUMN], errors="ignore"))
+
+def id_fingerprint(rows):
+    """Fingerprint of the Student IDs assigned to a partition's rows"""
+    return fingerprint(rows[[ID_COLUMN]]) if ID_COLUMN in rows.columns else None
+
+
+class HistoryStore:
+    """Partitioned, append-mostly store of prepared rows keyed by (team, period)"""
+
+    def __init__(self, root, open_periods=2):
+        self.root = root
+        self.open_periods = open_periods
+        self._lock = threading.Lock()
+        # Prepared frames of open partitions, so unchanged ones are not re-read each refresh
+        self._open_frames = {}
+        # Closed (team, period) partitions as of the last sync, read from the manifest once
+        self._closed = None
+
+    def __getstate__(self):
+        # Snapshots are pickled to disk; the in-memory cache and lock are rebuilt on load
+        return {"root": self.root, "open_periods": self.open_periods}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"], state["open_periods"])
+
+    # ---- Manifest ----
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _key(team, period):
+        return f"{team}\t{period}"
+
+    def _partition_stem(self, team, period):
+        return os.path.join(self.root, f"Team={quote(team, safe='')}", f"Period={quote(period, safe='')}", "part")
+
+    # ---- Ingest ----
+    def sync(self, raw_df, prepare_fn, messages=None):
+        """Ingest raw rows and return the prepared rows of all open periods.
+
+        Only partitions whose raw content changed are passed through prepare_fn and
+        written; closed partitions are left untouched even if the source was edited.
+        """
+        messages = messages if messages is not None else []
+        with self._lock:
+            manifest = self.read_manifest()
+            labels = raw_df["Period"].map(period_label) if "Period" in raw_df.columns else pd.Series(MISSING_PERIOD, index=raw_df.index)
+            teams = raw_df["Team Name"].astype(str)
+            seen = set()
+            written = 0
+            for (team, period), rows in raw_df.groupby([teams, labels], sort=False):
+                key = self._key(team, period)
+                seen.add(key)
+                entry = manifest.get(key)
+                digest = source_fingerprint(rows)
+                ids = id_fingerprint(rows)
+                closed = bool(entry and entry.get("closed"))
+                if closed and entry["fingerprint"] != digest:
+                    messages.append(("warning", f"{team} period {period} is closed; edits to it were not ingested"))
+                    continue
+                # Unchanged rows are only prepared again when their Student IDs changed
+                # (e.g. a manual override); that applies to closed periods too
+                if entry and entry["fingerprint"] == digest and entry.get("ids") == ids:
+                    if not closed and key not in self._open_frames:
+                        self._open_frames[key] = read_frame(self._partition_stem(team, period))
+                    continue
+                prepared = prepare_fn(rows.reset_index(drop=True))
+                write_frame(prepared, self._partition_stem(team, period))
+                if not closed:
+                    self._open_frames[key] = prepared
+                manifest[key] = {
+                    "team": team, "period": period, "fingerprint": digest, "ids": ids,
+                    "rows": len(prepared), "closed": closed, "updated_at": time.time(),
+                }
+                written += 1
+
+            # Open partitions that vanished from the source are dropped; closed ones are history
+            for key in [key for key, entry in manifest.items() if key not in seen and not entry.get("closed")]:
+                entry = manifest.pop(key)
+                shutil.rmtree(os.path.dirname(self._partition_stem(entry["team"], entry["period"])), ignore_errors=True)
+                self._open_frames.pop(key, None)
+
+            self._close_old_periods(manifest)
+            self._write_manifest(manifest)
+            self._closed = self._closed_in(manifest)
+            logger.info("History sync: %d partitions written, %d open", written, len(self._open_frames))
+
+            frames = [self._open_frames[key] for key in sorted(self._open_frames)]
+            return pd.concat(frames, ignore_index=True) if frames else raw_df.iloc[0:0]
+
+    def _close_old_periods(self, manifest):
+        """Close every period except the latest open_periods of each team"""
+        by_team = {}
+        for key, entry in manifest.items():
+            if entry["period"] != MISSING_PERIOD:
+                by_team.setdefault(entry["team"], []).append((period_sort_key(entry["period"]), key))
+        for entries in by_team.values():
+            entries.sort()
+            for _, key in entries[:max(0, len(entries) - self.open_periods)]:
+                if not manifest[key].get("closed"):
+                    manifest[key]["closed"] = True
+                    self._open_frames.pop(key, None)
+
+    # ---- Lazy Reads ----
+    @staticmethod
+    def _closed_in(manifest):
+        return sorted(
+            ((entry["team"], entry["period"]) for entry in manifest.values() if entry.get("closed")),
+            key=lambda item: (item[0], period_sort_key(item[1])),
+        )
+
+    def closed_partitions(self, teams=None):
+        """(team, period) pairs of closed partitions, optionally limited to some teams.
+
+        The manifest is read on the first call only; sync keeps the list up to date.
+        """
+        if self._closed is None:
+            self._closed = self._closed_in(self.read_manifest())
+        return [(team, period) for team, period in self._closed if not teams or team in teams]
+
+    def load(self, partitions, filters=None):
+        """Read closed (team, period) partitions, optionally keeping only rows matching filters"""
+        frames = []
+        for team, period in partitions:
+            try:
+                frames.append(read_frame(self._partition_stem(team, period), filters=filters))
+            except FileNotFoundError:
+                logger.warning("History partition %s/%s is missing", team, period)
+        frames = [frame for frame in frames if not frame.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def load_student(self, student_id):
+        """All closed-period rows of one student"""
+        return self.load(self.closed_partitions(), filters=[(ID_COLUMN, "==", student_id)])
+
+    def load_students(self, student_ids):
+        """All closed-period rows of several students"""
+        return self.load(self.closed_partitions(), filters=[(ID_COLUMN, "in", list(student_ids))])
@@ -0,0 +1,294 @@
+"""Cross-team student identity resolution.
+
+The team workbooks and the High School Data Sheet spell the same learner in
+different ways ("Mary  Achieng", "mary achieng", "Achieng Mary", "Mary Achieng'").
+Every student row is given a stable Student ID:
+
+1. Names are normalized (case, accents, punctuation, spacing and word order), and
+   rows with the same normalized name in the same school and form are one student.
+   The same name in another form of the school is the same student too (a learner
+   moves up a form), unless both appear on the same sheet.
+2. Remaining spelling variants are matched within blocks of one school and form, so
+   only names that could be the same learner are ever compared. Two names are the
+   same student when their similarity reaches the threshold and they never appear
+   on the same sheet (a sheet lists each learner once).
+3. IDs already handed out are kept: the mapping is saved after every run and read
+   back on the next, and manual overrides always win.
+
+The mapping and the overrides are CSV files with Student, School, Form and Student ID
+columns; an override with an empty School or Form (or without a Form column) applies
+to the name in every school or form. Giving two names the same ID merges them, giving
+them different IDs splits them, including one name in two forms of a school.
+"""
+import difflib
+import hashlib
+import logging
+import os
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMN = "Student ID"
+
+# Columns of the saved mapping and of the overrides file
+IDENTITY_COLUMNS = ["Student", "School", "Form", ID_COLUMN]
+
+DEFAULT_THRESHOLD = 0.92
+
+
+def normalize_names(names):
+    """Matching form of student names: case, accents, punctuation, spacing and word order ignored"""
+    names = (
+        names.astype("string")
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .astype("string")
+        .str.casefold()
+        .str.replace(r"['`]+", "", regex=True)
+        .str.replace(r"[^\w\s]+", " ", regex=True)
+        .str.replace(r"[\s_]+", " ", regex=True)
+        .str.strip()
+    )
+    # Word order only has to be sorted once per distinct name
+    unique = names.dropna().unique()
+    return names.map(dict(zip(unique, (" ".join(sorted(name.split())) for name in unique))))
+
+def normalize_keys(values):
+    """Matching form of school and form names; missing values become an empty string"""
+    return (
+        values.astype("string").str.casefold()
+        .str.replace(r"\s+", " ", regex=True).str.strip()
+        .fillna("")
+    )
+
+def new_student_id(school, name, form=None):
+    """Deterministic ID of a newly seen student, from its normalized school and name
+    (and form, for a second student of that name in the school)"""
+    key = f"{school}|{name}" if form is None else f"{school}|{name}|{form}"
+    return "S" + hashlib.sha1(key.encode()).hexdigest()[:10].upper()
+
+def lookup(mapping, key):
+    """ID of a (school, form, name) key in a mapping, falling back to entries for any form or school"""
+    school, form, name = key
+    return mapping.get(key) or mapping.get((school, "", name)) or mapping.get(("", form, name)) or mapping.get(("", "", name))
+
+def similar(matcher, name, threshold):
+    """Whether name is at least threshold similar (difflib ratio) to the matcher's second sequence"""
+    matcher.set_seq1(name)
+    # The quick upper bounds rule out most pairs before the full comparison
+    return (
+        matcher.real_quick_ratio() >= threshold
+        and matcher.quick_ratio() >= threshold
+        and matcher.ratio() >= threshold
+    )
+
+
+class _Clusters:
+    """Union-find over student nodes that refuses merges contradicting the evidence"""
+
+    def __init__(self, sheets, pins):
+        self.parent = list(range(len(sheets)))
+        self.sheets = [set(node_sheets) for node_sheets in sheets]
+        self.pins = list(pins)
+
+    def find(self, node):
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    def can_merge(self, a, b):
+        """Whether a and b are separate clusters that no sheet lists together and whose IDs agree"""
+        a, b = self.find(a), self.find(b)
+        if a == b or self.sheets[a] & self.sheets[b]:
+            return False
+        return not (self.pins[a] and self.pins[b] and self.pins[a] != self.pins[b])
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if len(self.sheets[a]) < len(self.sheets[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.sheets[a] |= self.sheets[b]
+        self.pins[a] = self.pins[a] or self.pins[b]
+
+
+class StudentRegistry:
+    """Assigns stable Student IDs, remembering them in a CSV mapping at `path`.
+
+    Without a path the IDs are still deterministic, but variants merged in one run
+    are not remembered in the next.
+    """
+
+    def __init__(self, path=None, overrides_path=None, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.overrides_path = overrides_path
+        self.threshold = threshold
+
+    # ---- Mapping Files ----
+    @staticmethod
+    def _read_mapping(path):
+        """(school key, form key, name key) -> Student ID from a mapping or overrides CSV"""
+        if not path or not os.path.exists(path):
+            return {}
+        mapping = pd.read_csv(path, dtype=str, keep_default_na=False)
+        missing = [col for col in ["Student", ID_COLUMN] if col not in mapping.columns]
+        if missing:
+            logger.warning("Ignoring %s: missing columns %s", path, ", ".join(missing))
+            return {}
+        schools, forms = (
+            normalize_keys(mapping[col]) if col in mapping.columns else pd.Series("", index=mapping.index)
+            for col in ["School", "Form"]
+        )
+        names = normalize_names(mapping["Student"])
+        ids = mapping[ID_COLUMN].str.strip()
+        keep = names.notna() & (names != "") & (ids != "")
+        return dict(zip(zip(schools[keep], forms[keep], names[keep]), ids[keep]))
+
+    def known_ids(self):
+        return self._read_mapping(self.path)
+
+    def overrides(self):
+        return self._read_mapping(self.overrides_path)
+
+    def _save(self, nodes, previous):
+        """Write the mapping: this run's students plus earlier ones that did not appear in it"""
+        mapping = nodes[IDENTITY_COLUMNS]
+        seen = set(zip(nodes["school"], nodes["form"], nodes["name"]))
+        if previous is not None:
+            # Mappings from before forms were part of the key hold the name in any form
+            previous = previous.assign(Form=previous["Form"] if "Form" in previous.columns else "")
+            keys = zip(normalize_keys(previous["School"]), normalize_keys(previous["Form"]), normalize_names(previous["Student"]))
+            old = previous[[key not in seen for key in keys]]
+            mapping = pd.concat([mapping, old[IDENTITY_COLUMNS]], ignore_index=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        mapping.sort_values([ID_COLUMN, "Student"]).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+    # ---- Resolution ----
+    def resolve(self, records):
+        """Student ID of every row of records, aligned to its index.
+
+        records needs a Student column and may have School, Form and a sheet column
+        ("Source File"/"Source Sheet") telling which rows come from the same list.
+        Rows without a name get no ID.
+        """
+        index = records.index
+        frame = pd.DataFrame({
+            "name": normalize_names(records["Student"]),
+            "school": normalize_keys(records["School"]) if "School" in records.columns else "",
+            "form": normalize_keys(records["Form"]) if "Form" in records.columns else "",
+            "sheet": (
+                records["Source File"].astype(str) + "\t" + records["Source Sheet"].astype(str)
+                if {"Source File", "Source Sheet"} <= set(records.columns) else pd.NA
+            ),
+            "raw_name": records["Student"].astype("string").str.strip(),
+            "raw_school": records["School"].astype("string").str.strip() if "School" in records.columns else pd.NA,
+            "raw_form": records["Form"].astype("string").str.strip() if "Form" in records.columns else pd.NA,
+        }, index=index)
+        frame = frame[frame["name"].notna() & (frame["name"] != "")]
+        ids = pd.Series(pd.NA, index=index, dtype="string")
+        if frame.empty:
+            return ids
+
+        # A row without a school takes the school its name has everywhere else, when there is just one
+        with_school = frame.loc[frame["school"] != "", ["name", "school"]].drop_duplicates()
+        single_school = with_school.drop_duplicates("name", keep=False).set_index("name")["school"]
+        no_school = frame["school"] == ""
+        frame.loc[no_school, "school"] = frame.loc[no_school, "name"].map(single_school).fillna("")
+
+        # One node per normalized name within a school and form
+        frame["node"] = frame.groupby(["school", "form", "name"], sort=True).ngroup()
+        grouped = frame.groupby("node", sort=True)
+        nodes = grouped.agg(school=("school", "first"), form=("form", "first"), name=("name", "first"), rows=("name", "size"))
+        spellings = frame.groupby(["node", "raw_name"], sort=False).size().rename("count").reset_index()
+        spellings = spellings.sort_values(["count", "raw_name"], ascending=[False, True]).drop_duplicates("node")
+        nodes["Student"] = spellings.set_index("node")["raw_name"]
+        nodes["School"] = grouped["raw_school"].first()
+        nodes["Form"] = grouped["raw_form"].first()
+        sheets = [set() for _ in range(len(nodes))]
+        for node, sheet in frame[["node", "sheet"]].dropna().drop_duplicates().itertuples(index=False):
+            sheets[node].add(sheet)
+
+        overrides = self.overrides()
+        known = self.known_ids()
+        keys = list(zip(nodes["school"], nodes["form"], nodes["name"]))
+        override_ids = [lookup(overrides, key) for key in keys]
+        pins = [override or lookup(known, key) for override, key in zip(override_ids, keys)]
+        clusters = _Clusters(sheets, pins)
+
+        # Names pinned to the same ID are one student. Overrides always win; an ID from an
+        # earlier run is dropped when its students appear on the same sheet.
+        first_with_pin = {}
+        for node, pin in enumerate(pins):
+            first = first_with_pin.setdefault(pin, node) if pin else node
+            if first == node:
+                continue
+            if override_ids[node] or clusters.can_merge(first, node):
+                clusters.union(first, node)
+            else:
+                clusters.pins[node] = None
+
+        # The same name in other forms of the school, unless a sheet lists both
+        repeated = nodes[nodes.duplicated(["school", "name"], keep=False)]
+        for _, group in repeated.groupby(["school", "name"], sort=False):
+            members = [node for node in group.index if not override_ids[node]]
+            for i, node in enumerate(members):
+                for earlier in members[:i]:
+                    if clusters.can_merge(earlier, node):
+                        clusters.union(earlier, node)
+                        break
+
+        # Spelling variants, compared only within a school and form
+        compared = 0
+        names = nodes["name"].tolist()
+        blocks = frame[["school", "form", "node"]].drop_duplicates()
+        for _, block in blocks.groupby(["school", "form"], sort=False):
+            members = sorted(block["node"].unique(), key=lambda node: len(names[node]))
+            for i, a in enumerate(members):
+                if override_ids[a]:
+                    continue
+                matcher = difflib.SequenceMatcher(None, autojunk=False)
+                matcher.set_seq2(names[a])
+                for b in members[i + 1:]:
+                    # Sorted by length, so once the lengths alone rule out a match every later name does too
+                    if 2 * len(names[a]) < self.threshold * (len(names[a]) + len(names[b])):
+                        break
+                    if override_ids[b] or not clusters.can_merge(a, b):
+                        continue
+                    compared += 1
+                    if similar(matcher, names[b], self.threshold):
+                        clusters.union(a, b)
+
+        # Each cluster keeps its pinned ID, or gets one from its most common spelling
+        roots = pd.Series([clusters.find(node) for node in range(len(nodes))], index=nodes.index)
+        canonical = nodes.assign(root=roots).sort_values(["rows", "name"], ascending=[False, True]).drop_duplicates("root")
+        cluster_ids = {}
+        used = set(pin for pin in clusters.pins if pin)
+        for root, school, form, name in zip(canonical["root"], canonical["school"], canonical["form"], canonical["name"]):
+            student_id = clusters.pins[root]
+            if not student_id:
+                student_id = new_student_id(school, name)
+                if student_id in used:
+                    student_id = new_student_id(school, name, form)
+            used.add(student_id)
+            cluster_ids[root] = student_id
+        nodes[ID_COLUMN] = roots.map(cluster_ids)
+        logger.info(
+            "Identity resolution: %d names, %d students, %d comparisons",
+            len(nodes), nodes[ID_COLUMN].nunique(), compared,
+        )
+
+        if self.path:
+            previous = pd.read_csv(self.path, dtype=str, keep_default_na=False) if os.path.exists(self.path) else None
+            if previous is not None and not set(IDENTITY_COLUMNS) <= set(previous.columns):
+                previous = None
+            self._save(nodes, previous)
+
+        ids.loc[frame.index] = frame["node"].map(nodes[ID_COLUMN]).to_numpy()
+        return ids
@@ -0,0 +1,483 @@
+"""Concurrent-session load test of the dashboard.
+
+Starts the dashboard with `streamlit run` on local fixture workbooks and drives
+simulated users against that one server as headless clients: each session is a
+websocket connection speaking the browser's protocol, sending widget changes and
+waiting for the rerun to finish. The sessions share the server's caches and its
+interpreter, exactly as real users of one instance do, so the report shows how
+rerun latency, throughput and server memory grow with the number of concurrent
+sessions and where reruns start to queue.
+
+Every session replays a mix of what users do: open the dashboard, change team, add
+a period, open a student, search the detailed data and export it as CSV. Switching
+to the view a step needs is timed as a step of its own ("switch view"). Widgets in
+a fragment rerun only that fragment, as in the browser.
+
+    python loadtest.py --sessions 1,4,8 --iterations 3
+    python loadtest.py --output results.json --baseline last_release.json
+
+With --baseline the run fails (exit code 1) when the p95 latency of any session
+count regressed by more than --tolerance. Fixtures are generated in a temporary
+directory unless --data points at a folder of workbooks: every *Results*.xlsx is a
+team, plus the High School Data Sheet and Dropouts workbooks when present.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from fixture_workbooks import app_secrets, write_fixtures
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+
+# ---- Server ----
+def _toml_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_toml_value(item) for item in value) + "]"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    # JSON string escapes are valid in TOML basic strings
+    return json.dumps(str(value))
+
+def write_secrets(secrets, path, prefix=""):
+    """Write nested secrets as a secrets.toml file"""
+    lines = []
+    tables = []
+    for key, value in secrets.items():
+        if isinstance(value, dict):
+            tables.append((key, value))
+        else:
+            lines.append(f"{key} = {_toml_value(value)}")
+    text = "\n".join(lines) + "\n" if lines else ""
+    for key, value in tables:
+        name = f"{prefix}{key}"
+        text += f"\n[{name}]\n" + write_secrets(value, None, f"{name}.")
+    if path is None:
+        return text
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(secrets, work_dir, timeout=120):
+    """Run the dashboard with `streamlit run` from work_dir, whose .streamlit/secrets.toml holds secrets.
+
+    Returns (process, url) once the server answers its health check.
+    """
+    write_secrets(secrets, os.path.join(work_dir, ".streamlit", "secrets.toml"))
+    port = free_port()
+    log = open(os.path.join(work_dir, "server.log"), "w")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.port", str(port), "--server.address", "127.0.0.1", "--server.headless", "true",
+            "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false", "--logger.level", "error",
+        ],
+        cwd=work_dir, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {process.returncode}, see {log.name}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.read().strip() == b"ok":
+                    return process, url
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"streamlit did not start within {timeout} s, see {log.name}")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ---- Sessions ----
+class RemoteSession:
+    """One headless browser session of a running dashboard, over Streamlit's websocket protocol.
+
+    Keeps the widgets the server last sent (by widget id, with the fragment they
+    belong to) and the exceptions of the last rerun.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.timeout = timeout
+        self.query_string = ""
+        self.widgets = {}
+        self.values = {}
+        self.exceptions = []
+        self._connection = None
+        self._socket = None
+
+    def open(self):
+        """Connect and run the script, as loading the page does"""
+        from websockets.sync.client import connect
+
+        self._connection = contextlib.ExitStack()
+        self._socket = self._connection.enter_context(
+            connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout)
+        )
+        self.rerun()
+        return self
+
+    def close(self):
+        if self._socket is not None:
+            self._connection.close()
+            self._socket = None
+
+    def widget(self, kind, label):
+        """Latest proto of the first `kind` widget whose label starts with `label`, or None"""
+        return next(
+            (proto for widget_kind, proto, _ in self.widgets.values()
+             if widget_kind == kind and proto.label.startswith(label)),
+            None,
+        )
+
+    def value(self, proto, kind):
+        """A selection widget's current value: what this session sent, else what the server rendered"""
+        if proto.id in self.values:
+            return self.values[proto.id]
+        if kind == "multiselect":
+            return list(proto.raw_values) if proto.set_value else [proto.options[index] for index in proto.default]
+        return proto.raw_value if proto.set_value else (proto.options[proto.default] if proto.options else None)
+
+    def set(self, proto, **value):
+        """Change one widget (value given as its WidgetState field, e.g. string_value="x") and rerun"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=proto.id)
+        field, data = next(iter(value.items()))
+        if field == "string_array_value":
+            state.string_array_value.data[:] = data
+        else:
+            setattr(state, field, data)
+        if field != "trigger_value":
+            self.values[proto.id] = data
+        self.rerun([state], self.widgets[proto.id][2])
+
+    def rerun(self, widget_states=(), fragment_id=""):
+        """Ask for a rerun (of one fragment when fragment_id is set) and wait until it finishes"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = self.query_string
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        if fragment_id:
+            message.rerun_script.fragment_id = fragment_id
+        # A full rerun redraws every widget, a fragment rerun only the fragment's
+        self.widgets = {
+            widget_id: widget for widget_id, widget in self.widgets.items()
+            if fragment_id and widget[2] != fragment_id
+        }
+        self.exceptions = []
+        self._socket.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self._socket.recv(timeout=self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.exceptions.append("script failed to compile")
+                return self
+            if kind == "page_info_changed":
+                self.query_string = forward.page_info_changed.query_string
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind == "exception":
+                    self.exceptions.append(element.exception.message)
+                elif element_kind in ("radio", "selectbox", "multiselect", "text_input", "button"):
+                    proto = getattr(element, element_kind)
+                    self.widgets[proto.id] = (element_kind, proto, forward.delta.fragment_id)
+
+def _show_view(session, view):
+    """Switch the session to the dashboard view whose label contains `view`; True when that took a rerun"""
+    selector = session.widget("radio", "View")
+    label = next((option for option in selector.options if view in option), None) if selector is not None else None
+    if label is None or session.value(selector, "radio") == label:
+        return False
+    session.set(selector, string_value=label)
+    return True
+
+def step_open(session, rng):
+    session.open()
+    return True
+
+def step_change_team(session, rng):
+    team = session.widget("selectbox", "Team Name")
+    if team is None or len(team.options) < 2:
+        return False
+    session.set(team, string_value=rng.choice(team.options))
+    return True
+
+def step_add_period(session, rng):
+    period = session.widget("multiselect", "Period")
+    if period is None:
+        return False
+    selected = session.value(period, "multiselect")
+    available = [option for option in period.options if option not in selected]
+    if not available or len(selected) >= 5:
+        session.set(period, string_array_value=[])
+    else:
+        session.set(period, string_array_value=selected + [rng.choice(available)])
+    return True
+
+def step_open_student(session, rng):
+    student = session.widget("selectbox", "Select a Student")
+    if student is None or not student.options:
+        return False
+    session.set(student, string_value=rng.choice(student.options))
+    return True
+
+def step_search(session, rng):
+    search = session.widget("text_input", "🔍 Search")
+    if search is None:
+        return False
+    session.set(search, string_value=rng.choice(["Student 1", "School 2", "Form 3", ""]))
+    return True
+
+def step_export(session, rng):
+    export = session.widget("button", "📥 Download Filtered Data")
+    if export is None:
+        return False
+    session.set(export, trigger_value=True)
+    return True
+
+# Interactions replayed by every session, in order, each iteration, with the view each one needs
+SCENARIO = [
+    ("change team", "Overall Analysis", step_change_team),
+    ("add period", "Overall Analysis", step_add_period),
+    ("open student", "Student Analysis", step_open_student),
+    ("search", "Detailed Data", step_search),
+    ("export", "Detailed Data", step_export),
+]
+
+
+def _timed(session, rng, name, step, samples, errors, lock):
+    """Run one step, recording (step, start time, seconds) when it did something"""
+    started_at, started = time.time(), time.perf_counter()
+    try:
+        acted = step(session, rng)
+        failures = [f"{name}: {message}" for message in session.exceptions]
+    except Exception as e:
+        acted = True
+        failures = [f"{name}: {e}"]
+    elapsed = time.perf_counter() - started
+    with lock:
+        errors.extend(failures)
+        if acted:
+            samples.append((name, started_at, elapsed))
+
+def run_session(url, iterations, seed, timeout, samples, errors, lock, barrier):
+    """One simulated user: open the dashboard, then replay the scenario `iterations` times"""
+    rng = random.Random(seed)
+    session = RemoteSession(url, timeout)
+    try:
+        barrier.wait(timeout)
+        _timed(session, rng, "open", step_open, samples, errors, lock)
+        if session._socket is None:
+            return
+        for _ in range(iterations):
+            for name, view, step in SCENARIO:
+                _timed(session, rng, "switch view", lambda session, rng: _show_view(session, view), samples, errors, lock)
+                _timed(session, rng, name, step, samples, errors, lock)
+    except threading.BrokenBarrierError:
+        with lock:
+            errors.append("session: timed out waiting for the other sessions to connect")
+    finally:
+        session.close()
+
+
+# ---- Measurement ----
+def rss_mb(pid=None):
+    """Resident memory of a process (this one by default) in MB"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        if pid is not None:
+            return None
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def latency_stats(latencies):
+    """p50/p95/max of rerun latencies in milliseconds"""
+    values = np.asarray(latencies) * 1000
+    if not len(values):
+        return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+
+def run_level(url, sessions, iterations, seed, timeout, server_pid=None):
+    """Run `sessions` concurrent sessions against the server at url and summarize their reruns"""
+    samples, errors, lock = [], [], threading.Lock()
+    barrier = threading.Barrier(sessions)
+    memory_before = rss_mb(server_pid) if server_pid else None
+    threads = [
+        threading.Thread(
+            target=run_session, args=(url, iterations, seed + i, timeout, samples, errors, lock, barrier),
+            name=f"loadtest-session-{i}", daemon=True,
+        )
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    memory_after = rss_mb(server_pid) if server_pid else None
+
+    frame = pd.DataFrame(samples, columns=["step", "started_at", "seconds"])
+    # From the first step to start to the last one to finish
+    wall = float((frame["started_at"] + frame["seconds"]).max() - frame["started_at"].min()) if len(frame) else 0.0
+    return {
+        "sessions": sessions,
+        "reruns": len(frame),
+        "errors": len(errors),
+        **latency_stats(frame["seconds"]),
+        "throughput_per_s": round(len(frame) / wall, 2) if wall else None,
+        "wall_s": round(wall, 2),
+        "rss_mb": round(memory_after, 1) if memory_after is not None else None,
+        "mb_per_session": (
+            round(max(0.0, memory_after - memory_before) / sessions, 1)
+            if memory_before is not None and memory_after is not None else None
+        ),
+        "steps": {step: latency_stats(rows["seconds"]) for step, rows in frame.groupby("step", sort=False)},
+        "error_samples": errors[:5],
+    }
+
+def compare(results, baseline, tolerance):
+    """Session counts whose p95 latency regressed by more than tolerance against a baseline run"""
+    previous = {level["sessions"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in results["levels"]:
+        before = previous.get(level["sessions"])
+        if not before or not before.get("p95_ms") or level["p95_ms"] is None:
+            continue
+        if level["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{level['sessions']} sessions: p95 {level['p95_ms']:.0f} ms vs {before['p95_ms']:.0f} ms in the baseline"
+            )
+    return regressions
+
+def print_table(results):
+    header = f"{'sessions':>8} {'reruns':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'reruns/s':>9} {'RSS MB':>8} {'MB/session':>10}"
+    print(header)
+    print("-" * len(header))
+    for level in results["levels"]:
+        print(
+            f"{level['sessions']:>8} {level['reruns']:>7} {level['errors']:>6} {level['p50_ms'] or 0:>8.0f} "
+            f"{level['p95_ms'] or 0:>8.0f} {level['max_ms'] or 0:>8.0f} {level['throughput_per_s'] or 0:>9.2f} "
+            f"{level['rss_mb'] or 0:>8.0f} {level['mb_per_session'] or 0:>10.1f}"
+        )
+    busiest = results["levels"][-1]
+    print(f"\nPer step at {busiest['sessions']} sessions:")
+    for step, stats in busiest["steps"].items():
+        print(f"  {step:<14} p50 {stats['p50_ms']:>7.0f} ms   p95 {stats['p95_ms']:>7.0f} ms")
+    for level in results["levels"]:
+        for error in level["error_samples"]:
+            print(f"  error at {level['sessions']} sessions: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the dashboard")
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma separated concurrent session counts (default 1,2,4,8)")
+    parser.add_argument("--iterations", type=int, default=2, help="times each session replays the scenario")
+    parser.add_argument("--data", help="folder of workbooks to load instead of generated fixtures")
+    parser.add_argument("--teams", type=int, default=3, help="teams in generated fixtures")
+    parser.add_argument("--periods", type=int, default=4, help="periods per team in generated fixtures")
+    parser.add_argument("--students", type=int, default=60, help="students per team in generated fixtures")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds a single rerun may take")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare p95 latency with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 increase over the baseline (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    session_counts = [int(count) for count in args.sessions.split(",") if count.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="dashboard-loadtest-") as work_dir:
+        if args.data:
+            root = os.path.abspath(args.data)
+        else:
+            root = os.path.join(work_dir, "data")
+            write_fixtures(root, args.teams, args.periods, args.students, args.seed)
+        # The server runs from work_dir, so it reads these secrets and never the app's own
+        server, url = start_server(app_secrets(root, work_dir), work_dir, args.timeout)
+        try:
+            # The first session loads the dataset into the server's caches; it is reported on its own
+            started = time.perf_counter()
+            warmup_session = RemoteSession(url, args.timeout).open()
+            warmup_session.close()
+            warmup = time.perf_counter() - started
+            print(f"Warm-up (data load and first render): {warmup:.1f} s")
+            for error in warmup_session.exceptions:
+                print(f"  warm-up error: {error}")
+
+            results = {
+                "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+                "fixtures": None if args.data else {"teams": args.teams, "periods": args.periods, "students": args.students},
+                "iterations": args.iterations,
+                "warmup_s": round(warmup, 2),
+                "levels": [],
+            }
+            for sessions in session_counts:
+                print(f"Running {sessions} concurrent sessions...", flush=True)
+                results["levels"].append(run_level(url, sessions, args.iterations, args.seed, args.timeout, server.pid))
+        finally:
+            stop_server(server)
+
+    print()
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nLatency regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo latency regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
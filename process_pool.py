@@ -0,0 +1,48 @@
+"""Process pool shared by the CPU-bound batch jobs (sheet parsing, report rendering).
+
+Workers are started with spawn, since forking the multi-threaded server process is
+unsafe. Callers treat a None pool as "run serially".
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_size = None
+_pool_disabled = False
+_pool_lock = threading.Lock()
+
+
+def default_processes():
+    return os.cpu_count() or 1
+
+def get_pool(processes=None):
+    """Return the shared process pool, or None when work should stay serial"""
+    global _pool, _pool_size, _pool_disabled
+    processes = processes or default_processes()
+    if processes <= 1 or _pool_disabled:
+        return None
+    with _pool_lock:
+        if _pool is not None and _pool_size != processes:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            try:
+                _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+                _pool_size = processes
+            except (OSError, NotImplementedError, ValueError) as e:
+                logger.warning("Process pool unavailable, running serially: %s", e)
+                _pool_disabled = True
+        return _pool
+
+def discard_pool():
+    """Drop a broken pool; the next job creates a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
@@ -0,0 +1,186 @@
+"""Cohort ranking engine.
+
+All positions, percentiles and rank changes are computed with grouped, vectorized
+pandas operations over the whole dataset at once, so the cost is a handful of
+groupby passes regardless of how many students there are.
+"""
+import math
+
+import pandas as pd
+
+from identity import ID_COLUMN
+
+# A class is one team's students of one school and form in one period
+CLASS_KEYS = ["Team Name", "School", "Form", "Period"]
+# A school cohort spans all teams
+SCHOOL_KEYS = ["School", "Form", "Period"]
+
+RANKING_COLUMNS = [
+    "Class Position", "Class Size", "School Position", "School Size", "Rank Change",
+]
+
+
+def _group_keys(df, keys):
+    """Grouping series for the keys present in df; missing values form their own group"""
+    return [df[key].astype(str) for key in keys if key in df.columns]
+
+def period_sort_key(period):
+    """Sort key of one period label: missing periods first, then numeric labels by
+    number (e.g. "1.2" < "2.1"), then other labels in string order (e.g. "Term 1 2024")"""
+    if period is None or pd.isna(period) or not str(period).strip():
+        return (0, 0.0, "")
+    text = str(period).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return (2, 0.0, text)
+    return (1, number, "") if math.isfinite(number) else (2, 0.0, text)
+
+def period_numbers(periods):
+    """Vectorized period order: the dense rank of each label among the distinct labels
+    sorted by period_sort_key, 0 for missing periods.
+
+    The rank only holds within one call, so frames that are compared (e.g. closed and
+    open periods) are ranked together.
+    """
+    labels = periods.astype("string").str.strip()
+    keys = {label: period_sort_key(label) for label in labels.dropna().unique()}
+    missing = period_sort_key(None)
+    ranks = {key: rank for rank, key in enumerate(sorted(set(keys.values()) - {missing}), start=1)}
+    ranks[missing] = 0
+    return labels.map({label: ranks[key] for label, key in keys.items()}).astype("float64").fillna(0.0)
+
+def compute_rankings(df, subjects, earlier=None):
+    """Positions, subject percentiles and rank changes for every row of df.
+
+    earlier holds class positions of periods that are not in df (see
+    earlier_positions), so rank changes of df's first period can still be computed.
+    The result is aligned to df.index and holds:
+    - Class Position / Class Size: dense rank of M% within Team/School/Form/Period
+    - School Position / School Size: dense rank of M% within School/Form/Period
+    - "<Subject> Percentile": percentile of each subject score within School/Form/Period
+    - Rank Change: previous period's class position minus this one (positive = moved up)
+    """
+    result = pd.DataFrame(index=df.index)
+    if df.empty or "M%" not in df.columns:
+        return result
+
+    score = pd.to_numeric(df["M%"], errors="coerce")
+    class_keys = _group_keys(df, CLASS_KEYS)
+    school_keys = _group_keys(df, SCHOOL_KEYS)
+
+    if class_keys:
+        by_class = score.groupby(class_keys, sort=False)
+        result["Class Position"] = by_class.rank(method="dense", ascending=False).astype("Int64")
+        result["Class Size"] = by_class.transform("count").astype("Int64")
+    if school_keys:
+        by_school = score.groupby(school_keys, sort=False)
+        result["School Position"] = by_school.rank(method="dense", ascending=False).astype("Int64")
+        result["School Size"] = by_school.transform("count").astype("Int64")
+
+        existing_subjects = [subject for subject in subjects if subject in df.columns]
+        if existing_subjects:
+            subject_scores = df[existing_subjects].apply(pd.to_numeric, errors="coerce")
+            percentiles = subject_scores.groupby(school_keys, sort=False).rank(pct=True, method="max") * 100
+            for subject in existing_subjects:
+                result[f"{subject} Percentile"] = percentiles[subject].round(1)
+
+    if "Class Position" in result.columns and "Student" in df.columns and "Period" in df.columns:
+        students = df[ID_COLUMN] if ID_COLUMN in df.columns else df["Student"]
+        result["Rank Change"] = rank_changes(students, df["Period"], result["Class Position"], earlier)
+    return result
+
+def earlier_positions(df, subjects):
+    """Class position of every row of df by student and period, to pass as `earlier`
+    when ranking later periods without these rows (e.g. closed history periods)"""
+    result = compute_rankings(df, subjects)
+    if "Class Position" not in result.columns or "Student" not in df.columns or "Period" not in df.columns:
+        return None
+    students = df[ID_COLUMN] if ID_COLUMN in df.columns else df["Student"]
+    return _positions_frame(students, df["Period"], result["Class Position"])
+
+def ranking_inputs(subjects):
+    """Columns compute_rankings reads"""
+    return CLASS_KEYS + [ID_COLUMN, "Student", "M%"] + list(subjects)
+
+def update_rankings(previous_rankings, df, positions, touched, subjects, earlier=None):
+    """compute_rankings(df, subjects, earlier) from the previous version's rankings.
+
+    positions holds, for every row of df, the position of the same row in the previous
+    version (-1 for new rows), and touched the rows (before and after) whose ranking
+    inputs changed. Only the school cohorts (School/Form/Period) of touched rows are
+    ranked again, and rank changes are recomputed for the students in them. Returns
+    the rankings and a boolean Series marking the rows whose rankings changed (new rows
+    included).
+    """
+    school_keys = [key for key in SCHOOL_KEYS if key in df.columns]
+    if previous_rankings is None or not school_keys or not set(school_keys) <= set(touched.columns):
+        return compute_rankings(df, subjects, earlier), pd.Series(True, index=df.index)
+
+    cohorts = pd.MultiIndex.from_arrays(_group_keys(touched, school_keys))
+    affected = pd.MultiIndex.from_arrays(_group_keys(df, school_keys)).isin(cohorts)
+    if (positions[~affected] < 0).any():
+        return compute_rankings(df, subjects, earlier), pd.Series(True, index=df.index)
+
+    parts = [previous_rankings.iloc[positions[~affected]].set_axis(df.index[~affected])]
+    if affected.any():
+        parts.append(compute_rankings(df[affected], subjects))
+    result = pd.concat(parts)[previous_rankings.columns].reindex(df.index)
+    recomputed = affected.copy()
+
+    if "Rank Change" in result.columns:
+        # A student's rank change follows their position in the period before
+        students = df[ID_COLUMN] if ID_COLUMN in df.columns else df["Student"]
+        keys = students.astype(str).str.strip()
+        moved = touched[ID_COLUMN] if ID_COLUMN in touched.columns else touched["Student"]
+        redo = keys.isin(set(keys[affected]) | set(moved.astype(str).str.strip()))
+        result.loc[redo, "Rank Change"] = rank_changes(
+            students[redo], df.loc[redo, "Period"], result.loc[redo, "Class Position"], earlier,
+        )
+        recomputed |= redo.to_numpy()
+
+    # Most recomputed rows keep their rankings; only the ones that moved count as changed
+    reranked = recomputed & (positions < 0)
+    kept = recomputed & (positions >= 0)
+    before = previous_rankings.iloc[positions[kept]].astype("string").fillna("").to_numpy()
+    after = result[kept].astype("string").fillna("").to_numpy()
+    reranked[kept] = (before != after).any(axis=1)
+    return result, pd.Series(reranked, index=df.index)
+
+def _positions_frame(students, periods, positions):
+    return pd.DataFrame({
+        "student": students.astype(str).str.strip(),
+        "period": periods.astype("string").str.strip(),
+        "position": positions.astype("float64"),
+    })
+
+def rank_changes(students, periods, positions, earlier=None):
+    """Change in position from each student's previous period, aligned to the input.
+
+    earlier (see earlier_positions) supplies positions of periods before the input's.
+    """
+    frame = _positions_frame(students, periods, positions)
+    history = pd.concat([earlier, frame], ignore_index=True) if earlier is not None and not earlier.empty else frame.copy()
+    # Earlier and current periods are ranked together, so they share one order
+    history["order"] = period_numbers(history["period"])
+    frame["order"] = history["order"].iloc[len(history) - len(frame):].to_numpy()
+    # One position per student and period (the last record wins, as in the progress trend)
+    per_period = (
+        history.sort_values(["student", "order"], kind="stable")
+        .drop_duplicates(["student", "order"], keep="last")
+        .copy()
+    )
+    per_period["change"] = per_period.groupby("student")["position"].shift() - per_period["position"]
+    merged = frame.merge(per_period[["student", "order", "change"]], on=["student", "order"], how="left")
+    return pd.Series(merged["change"].to_numpy(), index=students.index).astype("Int64")
+
+def format_rank_change(change):
+    """Arrow notation for a rank change, e.g. '▲2', '▼1', '–'"""
+    if pd.isna(change):
+        return ""
+    change = int(change)
+    if change > 0:
+        return f"▲{change}"
+    if change < 0:
+        return f"▼{-change}"
+    return "–"
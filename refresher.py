@@ -0,0 +1,273 @@
+"""Background refresh of the prepared dataset.
+
+A single DataRefresher lives for the whole server process. It warms the data at
+startup, then keeps it fresh on a schedule or as soon as a source file changes,
+and swaps each new snapshot in atomically so readers always see the last good one.
+Other processes follow the snapshot it persists with a SnapshotReader instead of
+refreshing (and writing the same cache files) themselves.
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Layout of the persisted snapshot; bump it whenever the prepared dataset changes
+# shape, so snapshots written by an older release are rebuilt rather than read
+SNAPSHOT_FORMAT = 2
+
+
+@dataclass
+class Snapshot:
+    """An immutable, fully prepared dataset plus the source revisions it was built from"""
+    dataset: object
+    revisions: dict = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+    version: int = 1
+    format_version: int = SNAPSHOT_FORMAT
+
+    @property
+    def age_seconds(self):
+        return time.time() - self.loaded_at
+
+
+def load_snapshot(path):
+    """Read a persisted snapshot; ValueError when it was written in another format"""
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+    # Read from the instance: the class default would answer for snapshots without the field
+    found = vars(snapshot).get("format_version") if isinstance(snapshot, Snapshot) else None
+    if found != SNAPSHOT_FORMAT:
+        raise ValueError(f"snapshot format {found} is not {SNAPSHOT_FORMAT}")
+    return snapshot
+
+
+class DataRefresher:
+    """Keep a warm snapshot of the dataset, rebuilding it in a daemon thread.
+
+    load_fn(previous) builds a new dataset, given the current one (None on the first
+    load) so unchanged parts can be reused. revision_fn() cheaply returns a dict of
+    source file revisions; a change in that dict triggers a rebuild before the interval
+    is up. archive, a SnapshotStore, keeps the prepared rows of recent versions.
+    """
+
+    def __init__(self, load_fn, revision_fn=None, interval_seconds=3600, poll_seconds=300, cache_path=None, archive=None):
+        self._load_fn = load_fn
+        self._revision_fn = revision_fn
+        self.interval_seconds = interval_seconds
+        self.poll_seconds = poll_seconds
+        self.cache_path = cache_path
+        self.archive = archive
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._first_attempt = threading.Event()
+        self._thread = None
+        self._force = False
+
+        self._snapshot = None
+        self._state = "starting"
+        self._last_attempt_at = None
+        self._last_error = None
+
+        self._restore()
+
+    # ---- Public API ----
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="data-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def get_snapshot(self):
+        """Return the current snapshot without blocking (None until the first load finishes)"""
+        return self._snapshot
+
+    def wait_for_snapshot(self, timeout=None):
+        """Block until a snapshot exists or the first load attempt has finished"""
+        if self._snapshot is None:
+            self._first_attempt.wait(timeout)
+        return self._snapshot
+
+    def refresh_now(self):
+        """Ask the worker to rebuild the snapshot on its next wake-up"""
+        self._force = True
+        self._wake.set()
+
+    def status(self):
+        """Snapshot age and outcome of the last refresh, for display"""
+        snapshot = self._snapshot
+        return {
+            "state": self._state,
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "snapshot_age_seconds": snapshot.age_seconds if snapshot else None,
+            "last_attempt_at": self._last_attempt_at,
+            "last_error": self._last_error,
+        }
+
+    # ---- Worker ----
+    def _run(self):
+        while not self._stop.is_set():
+            self._tick()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _tick(self):
+        snapshot = self._snapshot
+        revisions = None
+        if self._revision_fn is not None:
+            try:
+                revisions = self._revision_fn()
+            except Exception as e:
+                logger.warning("Could not check source revisions: %s", e)
+
+        due = (
+            snapshot is None
+            or self._force
+            or snapshot.age_seconds >= self.interval_seconds
+            or (revisions is not None and revisions != snapshot.revisions)
+        )
+        if due:
+            self._refresh(revisions)
+        self._first_attempt.set()
+
+    def _refresh(self, revisions):
+        self._force = False
+        self._state = "refreshing"
+        self._last_attempt_at = time.time()
+        previous = self._snapshot
+        try:
+            dataset = self._load_fn(previous.dataset if previous else None)
+        except Exception as e:
+            logger.exception("Data refresh failed")
+            self._last_error = str(e)
+            # Keep serving the last good snapshot
+            self._state = "error"
+            return
+        snapshot = Snapshot(
+            dataset=dataset,
+            revisions=revisions or {},
+            version=previous.version + 1 if previous else 1,
+        )
+        # A single reference assignment: readers see either the old or the new snapshot, never a mix
+        self._snapshot = snapshot
+        self._last_error = None
+        self._state = "ok"
+        self._persist(snapshot)
+        self._archive(snapshot)
+
+    # ---- Disk Persistence ----
+    def _restore(self):
+        """Load the last good snapshot from disk so a restart serves data immediately"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            self._snapshot = load_snapshot(self.cache_path)
+            self._state = "restored"
+            self._first_attempt.set()
+        except Exception as e:
+            logger.warning("Ignoring unreadable snapshot cache %s: %s", self.cache_path, e)
+
+    def _persist(self, snapshot):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning("Could not write snapshot cache %s: %s", self.cache_path, e)
+
+    def _archive(self, snapshot):
+        if self.archive is None:
+            return
+        try:
+            self.archive.save(snapshot.version, snapshot.dataset)
+        except Exception as e:
+            logger.warning("Could not store snapshot v%d: %s", snapshot.version, e)
+
+
+class SnapshotReader:
+    """Follow the snapshot a DataRefresher in another process persists at cache_path.
+
+    Offers the read side of DataRefresher (get_snapshot, wait_for_snapshot, status)
+    without loading or writing anything: the file is read again whenever the
+    refresher replaces it.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._mtime = None
+        self._last_attempt_at = None
+        self._last_error = None
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def get_snapshot(self):
+        """Return the persisted snapshot, reloading it when the file has changed (None until one exists)"""
+        try:
+            mtime = os.stat(self.cache_path).st_mtime_ns
+        except OSError:
+            return self._snapshot
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._snapshot
+
+    def wait_for_snapshot(self, timeout=None):
+        """Block until the refresher has persisted a snapshot, or until the timeout is up"""
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.get_snapshot() is None and (deadline is None or time.time() < deadline):
+            time.sleep(0.5)
+        return self._snapshot
+
+    def status(self):
+        """Snapshot age and outcome of the last read, for display"""
+        snapshot = self.get_snapshot()
+        if self._last_error:
+            state = "error"
+        else:
+            state = "ok" if snapshot else "waiting"
+        return {
+            "state": state,
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "snapshot_age_seconds": snapshot.age_seconds if snapshot else None,
+            "last_attempt_at": self._last_attempt_at,
+            "last_error": self._last_error,
+        }
+
+    def _reload(self, mtime):
+        self._last_attempt_at = time.time()
+        try:
+            snapshot = load_snapshot(self.cache_path)
+        except Exception as e:
+            # Keep serving the last good snapshot
+            logger.warning("Could not read snapshot cache %s: %s", self.cache_path, e)
+            self._last_error = str(e)
+            return
+        self._snapshot = snapshot
+        self._mtime = mtime
+        self._last_error = None
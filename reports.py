@@ -0,0 +1,308 @@
+"""Bulk per-student reports.
+
+Each report is a self-contained HTML page with the content of the student page:
+student information, subject scores of the latest period, progress over time, subjects
+not appeared and the detailed records. Payloads are cut from the prepared dataset with
+the student index and precomputed progress, figures are rendered on the shared process
+pool, and finished reports are written straight into a zip archive, so only a bounded
+number of reports is ever held in memory.
+
+Figures are exported as static SVG when kaleido is installed and fall back to
+interactive plotly.js charts otherwise.
+"""
+import html
+import importlib.util
+import json
+import logging
+import pickle
+import re
+import zipfile
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from process_pool import default_processes, discard_pool, get_pool
+from identity import ID_COLUMN
+from rankings import format_rank_change, period_numbers
+from student_profiles import student_ids, update_progress
+from validation import PROVENANCE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+PASS_MARK = 60
+# Reports in flight per worker process; bounds memory while keeping every worker busy
+TASKS_PER_PROCESS = 4
+PLOTLY_JS = '<script src="https://cdn.plot.ly/plotly-2.35.2.min.js" charset="utf-8"></script>'
+
+REPORT_CSS = """
+body { font-family: "Source Sans Pro", Arial, sans-serif; color: #222; margin: 24px auto; max-width: 960px; }
+.header { background-color: #FFC300; border-radius: 8px; padding: 8px 16px; }
+.header h1 { margin: 0; font-size: 1.6em; }
+h2 { background-color: #87cefa; border-radius: 5px; font-size: 1.1em; padding: 4px 8px; margin-top: 24px; }
+.info { display: grid; grid-template-columns: 1fr 1fr; gap: 2px 24px; margin-top: 12px; }
+.note { background-color: #e8f4fd; border-radius: 5px; padding: 8px; }
+table.records { border-collapse: collapse; font-size: 0.8em; width: 100%; }
+table.records th, table.records td { border: 1px solid #ddd; padding: 3px 6px; text-align: left; }
+.footer { color: #666; font-size: 0.8em; margin-top: 24px; }
+"""
+
+# Set in a worker once static export has failed, so the remaining figures skip straight to HTML
+_static_export_failed = False
+
+
+def static_export_available():
+    """True when plotly can export static images (kaleido is installed)"""
+    return importlib.util.find_spec("kaleido") is not None
+
+def report_file_name(student, school=None):
+    """File name of a student's report inside the zip archive"""
+    name = f"{school} - {student}" if school else str(student)
+    return re.sub(r"[^\w\-. ]+", "_", name).strip() + ".html"
+
+
+# ---- Payloads ----
+def _text(value):
+    return "N/A" if pd.isna(value) else str(value)
+
+def student_info(record, ranks):
+    """Label/value pairs of the information block from a student's latest record and rankings"""
+    info = {}
+    for label, column in [(ID_COLUMN, ID_COLUMN), ("School", "School"), ("Form", "Form"), ("Team", "Team Name"),
+                          ("Home County", "Home County"), ("Period", "Period"), ("Mean Grade", "Mean Grade")]:
+        if column in record.index:
+            info[label] = _text(record[column])
+    if "M%" in record.index:
+        info["Overall Percentage"] = f"{_text(record['M%'])}%"
+    if "Remark" in record.index:
+        info["Remark"] = _text(record["Remark"])
+    for label, position, size in [("Class Position", "Class Position", "Class Size"),
+                                  ("School Position", "School Position", "School Size")]:
+        if position in ranks.index and pd.notna(ranks[position]):
+            info[label] = f"{int(ranks[position])} of {int(ranks[size])}"
+    if "Rank Change" in ranks.index and pd.notna(ranks["Rank Change"]):
+        info["Class Rank Change"] = format_rank_change(ranks["Rank Change"])
+    return info
+
+def build_report_payloads(df, students, student_index, progress, rankings, subjects, static=None, history=None):
+    """Yield one render payload per Student ID; students missing from the index are skipped.
+
+    rankings must be aligned to df (see rankings.compute_rankings). history holds the
+    students' rows from closed periods (HistoryStore.load_students); as on the student
+    page, they are merged into the progress trend.
+    """
+    static = static_export_available() if static is None else static
+    if history is not None and not history.empty:
+        # Closed periods are not part of the precomputed progress
+        with_history = [student for student in student_ids(history).dropna().unique() if student in student_index]
+        current = df.iloc[np.concatenate([student_index[student] for student in with_history])] if with_history else df.iloc[0:0]
+        progress = update_progress(progress, pd.concat([history, current], ignore_index=True), with_history, subjects)
+    progress_rows = progress.groupby(ID_COLUMN, sort=False).indices if not progress.empty else {}
+    period_order = period_numbers(df["Period"]).to_numpy() if "Period" in df.columns else np.zeros(len(df))
+    record_columns = [col for col in df.columns if not str(col).startswith("Unnamed") and col not in PROVENANCE_COLUMNS]
+    existing_subjects = [subject for subject in subjects if subject in df.columns]
+    for student in students:
+        positions = student_index.get(student)
+        if positions is None:
+            continue
+        # Last record of the latest period, as in the progress trend
+        latest_position = positions[np.argsort(period_order[positions], kind="stable")[-1]]
+        latest = df.iloc[latest_position]
+        ranks = rankings.iloc[latest_position] if len(rankings.columns) else pd.Series(dtype=object)
+        raw_scores = latest[existing_subjects]
+        scores = pd.to_numeric(raw_scores, errors="coerce").dropna()
+        rows = progress_rows.get(student)
+        # Reports carry the student's latest spelling of their name
+        name = str(latest["Student"]).strip()
+        yield {
+            "student": name,
+            "file_name": report_file_name(name, latest.get("School") if pd.notna(latest.get("School")) else None),
+            "info": student_info(latest, ranks),
+            "period": _text(latest["Period"]) if "Period" in latest.index else "All Periods",
+            "scores": scores.to_dict(),
+            "not_appeared": raw_scores[raw_scores.astype(str).str.strip() == "Not Appeared"].index.tolist(),
+            "progress": progress.iloc[rows].drop(columns=ID_COLUMN).dropna(axis=1, how="all") if rows is not None else pd.DataFrame(),
+            "records": df.iloc[positions][record_columns],
+            "static": static,
+        }
+
+
+# ---- Figures ----
+# Figures are built as plain plotly JSON: plotly.express builds and validates a full
+# figure object per chart, which costs far more than the rest of a report together.
+def _layout(title, x_title, y_title):
+    return {
+        "title": {"text": title},
+        "xaxis": {"title": {"text": x_title}, "type": "category", "gridcolor": "white"},
+        "yaxis": {"title": {"text": y_title}, "gridcolor": "white"},
+        "plot_bgcolor": "#E5ECF6",
+        "margin": {"t": 60, "l": 60, "r": 30, "b": 60},
+    }
+
+def subject_bar_figure(scores, title):
+    """Bar chart of subject scores with the pass mark line, as on the student page"""
+    values = [float(value) for value in scores.values()]
+    layout = _layout(title, "Subject", "Score")
+    layout["shapes"] = [{
+        "type": "line", "xref": "paper", "x0": 0, "x1": 1, "yref": "y", "y0": PASS_MARK, "y1": PASS_MARK,
+        "line": {"color": "red", "dash": "dash"},
+    }]
+    layout["annotations"] = [{
+        "xref": "paper", "x": 1, "xanchor": "right", "yref": "y", "y": PASS_MARK, "yanchor": "bottom",
+        "text": f"Pass Mark ({PASS_MARK}%)", "showarrow": False,
+    }]
+    trace = {
+        "type": "bar", "x": list(scores), "y": values,
+        "marker": {"color": values, "colorscale": "Viridis", "showscale": True},
+        "hovertemplate": "<b>%{x}</b><br>Subject Score: %{y}<extra></extra>",
+    }
+    return {"data": [trace], "layout": layout}
+
+def trend_figure(progress, columns, title, y_title):
+    """Line chart of progress columns over periods; columns with fewer than two points are left out"""
+    traces = []
+    for column in columns:
+        points = progress[["Period", column]].dropna()
+        if len(points) < 2:
+            continue
+        traces.append({
+            "type": "scatter", "mode": "lines+markers", "name": column,
+            "x": points["Period"].tolist(), "y": [float(value) for value in points[column]],
+        })
+    if not traces:
+        return None
+    layout = _layout(title, "Period", y_title)
+    layout["showlegend"] = len(traces) > 1
+    return {"data": traces, "layout": layout}
+
+def _report_figures(payload):
+    """The subject bar chart and progress trend figures of a report"""
+    student = payload["student"]
+    figures = {"subjects": None, "overall": None, "subject_trend": None}
+    if payload["scores"]:
+        figures["subjects"] = subject_bar_figure(payload["scores"], f"Subject Scores for {student} ({payload['period']})")
+    progress = payload["progress"]
+    if len(progress) > 1:
+        if "Overall %" in progress.columns:
+            figures["overall"] = trend_figure(
+                progress, ["Overall %"], f"Overall Performance Trend for {student}", "Overall Percentage (%)")
+        subjects = [col for col in progress.columns if col not in ["Period", "Overall %"]]
+        figures["subject_trend"] = trend_figure(
+            progress, subjects, f"Subject-wise Performance Trend for {student}", "Score (%)")
+    return figures
+
+def _figure_html(figure, div_id, static):
+    """Embed a figure as inline SVG, or as an interactive chart when static export is unavailable.
+
+    Returns (html, is_static).
+    """
+    global _static_export_failed
+    if static and not _static_export_failed:
+        try:
+            import plotly.io as pio
+            return pio.to_image(figure, format="svg", width=900, height=420, validate=False).decode(), True
+        except Exception as e:  # kaleido raises assorted errors when it has no browser to render with
+            logger.warning("Static figure export failed, embedding interactive charts: %s", e)
+            _static_export_failed = True
+    # "</" must not appear inside a script element, whatever a student is called
+    data, layout = (json.dumps(figure[part]).replace("</", "<\\/") for part in ["data", "layout"])
+    return (
+        f'<div id="{div_id}" style="height: 420px;"></div>'
+        f'<script>Plotly.newPlot("{div_id}", {data}, {layout}, {{"responsive": true}});</script>'
+    ), False
+
+
+# ---- Rendering ----
+def render_student_report(payload):
+    """Worker: render one report payload to (file_name, html bytes)"""
+    sections = {}
+    interactive = False
+    for key, figure in _report_figures(payload).items():
+        if figure is None:
+            sections[key] = ""
+            continue
+        sections[key], is_static = _figure_html(figure, f"figure-{key}", payload["static"])
+        interactive = interactive or not is_static
+
+    student = html.escape(payload["student"])
+    info = "".join(f"<div><b>{html.escape(label)}:</b> {html.escape(value)}</div>" for label, value in payload["info"].items())
+    subjects = sections["subjects"] or '<p class="note">No subject scores for this period.</p>'
+    not_appeared = ""
+    if payload["not_appeared"]:
+        not_appeared = f'<p class="note"><b>Subjects not appeared:</b> {html.escape(", ".join(payload["not_appeared"]))}</p>'
+    trend = sections["overall"] + sections["subject_trend"] or '<p class="note">Not enough valid data points to show progress trend.</p>'
+    records = payload["records"].to_html(index=False, na_rep="", border=0, classes="records")
+    page = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{student} - Student Report</title>
+{PLOTLY_JS if interactive else ""}
+<style>{REPORT_CSS}</style>
+</head>
+<body>
+<div class="header"><h1>{student}</h1>Student Performance Report</div>
+<h2>📊 Student Information</h2>
+<div class="info">{info}</div>
+<h2>📚 Subject Performance ({html.escape(payload["period"])})</h2>
+{subjects}
+{not_appeared}
+<h2>📈 Progress Over Time</h2>
+{trend}
+<h2>Detailed Records</h2>
+{records}
+<p class="footer">Generated {pd.Timestamp.now().strftime("%d %b %Y %H:%M")}</p>
+</body>
+</html>
+"""
+    return payload["file_name"], page.encode("utf-8")
+
+def render_reports(payloads, processes=None):
+    """Yield (file_name, html bytes) per payload, in order, rendered on the process pool.
+
+    At most TASKS_PER_PROCESS reports per process are in flight at a time. If the pool
+    breaks, the remaining reports are rendered serially.
+    """
+    payloads = iter(payloads)
+    pool = get_pool(processes)
+    if pool is None:
+        for payload in payloads:
+            yield render_student_report(payload)
+        return
+    window = TASKS_PER_PROCESS * (processes or default_processes())
+    in_flight = deque()
+    try:
+        for payload in payloads:
+            # Queued before it is submitted, so a pool that breaks on submit still renders it below
+            in_flight.append((payload, None))
+            in_flight[-1] = (payload, pool.submit(render_student_report, payload))
+            if len(in_flight) >= window:
+                yield in_flight[0][1].result()
+                in_flight.popleft()
+        while in_flight:
+            yield in_flight[0][1].result()
+            in_flight.popleft()
+    except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+        logger.warning("Process pool failed, rendering reports serially: %s", e)
+        discard_pool()
+        for payload, _ in in_flight:
+            yield render_student_report(payload)
+        for payload in payloads:
+            yield render_student_report(payload)
+
+def write_reports_zip(payloads, fileobj, processes=None):
+    """Render payloads into a zip archive written to fileobj; returns the number of reports"""
+    used_names = set()
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, content in render_reports(payloads, processes):
+            # Two students of the same name and school still get a report each
+            unique_name, copy = file_name, 1
+            while unique_name in used_names:
+                copy += 1
+                unique_name = f"{file_name[:-len('.html')]} ({copy}).html"
+            used_names.add(unique_name)
+            archive.writestr(unique_name, content)
+            count += 1
+    return count
@@ -0,0 +1,89 @@
+"""Build the data pipeline from the app's secrets.
+
+Used by the dashboard (with st.secrets) and by the standalone query API (with the
+same .streamlit/secrets.toml read from disk). Only the dashboard loads and refreshes
+the dataset; the standalone API reads the snapshot the dashboard persists, so the two
+processes never write the same cache files.
+"""
+import os
+
+from data_loader import fetch_revisions, load_dataset
+from data_sources import create_source
+from history_store import HistoryStore
+from identity import DEFAULT_THRESHOLD, StudentRegistry
+from refresher import DataRefresher, SnapshotReader
+from snapshot_store import SnapshotStore
+
+DEFAULT_SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+
+def load_secrets(path=DEFAULT_SECRETS_PATH):
+    """Read a secrets.toml file outside Streamlit"""
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import tomli as tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def create_data_source(secrets):
+    """Create the configured data source (Google Drive unless [data_source] selects another backend)"""
+    return create_source(dict(secrets.get("data_source", {})), secrets.get("google_service_account"))
+
+def get_file_ids(secrets):
+    """File IDs (Drive IDs, relative paths or object keys, depending on the backend)"""
+    source_config = secrets.get("data_source", {})
+    return dict(source_config.get("files", {})) or dict(secrets.get("google_drive_files", {}))
+
+def create_history_store(secrets):
+    """The history store configured in [history], or None when it is not enabled"""
+    history_config = dict(secrets.get("history", {}))
+    if not history_config or not history_config.get("enabled", True):
+        return None
+    return HistoryStore(
+        history_config.get("path", os.path.join(".cache", "history")),
+        open_periods=history_config.get("open_periods", 2),
+    )
+
+def create_student_registry(secrets):
+    """Student identity registry configured in [identity]; the mapping is kept under .cache by default"""
+    identity_config = dict(secrets.get("identity", {}))
+    return StudentRegistry(
+        identity_config.get("path", os.path.join(".cache", "student_ids.csv")),
+        overrides_path=identity_config.get("overrides"),
+        threshold=identity_config.get("threshold", DEFAULT_THRESHOLD),
+    )
+
+def create_snapshot_store(secrets):
+    """Store of recent snapshot versions configured in [refresh], or None when keep_versions is 0"""
+    settings = dict(secrets.get("refresh", {}))
+    keep = settings.get("keep_versions", 10)
+    if not keep:
+        return None
+    return SnapshotStore(settings.get("versions_path", os.path.join(".cache", "versions")), keep=keep)
+
+def create_refresher(secrets, source=None):
+    """Background refresher of the prepared dataset; call start() on the result"""
+    source = source or create_data_source(secrets)
+    file_ids = get_file_ids(secrets)
+    teams_config = dict(secrets.get("teams", {}))
+    ingest_config = dict(secrets.get("ingest", {}))
+    settings = dict(secrets.get("refresh", {}))
+    history = create_history_store(secrets)
+    identities = create_student_registry(secrets)
+    return DataRefresher(
+        lambda previous: load_dataset(source, file_ids, teams_config, ingest_config, history, identities, previous),
+        revision_fn=lambda: fetch_revisions(source, file_ids, teams_config),
+        interval_seconds=settings.get("interval_seconds", 3600),
+        poll_seconds=settings.get("poll_seconds", 300),
+        cache_path=snapshot_cache_path(secrets),
+        archive=create_snapshot_store(secrets),
+    )
+
+def snapshot_cache_path(secrets):
+    """Where the refresher persists its last good snapshot ([refresh] cache_path)"""
+    return dict(secrets.get("refresh", {})).get("cache_path", os.path.join(".cache", "snapshot.pkl"))
+
+def create_snapshot_reader(secrets):
+    """Read-only follower of the snapshot the dashboard's refresher persists"""
+    return SnapshotReader(snapshot_cache_path(secrets))
@@ -0,0 +1,69 @@
+"""Parse Excel sheets on a process pool.
+
+openpyxl is pure Python, so parsing is CPU-bound and a single core spends most of a
+cold start inside it. The sheets are split into one batch per worker, so each worker
+receives the workbook's bytes and opens the workbook once, and every sheet is shipped
+back as an Arrow IPC buffer, which is far cheaper to move between processes than a
+pickled DataFrame full of Python objects. When no pool can be used, sheets are parsed
+serially.
+"""
+import io
+import logging
+import pickle
+from concurrent.futures.process import BrokenProcessPool
+
+import openpyxl
+import pandas as pd
+
+from frame_codec import decode_frame, encode_frame
+from process_pool import default_processes, discard_pool, get_pool
+
+logger = logging.getLogger(__name__)
+
+
+# ---- Workers ----
+def _parse_sheets_task(file_content, sheet_names, postprocess, args):
+    """Worker: parse a batch of sheets, apply postprocess(df, *args) and encode the results"""
+    sheets = pd.read_excel(io.BytesIO(file_content), sheet_name=list(sheet_names), engine='openpyxl')
+    if postprocess is not None:
+        sheets = {sheet_name: postprocess(df, *args) for sheet_name, df in sheets.items()}
+    return [encode_frame(sheets[sheet_name]) for sheet_name in sheet_names]
+
+def list_sheet_names(file_content):
+    """Sheet names of a workbook without parsing any cell data"""
+    workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+# ---- Parsing ----
+def parse_workbook_serial(file_content, postprocess=None, args=()):
+    sheets = pd.read_excel(io.BytesIO(file_content), sheet_name=None, engine='openpyxl')
+    if postprocess is None:
+        return sheets
+    return {sheet_name: postprocess(df, *args) for sheet_name, df in sheets.items()}
+
+def parse_workbook(file_content, postprocess=None, args=(), processes=None):
+    """Parse every sheet of a workbook into {sheet_name: DataFrame}, one pool task per batch of sheets, keeping sheet order.
+
+    postprocess must be a module-level function so it can be sent to worker processes.
+    """
+    pool = get_pool(processes)
+    if pool is None:
+        return parse_workbook_serial(file_content, postprocess, args)
+    try:
+        sheet_names = list_sheet_names(file_content)
+        # Round-robin batches spread large and small sheets over the workers
+        workers = min(processes or default_processes(), len(sheet_names))
+        batches = [sheet_names[i::workers] for i in range(workers)]
+        futures = [pool.submit(_parse_sheets_task, file_content, batch, postprocess, args) for batch in batches]
+        parsed = {}
+        for batch, future in zip(batches, futures):
+            parsed.update(zip(batch, map(decode_frame, future.result())))
+        return {sheet_name: parsed[sheet_name] for sheet_name in sheet_names}
+    except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+        logger.warning("Process pool failed, parsing serially: %s", e)
+        discard_pool()
+        return parse_workbook_serial(file_content, postprocess, args)
@@ -0,0 +1,233 @@
+"""Versioned snapshots of the prepared rows and the differences between them.
+
+Rows are matched across snapshots by a stable row key: Student ID, Period and Team
+Name (rows sharing a key are told apart by their order). diff_rows compares two
+versions in a few vectorized passes and reports added, removed and changed rows
+plus every changed cell. The diff also tells which Team/Period groups a refresh
+touched, so rankings, progress and the dashboard's caches are only recomputed
+for those.
+
+The SnapshotStore keeps the prepared rows of the last `keep` versions under `root`:
+
+    root/manifest.json
+    root/v12.parquet
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from frame_codec import read_frame, write_frame
+from identity import ID_COLUMN
+from refresher import SNAPSHOT_FORMAT
+from student_profiles import student_ids, student_keys
+from validation import PROVENANCE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ROW_KEY = [ID_COLUMN, "Period", "Team Name"]
+
+# Groups whose revision is tracked for cache invalidation
+GROUP_KEYS = ["Team Name", "Period"]
+
+CELL_COLUMNS = ROW_KEY + ["Student", "Column", "Old", "New"]
+
+# added/removed: whole rows; changed/before: changed rows after and before the
+# refresh, with changed_cells flagging which compared columns differ; cells: one
+# record per changed cell
+SnapshotDiff = namedtuple("SnapshotDiff", ["added", "removed", "changed", "before", "changed_cells", "cells"])
+
+
+def _key_strings(values):
+    """Stripped string form of key values, missing values as an empty string.
+
+    Each distinct value is converted once, which matters for large numeric columns.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = np.append(pd.Index(uniques).astype(str).str.strip().to_numpy(dtype=object), "")
+    return labels[codes]
+
+def row_keys(df):
+    """Row key of every row of df as strings, plus an Occurrence number for rows sharing a key"""
+    keys = pd.DataFrame(index=df.index)
+    if ID_COLUMN in df.columns:
+        ids = student_ids(df)
+        if "Student" in df.columns and ids.isna().any():
+            ids = ids.fillna(student_keys(df["Student"]))
+        keys[ID_COLUMN] = _key_strings(ids)
+    else:
+        keys[ID_COLUMN] = ""
+    for column in ROW_KEY[1:]:
+        keys[column] = _key_strings(df[column]) if column in df.columns else ""
+    keys["Occurrence"] = keys.groupby(ROW_KEY, sort=False).cumcount()
+    return keys
+
+def match_rows(old, new):
+    """Position in old of the row with the same key as each row of new, -1 for new rows"""
+    old_index = pd.MultiIndex.from_frame(row_keys(old))
+    return old_index.get_indexer(pd.MultiIndex.from_frame(row_keys(new)))
+
+def _unique_columns(df):
+    return df.loc[:, ~df.columns.duplicated()]
+
+def _differs(a, b):
+    """Elementwise a != b of two columns, with missing values equal to each other"""
+    missing = pd.isna(a) & pd.isna(b)
+    if a.dtype.kind in "biuf" and b.dtype.kind in "biuf":
+        return ~((a == b) | missing)
+    a, b = a.astype(object), b.astype(object)
+    equal = a == b
+    # Comparisons with pd.NA give NA rather than a bool
+    equal = np.where(pd.isna(equal), False, equal).astype(bool)
+    return ~(equal | missing)
+
+def diff_rows(old, new, positions=None):
+    """Differences between two versions of the prepared rows (see SnapshotDiff).
+
+    Columns present in both versions are compared, except the provenance columns;
+    missing values compare equal to each other. positions are match_rows(old, new)
+    when the caller already has them.
+    """
+    positions = match_rows(old, new) if positions is None else positions
+    old, new = _unique_columns(old), _unique_columns(new)
+    found = positions >= 0
+    kept = np.zeros(len(old), dtype=bool)
+    kept[positions[found]] = True
+
+    columns = [col for col in new.columns if col in old.columns and col not in PROVENANCE_COLUMNS]
+    after = new[found]
+    before = old.iloc[positions[found]]
+    differs = np.column_stack(
+        [_differs(before[col].to_numpy(), after[col].to_numpy()) for col in columns]
+    ) if columns else np.zeros((len(after), 0), dtype=bool)
+    changed_rows = differs.any(axis=1)
+
+    # Cell values are taken from the changed rows only
+    changed_before, changed_after = before[changed_rows], after[changed_rows]
+    rows, cols = np.nonzero(differs[changed_rows])
+    cells = row_keys(changed_after.iloc[rows])[ROW_KEY].reset_index(drop=True)
+    cells["Student"] = changed_after["Student"].iloc[rows].to_numpy() if "Student" in changed_after.columns else pd.NA
+    cells["Column"] = np.asarray(columns, dtype=object)[cols]
+    cells["Old"] = pd.Series(changed_before[columns].to_numpy(dtype=object)[rows, cols], dtype=object).astype("string")
+    cells["New"] = pd.Series(changed_after[columns].to_numpy(dtype=object)[rows, cols], dtype=object).astype("string")
+
+    return SnapshotDiff(
+        added=new[~found],
+        removed=old[~kept],
+        changed=changed_after,
+        before=changed_before,
+        changed_cells=pd.DataFrame(differs[changed_rows], index=after.index[changed_rows], columns=columns),
+        cells=cells[CELL_COLUMNS],
+    )
+
+def touched_rows(diff, columns=None):
+    """Rows of the diff that matter for the given columns: added and removed rows, and
+    changed rows (before and after) where one of the columns changed (any column by default)"""
+    if columns is None:
+        relevant = diff.changed_cells.any(axis=1).to_numpy()
+    else:
+        relevant = diff.changed_cells[[col for col in diff.changed_cells.columns if col in columns]].any(axis=1).to_numpy()
+    parts = [diff.added, diff.removed, diff.changed[relevant], diff.before[relevant]]
+    return pd.concat([part for part in parts if not part.empty] or [diff.added], ignore_index=True)
+
+def group_index(df, keys=GROUP_KEYS):
+    """Group of every row of df as a MultiIndex of strings over keys"""
+    return pd.MultiIndex.from_arrays([
+        _key_strings(df[key]) if key in df.columns else np.full(len(df), "", dtype=object)
+        for key in keys
+    ])
+
+def group_revisions(previous, df, touched):
+    """Revision of every Team/Period group of df.
+
+    Groups with a row in touched (a frame of rows or a MultiIndex of groups) and new
+    groups get a revision never used before; the others keep their previous one, so
+    anything cached for them stays valid.
+    """
+    previous = previous or {}
+    touched = set(touched if isinstance(touched, pd.MultiIndex) else group_index(touched))
+    revision = max(previous.values(), default=0) + 1
+    return {
+        group: revision if group in touched or group not in previous else previous[group]
+        for group in group_index(df).unique()
+    }
+
+def drop_closed(diff, partitions):
+    """The diff without removed rows of the given closed (team, period) partitions, which
+    moved to the history store rather than going away"""
+    return diff._replace(removed=diff.removed[~group_index(diff.removed).isin(list(partitions))])
+
+def summarize_diff(diff):
+    """Counts of added, removed and changed rows and of changed cells"""
+    return {
+        "added": len(diff.added),
+        "removed": len(diff.removed),
+        "changed": len(diff.changed),
+        "cells": len(diff.cells),
+    }
+
+
+class SnapshotStore:
+    """Prepared rows of recent snapshot versions, for comparing any of them with the current one"""
+
+    def __init__(self, root, keep=10):
+        self.root = root
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"root": self.root, "keep": self.keep}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"], state["keep"])
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _stem(self, version):
+        return os.path.join(self.root, f"v{version}")
+
+    def _entries(self):
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path) as f:
+            return json.load(f).get("versions", [])
+
+    def versions(self):
+        """Stored versions in the current snapshot format, oldest first: dicts with version, saved_at and rows"""
+        return [entry for entry in self._entries() if entry.get("format") == SNAPSHOT_FORMAT]
+
+    def save(self, version, dataset):
+        """Store the dataset's prepared rows as `version` and drop versions beyond `keep`"""
+        with self._lock:
+            write_frame(dataset.df_main, self._stem(version))
+            entries = self._entries()
+            # Versions from a line restarted below them (e.g. after the snapshot cache was cleared)
+            # and versions in another snapshot format are dropped
+            stale = [entry["version"] > version or entry.get("format") != SNAPSHOT_FORMAT for entry in entries]
+            dropped = [entry for entry, drop in zip(entries, stale) if drop and entry["version"] != version]
+            entries = [entry for entry, drop in zip(entries, stale) if not drop and entry["version"] < version]
+            entries.append({
+                "version": version, "format": SNAPSHOT_FORMAT, "saved_at": time.time(), "rows": len(dataset.df_main),
+            })
+            dropped += entries[:-self.keep]
+            entries = entries[-self.keep:]
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"versions": entries}, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            for entry in dropped:
+                for path in [f"{self._stem(entry['version'])}.parquet", f"{self._stem(entry['version'])}.pkl"]:
+                    if os.path.exists(path):
+                        os.remove(path)
+        logger.info("Stored snapshot v%d (%d rows)", version, len(dataset.df_main))
+
+    def load(self, version):
+        """Prepared rows of a stored version"""
+        return read_frame(self._stem(version))
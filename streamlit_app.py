@@ -7,61 +7,68 @@ import numpy as np
 import base64
 import os
 import io
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 import json
+import tempfile
+from api import ApiServer
+from data_loader import prepare_dropouts, read_workbook, subject_columns
+from early_warning import DEFAULT_THRESHOLDS, score_students
+from filters import MAX_PERIODS, SELECTION_PARAMS, apply_filters, canonical_selection, closed_partitions, numeric_subjects, selection_from_params, selection_key, selection_revisions, selection_to_params
+from rankings import RANKING_COLUMNS, compute_rankings, format_rank_change
+from reports import build_report_payloads, write_reports_zip
+from settings import create_data_source, create_refresher, get_file_ids as settings_file_ids
+from snapshot_store import diff_rows, drop_closed, summarize_diff
+from student_profiles import compute_progress, student_ids, student_labels, student_name_mask, student_progress
+from validation import CHECK_LABELS, PROVENANCE_COLUMNS, summarize_anomalies
 
 st.set_page_config(layout="wide", page_title="Student Performance Analysis Dashboard")
 
-# ---- Google Drive Setup ----
+# ---- Data Source Setup ----
 @st.cache_resource
-def initialize_drive_service():
-    """Initialize Google Drive service using service account credentials"""
-    try:
-        # Get credentials from Streamlit secrets
-        credentials_info = st.secrets["google_service_account"]
-        credentials = Credentials.from_service_account_info(
-            credentials_info,
-            scopes=['https://www.googleapis.com/auth/drive.readonly']
-        )
-        service = build('drive', 'v3', credentials=credentials)
-        return service
-    except Exception as e:
-        st.error(f"Failed to initialize Google Drive service: {str(e)}")
-        return None
+def get_data_source():
+    """Create the configured data source (Google Drive unless [data_source] selects another backend)"""
+    return create_data_source(st.secrets)
+
+def get_file_ids():
+    """File IDs (Drive IDs, relative paths or object keys, depending on the backend)"""
+    return settings_file_ids(st.secrets)
 
 @st.cache_data(ttl=3600)  # Cache for 1 hour
-def download_file_from_drive(_service, file_id, file_name):
-    """Download file from Google Drive and return as bytes"""
+def load_excel_from_source(file_id, file_name):
+    """Load Excel file from the data source into pandas DataFrames"""
     try:
-        request = _service.files().get_media(fileId=file_id)
-        file_io = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_io, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        file_io.seek(0)
-        return file_io.getvalue()
+        return read_workbook(get_data_source().read(file_id))
     except Exception as e:
         st.error(f"Error downloading {file_name}: {str(e)}")
         return None
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_excel_from_drive(_service, file_id, file_name):
-    """Load Excel file from Google Drive into pandas DataFrame"""
-    file_content = download_file_from_drive(_service, file_id, file_name)
-    if file_content:
-        return pd.read_excel(io.BytesIO(file_content), sheet_name=None, engine='openpyxl')
-    return None
+# ---- Background Data Refresh ----
+@st.cache_resource
+def get_data_refresher():
+    """Start the process-wide worker that warms and refreshes the dataset in the background"""
+    return create_refresher(st.secrets, get_data_source()).start()
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_image_from_drive(_service, file_id, file_name):
-    """Load image file from Google Drive and convert to base64"""
-    file_content = download_file_from_drive(_service, file_id, file_name)
-    if file_content:
-        return base64.b64encode(file_content).decode()
-    return None
+# ---- Query API ----
+@st.cache_resource
+def get_api_server():
+    """Serve the read-only query API from this process when [api] is enabled"""
+    api_config = dict(st.secrets.get("api", {}))
+    if not api_config or not api_config.get("enabled", True):
+        return None
+    server = ApiServer(get_data_refresher(), host=api_config.get("host", "127.0.0.1"), port=api_config.get("port", 8502))
+    try:
+        return server.start()
+    except OSError as e:
+        st.warning(f"Query API could not start on {server.url}: {str(e)}")
+        return None
+
+def format_age(seconds):
+    """Human readable age such as '42s', '5m' or '2h 10m'"""
+    seconds = int(seconds or 0)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
 
 # ---- Custom CSS ----
 st.markdown("""
@@ -108,99 +115,175 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# ---- Load Data from Google Drive ----
+# ---- Load Data ----
 def load_data():
-    """Load all data from Google Drive"""
-    service = initialize_drive_service()
-    if not service:
-        st.error("Cannot connect to Google Drive. Please check your service account configuration.")
+    """Return the latest prepared dataset from the background refresher"""
+    refresher = get_data_refresher()
+    snapshot = refresher.get_snapshot()
+    if snapshot is None:
+        # Only the very first run after a cold start without a cached snapshot waits here
+        with st.spinner("Loading data..."):
+            snapshot = refresher.wait_for_snapshot()
+    if snapshot is None:
+        st.error(f"Error loading data: {refresher.status()['last_error']}")
         st.stop()
-    
+
+    dataset = snapshot.dataset
+    for level, message in dataset.messages:
+        getattr(st, level)(message)
+
+    return dataset
+
+@st.cache_data(show_spinner="Loading older periods from history...")
+def load_history_periods(_history, data_version, partitions):
+    """Closed (team, period) partitions from the history store, cached per snapshot"""
+    return _history.load(partitions)
+
+@st.cache_data(show_spinner=False)
+def load_student_history(_history, data_version, student_id):
+    """A student's rows from closed periods, cached per snapshot"""
+    return _history.load_student(student_id)
+
+@st.cache_data(show_spinner=False)
+def get_student_labels(_df, data_version):
+    """Display name of every Student ID, cached per snapshot"""
+    return student_labels(_df)
+
+@st.cache_data(show_spinner=False)
+def rank_history_view(_df, data_version, team, periods):
+    """Rankings for a view that includes closed periods, cached per snapshot and selection"""
+    return compute_rankings(_df, subject_columns)
+
+@st.cache_data(show_spinner="Scoring students...")
+def get_at_risk_table(_df, _dropout_df, _history, data_version, thresholds):
+    """Early-warning scores for every student, cached per snapshot and threshold set.
+
+    Closed history periods count in the M% trend, which open periods alone cut short.
+    """
+    dropout_names = None
+    if _dropout_df is not None and not _dropout_df.empty:
+        dropout_names = get_dropouts(_dropout_df, data_version)["Student Name"]
+    partitions = tuple(_history.closed_partitions()) if _history is not None else ()
+    earlier = load_history_periods(_history, data_version, partitions) if partitions else None
+    return score_students(_df, subject_columns, dropout_names, dict(thresholds), earlier=earlier)
+
+@st.cache_data(show_spinner=False)
+def get_quality_summary(_quality, data_version):
+    """Anomaly counts of the snapshot's data-quality report, cached per snapshot"""
+    return summarize_anomalies(_quality.anomalies)
+
+def with_history_periods(df, history, team, periods):
+    """Append the closed-period rows a period selection needs from the history store"""
+    partitions = closed_partitions(history, {"team": team, "period": periods})
+    if not partitions:
+        return df
+    return pd.concat([df, load_history_periods(history, data_version, partitions)], ignore_index=True)
+
+@st.cache_data(show_spinner=False)
+def get_dropouts(_dropout_df, data_version):
+    """Parsed dropout list, cached per snapshot"""
+    return prepare_dropouts(_dropout_df)
+
+# ---- Selection Caches ----
+# Keyed by canonical selection, so every session showing the same filtered view (e.g.
+# opened from a shared link) is served one computed result, and by the revisions of the
+# Team/Period groups the selection covers, so a refresh only recomputes the views it changed
+def selection_revision(selection):
+    """Cache token of a selection's data; the snapshot version when group revisions cannot be used"""
+    if dataset.revisions is None or closed_partitions(history, selection):
+        return data_version
+    return selection_revisions(dataset.revisions, selection)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def get_filtered_rows(_df, _history, revision, key):
+    """Rows of a selection, closed history periods included, with numeric subjects ("Not Appeared" becomes NaN)"""
+    selection = dict(key)
+    df_view = with_history_periods(_df, _history, selection["team"], selection["period"])
+    return numeric_subjects(apply_filters(df_view, selection), subject_columns)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def get_selection_aggregates(_df, _history, _rankings, revision, key):
+    """Metrics, chart data and positions of the Overall Analysis view for a selection"""
+    selection = dict(key)
+    filtered = get_filtered_rows(_df, _history, revision, key)
+    df_view = with_history_periods(_df, _history, selection["team"], selection["period"])
+    view_rankings = _rankings if df_view is _df else rank_history_view(df_view, data_version, selection["team"], selection["period"])
+    existing_subjects = [sub for sub in subject_columns if sub in filtered.columns]
+    aggregates = {
+        "students": student_ids(filtered).nunique() if "Student" in filtered.columns else 0,
+        "subject_means": filtered[existing_subjects].mean(),
+        "remark_counts": filtered["Remark"].value_counts() if "Remark" in filtered.columns else None,
+        "grade_counts": filtered["Mean Grade"].value_counts() if "Mean Grade" in filtered.columns else None,
+        "top_students": None,
+        "ranked": None,
+    }
+    if "M%" in filtered.columns and "Student" in filtered.columns:
+        by_score = filtered.sort_values("M%", ascending=False)
+        aggregates["top_students"] = by_score[~student_ids(by_score).duplicated()].head(5)
+    if not view_rankings.empty and "Class Position" in view_rankings.columns:
+        info_cols = [col for col in ["Student", "Team Name", "School", "Form", "Period", "M%"] if col in filtered.columns]
+        rank_cols = [col for col in RANKING_COLUMNS if col in view_rankings.columns]
+        # Filtered again rather than taken from get_filtered_rows, whose cached rows may carry
+        # the index of an earlier snapshot that did not touch this selection
+        ranked = apply_filters(df_view, selection)[info_cols].join(view_rankings[rank_cols])
+        ranked = ranked.sort_values([col for col in ["Period", "School", "Form", "Class Position"] if col in ranked.columns])
+        if "Rank Change" in ranked.columns:
+            ranked["Rank Change"] = ranked["Rank Change"].map(format_rank_change)
+        aggregates["ranked"] = ranked
+    return aggregates
+
+# ---- Filter State ----
+# The filters are drawn on the Overall Analysis view but also drive Detailed Data,
+# so their values are kept in session state while another view is shown. The page URL
+# carries the canonical selection, so a shared link opens the same filtered view.
+FILTER_DEFAULTS = canonical_selection({})
+
+def filter_key(name):
+    return f"filter_{name}"
+
+def url_selection():
+    """Canonical filter selection from the page URL's query parameters"""
+    params = {key: st.query_params.get_all(key) for key in SELECTION_PARAMS if key in st.query_params}
     try:
-        # Get file IDs from secrets
-        file_ids = st.secrets["google_drive_files"]
-
-        # Load team result files
-        files_and_teams = [
-            (file_ids["team_kathy"], "Team Kathy"),
-            (file_ids["team_kelly"], "Team Kelly"),
-            (file_ids["team_lissette"], "Team Lissette"),
-        ]
-
-        dfs = []
-        for file_id, team in files_and_teams:
-            try:
-                all_sheets = load_excel_from_drive(service, file_id, f"{team} Results")
-                if all_sheets:
-                    for sheet_name, df in all_sheets.items():
-                        df["Team Name"] = team
-                        # Replace NA, N/A, and similar values with "Not Appeared" across all columns
-                        df = df.replace({
-                            'NA': 'Not Appeared',
-                            'N/A': 'Not Appeared',
-                            'N.A': 'Not Appeared',
-                            'n/a': 'Not Appeared',
-                            'na': 'Not Appeared',
-                            'n.a': 'Not Appeared',
-                            'N.A.': 'Not Appeared',
-                            'N/A/': 'Not Appeared'
-                        })
-                        dfs.append(df)
-                else:
-                    st.warning(f"Could not load data for {team}")
-            except Exception as e:
-                st.error(f"Error loading {team} data: {str(e)}")
-
-        if not dfs:
-            st.error("No team data could be loaded.")
-            st.stop()
-
-        df_main = pd.concat(dfs, ignore_index=True)
-
-        # Load High School Data Sheet (only if file ID is provided and not placeholder)
-        high_school_file_id = file_ids.get("high_school_data", "")
-        high_school_unique_students = None
-        if high_school_file_id:
-            high_school_data = load_excel_from_drive(service, high_school_file_id, "High School Data")
-            if high_school_data:
-                # Get the first sheet if multiple sheets exist
-                high_school_df = list(high_school_data.values())[0]
-                high_school_df = high_school_df.rename(columns={"Name": "Student"})
-                # Also replace NA/N/A values in the high school data sheet
-                high_school_df = high_school_df.replace({
-                    'NA': 'Not Appeared',
-                    'N/A': 'Not Appeared',
-                    'N.A': 'Not Appeared',
-                    'n/a': 'Not Appeared',
-                    'na': 'Not Appeared',
-                    'n.a': 'Not Appeared',
-                    'N.A.': 'Not Appeared',
-                    'N/A/': 'Not Appeared'
-                })
-                high_school_unique_students = high_school_df["Student"].dropna().astype(str).str.strip().nunique()
-                df_main = df_main.merge(high_school_df, how="left", on="Student")
-            else:
-                st.warning("Could not load High School Data Sheet")
-        else:
-            st.info("High School Data Sheet not configured - using team data only")
+        return canonical_selection(selection_from_params(params))
+    except ValueError:
+        st.warning("Ignoring the % Marks range in the link: marks_min and marks_max must be finite numbers.")
+        params = {key: values for key, values in params.items() if key not in ["marks_min", "marks_max"]}
+        return canonical_selection(selection_from_params(params))
 
+def keep_filter_state():
+    """Seed the filter widgets' state (from the URL on a session's first run) and keep it when their view is not drawn"""
+    seed = url_selection() if filter_key("team") not in st.session_state else FILTER_DEFAULTS
+    for name, default in seed.items():
+        key = filter_key(name)
+        # Streamlit drops the state of widgets missing from a run unless it is set again
+        st.session_state[key] = st.session_state.get(key, default)
 
-        # Load Dropout Data from Google Drive
-        dropout_file_id = file_ids.get("dropout_data", "")
-        dropout_df = None
-        if dropout_file_id:
-            dropout_excel = load_excel_from_drive(service, dropout_file_id, "Dropout Data")
-            if dropout_excel:
-                # Use the first sheet
-                sheet_name = list(dropout_excel.keys())[0]
-                dropout_df = dropout_excel[sheet_name]
+def sync_url(selection):
+    """Write the canonical selection into the URL, leaving other query parameters alone"""
+    params = selection_to_params(selection)
+    for key in SELECTION_PARAMS:
+        if key in params:
+            if st.query_params.get_all(key) != params[key]:
+                st.query_params[key] = params[key]
+        elif key in st.query_params:
+            del st.query_params[key]
 
-        # Return all main dataframes
-        return df_main, high_school_unique_students, dropout_df
+def filter_widget_key(name, options):
+    """Session key of a filter widget, its value trimmed to the options the cascade still offers"""
+    key = filter_key(name)
+    value = st.session_state[key]
+    if isinstance(value, list):
+        kept = [v for v in value if v in options]
+        if kept != value:
+            st.session_state[key] = kept
+    elif value not in options:
+        st.session_state[key] = options[0]
+    return key
 
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        st.stop()
+def current_selection():
+    """The filter selection as last set on the Overall Analysis view"""
+    return {name: st.session_state[filter_key(name)] for name in FILTER_DEFAULTS}
 
 # Function to load logo from local file
 def get_logo_base64():
@@ -214,99 +297,16 @@ def get_logo_base64():
         return None
 
 # Load data and logo
-
-with st.spinner("Loading data from Google Drive..."):
-
-    df_main, high_school_unique_students, dropout_df = load_data()
-
+dataset = load_data()
+get_api_server()
+df_main, high_school_unique_students, dropout_df = dataset.df_main, dataset.high_school_unique_students, dataset.dropout_df
+history = dataset.history
+rankings, student_index, progress = dataset.rankings, dataset.student_index, dataset.progress
+data_version = get_data_refresher().status()["version"]
 
 # Load logo from local file
 logo_base64 = get_logo_base64()
 
-# ---- Clean up duplicate columns after merge ----
-if "Form_x" in df_main.columns or "Form_y" in df_main.columns:
-    df_main["Form"] = df_main.get("Form_x", pd.Series(dtype=object)).combine_first(df_main.get("Form_y", pd.Series(dtype=object)))
-    df_main = df_main.drop(columns=[col for col in ["Form_x", "Form_y"] if col in df_main.columns])
-if "School_x" in df_main.columns or "School_y" in df_main.columns:
-    df_main["School"] = df_main.get("School_x", pd.Series(dtype=object)).combine_first(df_main.get("School_y", pd.Series(dtype=object)))
-    df_main = df_main.drop(columns=[col for col in ["School_x", "School_y"] if col in df_main.columns])
-
-# ---- Data Cleaning ----
-if "School" in df_main.columns and "Student" in df_main.columns:
-    df_main = df_main[~(df_main["School"].isna() & df_main["Student"].isna())]
-    df_main = df_main[~((df_main["School"].astype(str).str.strip() == "") & (df_main["Student"].astype(str).str.strip() == ""))]
-elif "Student" in df_main.columns:
-    df_main = df_main[~(df_main["Student"].isna())]
-    df_main = df_main[~(df_main["Student"].astype(str).str.strip() == "")]
-
-subject_columns = [
-    "Maths", "English", "Kiswahili", "Chemistry", "Biology", "Physics", "CRE", "Geography",
-    "History", "Agriculture", "Business Studies", "French", "Computer studies", "Home Science",
-    "Woodwork"
-]
-
-def all_subjects_empty(row):
-    # Check if all subjects are either empty/NaN or "Not Appeared"
-    found_data = False
-    for col in subject_columns:
-        val = row.get(col, np.nan)
-        if pd.notna(val):
-            sval = str(val).strip()
-            # If value is not empty and not "Not Appeared", we have valid data
-            if sval != "" and sval != "Not Appeared":
-                found_data = True
-                break
-    return not found_data  # Return True if no valid data found (should be dropped)
-
-df_main = df_main[~df_main.apply(all_subjects_empty, axis=1)].reset_index(drop=True)
-
-# ---- Calculate M% (Overall Percentage) from Subject Scores ----
-def calculate_m_percentage(row):
-    """Calculate overall percentage (M%) from subject scores, ignoring empty/NA/Not Appeared values"""
-    valid_scores = []
-    
-    for col in subject_columns:
-        if col in row.index:  # Check if column exists
-            val = row[col]
-            if pd.notna(val):  # Not NaN/None
-                sval = str(val).strip()
-                # Skip empty strings and "Not Appeared"
-                if sval != "" and sval != "Not Appeared":
-                    try:
-                        # Try to convert to numeric
-                        numeric_val = float(sval)
-                        if 0 <= numeric_val <= 100:  # Valid score range
-                            valid_scores.append(numeric_val)
-                    except (ValueError, TypeError):
-                        # Skip non-numeric values
-                        continue
-    
-    # Calculate average if we have valid scores
-    if len(valid_scores) > 0:
-        return round(sum(valid_scores) / len(valid_scores), 2)
-    else:
-        return 0.0  # Return 0 if no valid scores found
-
-# Apply M% calculation to all rows
-df_main["M%"] = df_main.apply(calculate_m_percentage, axis=1)
-
-# ---- Add Remark Column Based on Mean Grade ----
-def grade_to_remark(grade):
-    if pd.isna(grade):
-        return "Unknown"
-    grade = str(grade).strip().upper()
-    if grade in ["B", "B+", "A-", "A"]:
-        return "Exceeding Expectation"
-    elif grade in ["C+", "B-"]:
-        return "Meeting Expectation"
-    elif grade in ["C", "C-", "D+", "D", "D-", "E"]:
-        return "Below Expectation"
-    else:
-        return "Unknown"
-
-if "Mean Grade" in df_main.columns:
-    df_main["Remark"] = df_main["Mean Grade"].apply(grade_to_remark)
-
 # ---- Page Title ----
 if logo_base64:
     st.markdown(f"""
@@ -326,11 +326,25 @@ else:
         </div>
     """, unsafe_allow_html=True)
 
-# ---- Tab Structure ----
-# tab1, tab2, tab3 = st.tabs(["📊 Overall Analysis", "👨‍🎓 Student Analysis", "📋 Detailed Data"])
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Overall Analysis", "👨‍🎓 Student Analysis", "📋 Detailed Data", "🚪 Dropouts"])
+# ---- Data Freshness ----
+refresh_status = get_data_refresher().status()
+status_text = {
+    "ok": "last refresh succeeded",
+    "restored": "restored from cache, checking for updates",
+    "refreshing": "refreshing in the background",
+    "error": f"last refresh failed ({refresh_status['last_error']}), showing last good data",
+}.get(refresh_status["state"], refresh_status["state"])
+st.caption(f"🔄 Data snapshot v{refresh_status['version']} · {format_age(refresh_status['snapshot_age_seconds'])} old · {status_text}")
+
+# ---- View Structure ----
+# Only the selected view is computed (st.tabs would run every tab on every rerun), and
+# each view is a fragment, so its own widgets rerun just that view
+VIEW_LABELS = ["📊 Overall Analysis", "👨‍🎓 Student Analysis", "📋 Detailed Data", "🚪 Dropouts", "⚠️ At Risk", "🧪 Data Quality", "🔄 What Changed"]
+view = st.radio("View", options=VIEW_LABELS, horizontal=True, key="view", label_visibility="collapsed")
+keep_filter_state()
 
-with tab1:
+@st.fragment
+def overall_view():
     # ---- Layout: Main Content and Filters Side by Side ----
     main_col, filter_col = st.columns([4, 1])
 
@@ -342,7 +356,8 @@ with tab1:
         """, unsafe_allow_html=True)
         
         # Step 1: Team selection
-        team = st.selectbox("Team Name", options=["All"] + sorted([str(x) for x in df_main["Team Name"].dropna().unique().tolist()]))
+        available_teams = ["All"] + sorted([str(x) for x in df_main["Team Name"].dropna().unique().tolist()])
+        team = st.selectbox("Team Name", options=available_teams, key=filter_widget_key("team", available_teams))
         
         # Filter data based on team selection for subsequent filters
         filtered_for_options = df_main.copy()
@@ -352,7 +367,7 @@ with tab1:
         # Step 2: Form selection (based on available forms for selected team)
         if "Form" in filtered_for_options.columns:
             available_forms = sorted([str(x) for x in filtered_for_options["Form"].dropna().unique().tolist()])
-            form = st.multiselect("Form", options=available_forms)
+            form = st.multiselect("Form", options=available_forms, key=filter_widget_key("form", available_forms))
             
             # Further filter for subsequent options
             if form:
@@ -361,9 +376,25 @@ with tab1:
             form = []
         
         # Step 3: Period selection (based on available periods for selected team/form)
-        available_periods = sorted([str(x) for x in filtered_for_options["Period"].dropna().unique().tolist()])
-        period = st.multiselect("Period (type to search)", options=available_periods, max_selections=5, help="Start typing to quickly find a period.")
-        
+        available_periods = [str(x) for x in filtered_for_options["Period"].dropna().unique().tolist()]
+        if history is not None:
+            # Closed periods are not in memory but can still be selected
+            available_periods += [p for _, p in history.closed_partitions([team] if team != "All" else None)]
+        available_periods = sorted(set(available_periods))
+        period = st.multiselect("Period (type to search)", options=available_periods, max_selections=MAX_PERIODS, help="Start typing to quickly find a period.",
+                                key=filter_widget_key("period", available_periods))
+        if history is not None and not period:
+            st.caption(f"Showing the latest {history.open_periods} periods per team; select a period to include older history.")
+
+        # Older, closed periods are loaded from the history store only when selected
+        df_view = with_history_periods(df_main, history, team, period)
+        if df_view is not df_main:
+            filtered_for_options = df_view
+            if team and team != "All":
+                filtered_for_options = filtered_for_options[filtered_for_options["Team Name"].astype(str) == team]
+            if form:
+                filtered_for_options = filtered_for_options[filtered_for_options["Form"].astype(str).isin(form)]
+
         # Further filter for subsequent options
         if period:
             filtered_for_options = filtered_for_options[filtered_for_options["Period"].astype(str).isin(period)]
@@ -371,7 +402,7 @@ with tab1:
         # Step 4: School selection (based on available schools for current selection)
         if "School" in filtered_for_options.columns:
             available_schools = sorted([str(x) for x in filtered_for_options["School"].dropna().unique().tolist()])
-            school = st.multiselect("School", options=available_schools)
+            school = st.multiselect("School", options=available_schools, key=filter_widget_key("school", available_schools))
             
             if school:
                 filtered_for_options = filtered_for_options[filtered_for_options["School"].astype(str).isin(school)]
@@ -381,7 +412,7 @@ with tab1:
         # Step 5: Mean Grade selection (based on available grades for current selection)
         if "Mean Grade" in filtered_for_options.columns:
             available_grades = sorted([str(x) for x in filtered_for_options["Mean Grade"].dropna().unique().tolist()])
-            grade = st.multiselect("Mean Grade", options=available_grades)
+            grade = st.multiselect("Mean Grade", options=available_grades, key=filter_widget_key("grade", available_grades))
             
             if grade:
                 filtered_for_options = filtered_for_options[filtered_for_options["Mean Grade"].astype(str).isin(grade)]
@@ -391,7 +422,7 @@ with tab1:
         # Step 6: Donor selection (based on available donors for current selection)
         if "Donor" in filtered_for_options.columns:
             available_donors = sorted([str(x) for x in filtered_for_options["Donor"].dropna().unique().tolist()])
-            donor = st.multiselect("Donor", options=available_donors)
+            donor = st.multiselect("Donor", options=available_donors, key=filter_widget_key("donor", available_donors))
             
             if donor:
                 filtered_for_options = filtered_for_options[filtered_for_options["Donor"].astype(str).isin(donor)]
@@ -401,44 +432,22 @@ with tab1:
         # Step 7: Home County selection (based on available counties for current selection)
         if "Home County" in filtered_for_options.columns:
             available_counties = sorted([str(x) for x in filtered_for_options["Home County"].dropna().unique().tolist()])
-            county = st.multiselect("Home County", options=available_counties)
+            county = st.multiselect("Home County", options=available_counties, key=filter_widget_key("county", available_counties))
         else:
             county = []
         
         # Step 8: Marks range slider
-        marks_range = st.slider("% Marks", 0, 100, (0, 100))
+        marks_range = st.slider("% Marks", 0, 100, key=filter_key("marks"))
 
     # ---- Apply Filters ----
-    filtered = df_main.copy()
-    
-    if team and team != "All":
-        filtered = filtered[filtered["Team Name"].astype(str) == team]
-    
-    if form:
-        filtered = filtered[filtered["Form"].astype(str).isin(form)]
-    
-    if period:
-        filtered = filtered[filtered["Period"].astype(str).isin(period)]
-    
-    if school:
-        filtered = filtered[filtered["School"].astype(str).isin(school)]
-    if grade:
-        filtered = filtered[filtered["Mean Grade"].astype(str).isin(grade)]
-    if donor:
-        filtered = filtered[filtered["Donor"].astype(str).isin(donor)]
-    if county:
-        filtered = filtered[filtered["Home County"].astype(str).isin(county)]
-    if "M%" in filtered.columns:
-        filtered = filtered[(filtered["M%"] >= marks_range[0]) & (filtered["M%"] <= marks_range[1])]
-    
-    filtered = filtered.copy()
-
-    # Ensure subject columns are numeric for calculations
-    for col in subject_columns:
-        if col in filtered.columns:
-            # Replace "Not Appeared" with NaN for numeric calculations
-            filtered[col] = filtered[col].replace("Not Appeared", np.nan)
-            filtered[col] = pd.to_numeric(filtered[col], errors='coerce')
+    selection = {
+        "team": team, "form": form, "period": period, "school": school,
+        "grade": grade, "donor": donor, "county": county, "marks": marks_range,
+    }
+    sync_url(selection)
+    # Computed once per snapshot and canonical selection, for every session
+    aggregates = get_selection_aggregates(df_main, history, rankings, selection_revision(selection), selection_key(selection))
+    subject_means = aggregates["subject_means"]
 
     with main_col:
         # ---- Summary Metrics ----
@@ -449,7 +458,7 @@ with tab1:
 
         with main_cols_row1[0]:
             st.markdown('<div class="metric-header">Number of Students</div>', unsafe_allow_html=True)
-            unique_students = filtered["Student"].nunique() if "Student" in filtered.columns else 0
+            unique_students = aggregates["students"]
             hs_students = high_school_unique_students if high_school_unique_students is not None else "N/A"
             st.markdown(f"""
                 <div class="metric-card">
@@ -463,8 +472,8 @@ with tab1:
             science_subjects = ["Maths", "Biology", "Chemistry", "Physics"]
             science_metrics = []
             for subject in science_subjects:
-                if subject in filtered.columns:
-                    science_metrics.append((subject, filtered[subject].mean()))
+                if subject in subject_means.index:
+                    science_metrics.append((subject, subject_means[subject]))
             
             if science_metrics:
                 sci_cols = st.columns(len(science_metrics))
@@ -484,8 +493,8 @@ with tab1:
             language_subjects = ["English", "Kiswahili", "French"]
             language_metrics = []
             for subject in language_subjects:
-                if subject in filtered.columns:
-                    language_metrics.append((subject, filtered[subject].mean()))
+                if subject in subject_means.index:
+                    language_metrics.append((subject, subject_means[subject]))
             
             if language_metrics:
                 lang_cols = st.columns(len(language_metrics))
@@ -508,8 +517,8 @@ with tab1:
             humanities_subjects = ["History", "Geography", "CRE"]
             humanities_metrics = []
             for subject in humanities_subjects:
-                if subject in filtered.columns:
-                    humanities_metrics.append((subject, filtered[subject].mean()))
+                if subject in subject_means.index:
+                    humanities_metrics.append((subject, subject_means[subject]))
             
             if humanities_metrics:
                 # Display humanities in a single horizontal line
@@ -530,8 +539,8 @@ with tab1:
             technical_subjects = ["Computer studies", "Business Studies", "Woodwork", "Home Science", "Agriculture"]
             technical_metrics = []
             for subject in technical_subjects:
-                if subject in filtered.columns:
-                    technical_metrics.append((subject, filtered[subject].mean()))
+                if subject in subject_means.index:
+                    technical_metrics.append((subject, subject_means[subject]))
             
             if technical_metrics:
                 # Display all technical subjects in a single horizontal line
@@ -550,8 +559,8 @@ with tab1:
         st.markdown("---")
         chart1, chart2 = st.columns(2)
 
-        if "Remark" in filtered.columns:
-            remark_counts = filtered["Remark"].value_counts()
+        if aggregates["remark_counts"] is not None:
+            remark_counts = aggregates["remark_counts"]
             fig1 = px.pie(
                 values=remark_counts.values,
                 names=remark_counts.index,
@@ -561,8 +570,8 @@ with tab1:
             fig1.update_traces(hovertemplate='<b>%{label}</b><br>Count: %{value}<br>Percentage: %{percent}<extra></extra>')
             chart1.plotly_chart(fig1, use_container_width=True)
 
-        if "Mean Grade" in filtered.columns:
-            grade_counts = filtered["Mean Grade"].value_counts()
+        if aggregates["grade_counts"] is not None:
+            grade_counts = aggregates["grade_counts"]
             if len(grade_counts) > 0:
                 # Define grade order for proper sorting
                 grade_order = ["A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "E"]
@@ -588,9 +597,8 @@ with tab1:
                 chart2.info("No grade data available for this selection.")
 
         chart3, chart4 = st.columns(2)
-        existing_subjects = [sub for sub in subject_columns if sub in filtered.columns]
-        if existing_subjects:
-            subject_avg = filtered[existing_subjects].mean().sort_values()
+        if not subject_means.empty:
+            subject_avg = subject_means.sort_values()
             concern_subjects = subject_avg[subject_avg < 55]
             if not concern_subjects.empty:
                 fig3 = px.bar(
@@ -607,9 +615,9 @@ with tab1:
             else:
                 chart3.info("No subjects of concern (all averages >= 55%).")
 
-        if "M%" in filtered.columns and "Student" in filtered.columns:
+        if aggregates["top_students"] is not None:
             # Restore original Top 5 Students by Overall Performance bar chart, but rename heading
-            top_students = filtered.sort_values("M%", ascending=False).drop_duplicates("Student").head(5)
+            top_students = aggregates["top_students"]
             fig4 = px.bar(
                 top_students,
                 x="Student",
@@ -625,29 +633,29 @@ with tab1:
             )
             chart4.plotly_chart(fig4, use_container_width=True)
 
-with tab2:
+        # ---- Rankings ----
+        if aggregates["ranked"] is not None:
+            st.markdown("---")
+            st.markdown("#### 🏆 Class and School Positions")
+            st.dataframe(aggregates["ranked"], use_container_width=True, hide_index=True, height=300)
+
+@st.fragment
+def student_view():
     st.markdown("### 👨‍🎓 Individual Student Analysis")
     # Student selector
     if "Student" in df_main.columns:
-        # Filter out non-student entries like "Category Distribution" and other system entries
-        student_list = []
-        for student in df_main["Student"].dropna().unique():
-            student_str = str(student).strip()
-            if (student_str and 
-                student_str not in ["Category Distribution", "CATEGORY DISTRIBUTION", "category distribution"] and
-                not student_str.lower().startswith("category") and
-                not student_str.lower().startswith("total") and
-                not student_str.lower().startswith("average") and
-                len(student_str) > 2):
-                student_list.append(student_str)
-        student_list = sorted(student_list)
-        selected_student = st.selectbox("Select a Student", options=student_list)
+        # Students are picked by name but looked up by Student ID, so spelling variants are one student
+        # (labels are unique, so the picked name maps back to exactly one ID)
+        label_ids = {label: key for key, label in get_student_labels(df_main, data_version).items() if key in student_index}
+        selected_student = st.selectbox("Select a Student", options=sorted(label_ids))
         if selected_student:
-            student_data = df_main[df_main["Student"] == selected_student]
+            selected_id = label_ids[selected_student]
+            student_data = df_main.iloc[student_index.get(selected_id, [])]
             if not student_data.empty:
                 col1, col2 = st.columns(2)
                 with col1:
                     st.markdown("#### 📊 Student Information")
+                    st.write(f"**Student ID:** {selected_id}")
                     if "School" in student_data.columns:
                         st.write(f"**School:** {student_data['School'].iloc[0] if not pd.isna(student_data['School'].iloc[0]) else 'N/A'}")
                     if "Form" in student_data.columns:
@@ -713,6 +721,27 @@ with tab2:
                         st.warning(f"**Subjects needing improvement:** {', '.join(subjects_below_60)}")
                     if subjects_above_80:
                         st.success(f"**Strong subjects:** {', '.join(subjects_above_80)}")
+                # Class and school positions for the selected period
+                period_ranks = rankings.reindex(period_data.index)
+                if not period_ranks.empty and "Class Position" in period_ranks.columns:
+                    student_ranks = period_ranks.iloc[0]
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        if pd.notna(student_ranks["Class Position"]):
+                            st.metric("Class Position", f"{int(student_ranks['Class Position'])} of {int(student_ranks['Class Size'])}")
+                    with col2:
+                        if "School Position" in period_ranks.columns and pd.notna(student_ranks["School Position"]):
+                            st.metric("School Position", f"{int(student_ranks['School Position'])} of {int(student_ranks['School Size'])}")
+                    with col3:
+                        if "Rank Change" in period_ranks.columns and pd.notna(student_ranks["Rank Change"]):
+                            st.metric("Class Rank Change", format_rank_change(student_ranks["Rank Change"]), delta=int(student_ranks["Rank Change"]))
+                    percentiles = {
+                        subject: student_ranks[f"{subject} Percentile"] for subject in subject_columns
+                        if f"{subject} Percentile" in period_ranks.columns and pd.notna(student_ranks[f"{subject} Percentile"])
+                    }
+                    if percentiles:
+                        st.caption("Subject percentiles within school and form: " + ", ".join(f"{subject} {value:.0f}" for subject, value in percentiles.items()))
+
                 # Show subjects with "Not Appeared" status only
                 not_appeared_subjects = []
                 for subject in subject_columns:
@@ -725,60 +754,20 @@ with tab2:
                 # Progress Over Time trend line graph
                                 # Student progress over time (if multiple periods available)
                 st.markdown("#### 📈 Progress Over Time")
-                student_all_periods = df_main[df_main["Student"] == selected_student]
+                student_all_periods = student_data
+                progress_df = student_progress(progress, selected_id)
+                if history is not None:
+                    student_history = load_student_history(history, data_version, selected_id)
+                    if not student_history.empty:
+                        student_all_periods = pd.concat([student_history, student_all_periods], ignore_index=True)
+                        # Closed periods are not part of the precomputed progress
+                        progress_df = student_progress(compute_progress(student_all_periods, subject_columns), selected_id)
                 
                 if "Period" in student_all_periods.columns:
                     unique_periods = student_all_periods["Period"].dropna().unique()
                     
-                    # Convert periods to numeric for proper sorting (e.g., "2.1" -> 2.1)
-                    def period_to_float(period_str):
-                        try:
-                            return float(str(period_str).strip())
-                        except:
-                            return 0.0
-                    
-                    # Sort periods numerically
-                    sorted_periods = sorted(unique_periods, key=period_to_float)
-                    
                     if len(unique_periods) > 1:
-                        # Create progress data for different metrics
-                        progress_data = []
-                        
-                        for period in sorted_periods:
-                            period_data = student_all_periods[student_all_periods["Period"] == period]
-                            if not period_data.empty:
-                                # Get the most recent record for this period (in case of duplicates)
-                                latest_record = period_data.iloc[-1]
-                                
-                                row_data = {"Period": str(period)}
-                                
-                                # Add M% if available and valid
-                                if "M%" in period_data.columns and pd.notna(latest_record["M%"]):
-                                    try:
-                                        m_percent = float(latest_record["M%"])
-                                        if m_percent > 0 and m_percent <= 100:  # Valid percentage range
-                                            row_data["Overall %"] = m_percent
-                                    except:
-                                        pass
-                                
-                                # Add individual subject scores for all available subjects
-                                for subject in subject_columns:
-                                    if subject in period_data.columns and pd.notna(latest_record[subject]):
-                                        try:
-                                            score_val = str(latest_record[subject]).strip()
-                                            if score_val != "Not Appeared" and score_val != "":
-                                                score = float(score_val)
-                                                if score > 0 and score <= 100:  # Valid score range
-                                                    row_data[subject] = score
-                                        except:
-                                            pass
-                                
-                                # Only add if we have at least one valid metric
-                                if len(row_data) > 1:
-                                    progress_data.append(row_data)
-                        
-                        if len(progress_data) > 1:
-                            progress_df = pd.DataFrame(progress_data)
+                        if len(progress_df) > 1:
                             
                             # Plot overall percentage trend if available
                             if "Overall %" in progress_df.columns and progress_df["Overall %"].notna().sum() > 1:
@@ -873,33 +862,15 @@ with tab2:
 
                 # Drop columns starting with 'Unnamed'
                 detailed_df = student_data.loc[:, ~student_data.columns.str.contains('^Unnamed')]
+                detailed_df = detailed_df.drop(columns=[col for col in PROVENANCE_COLUMNS if col in detailed_df.columns])
                 st.dataframe(detailed_df, use_container_width=True)
 
-# ---- Dropouts Tab ----
-with tab4:
+# ---- Dropouts View ----
+@st.fragment
+def dropouts_view():
     st.markdown("### 🚪 Dropouts Tracking")
     if dropout_df is not None and not dropout_df.empty:
-        df = dropout_df.copy()
-        # Try to fix columns if they are misaligned due to extra header rows
-        # Find the row where 'Student Name' appears and use it as header
-        header_row_idx = None
-        for idx, row in df.iterrows():
-            if 'Student Name' in row.values and 'Dropout Period' in row.values and 'Reason' in row.values:
-                header_row_idx = idx
-                break
-        if header_row_idx is not None:
-            df.columns = df.iloc[header_row_idx]
-            df = df.iloc[header_row_idx+1:]
-            df = df.reset_index(drop=True)
-        # Only keep the needed columns
-        needed_cols = ["Student Name", "Dropout Period", "Reason"]
-        df = df[[col for col in needed_cols if col in df.columns]]
-        # Remove rows where Student Name or Reason is empty or None
-        df = df[df["Student Name"].astype(str).str.strip() != ""]
-        df = df[df["Reason"].astype(str).str.strip() != ""]
-        # Format Dropout Period if needed (e.g., show as 'Aug-25')
-        if "Dropout Period" in df.columns:
-            df["Dropout Period"] = pd.to_datetime(df["Dropout Period"], errors='coerce').dt.strftime('%b-%y')
+        df = get_dropouts(dropout_df, data_version)
         st.dataframe(df, use_container_width=True)
         csv_data = df.to_csv(index=False)
         st.download_button(
@@ -911,12 +882,11 @@ with tab4:
     else:
         st.warning("No dropout data found or the file is empty.")
         # Diagnostic info
-        file_ids = st.secrets["google_drive_files"]
+        file_ids = get_file_ids()
         dropout_file_id = file_ids.get("dropout_data", "")
         st.text(f"Dropout file ID: {dropout_file_id}")
-        service = initialize_drive_service()
-        if dropout_file_id and service:
-            dropout_excel = load_excel_from_drive(service, dropout_file_id, "Dropout Data")
+        if dropout_file_id:
+            dropout_excel = load_excel_from_source(dropout_file_id, "Dropout Data")
             if dropout_excel:
                 st.text(f"Loaded sheets: {list(dropout_excel.keys())}")
                 sheet_name = list(dropout_excel.keys())[0]
@@ -924,19 +894,17 @@ with tab4:
                 st.text(f"Sheet '{sheet_name}' shape: {df_diag.shape}")
                 st.text(f"Columns: {list(df_diag.columns)}")
 
-with tab3:
-    st.markdown("### 📋 Detailed Student Data")
-    
-    # Note about filtering
-    if (team and team != "All") or form or period or school or grade or donor or county or marks_range != (0, 100):
-        st.info("📊 Data shown below reflects the current filter settings from the Overall Analysis tab.")
-    
+@st.cache_data(show_spinner=False, max_entries=256)
+def get_detailed_rows(_df, _history, revision, key):
+    """Rows of a selection as shown on the Detailed Data view, cached per data revision and canonical selection"""
+    filtered = get_filtered_rows(_df, _history, revision, key)
+
     # Clean up unwanted columns for display
     columns_to_remove = [
         'Unnamed: 0_x', 'Unnamed: 18', 'Unnamed: 20', 'Woodwork', 'M %', 'MM/MP', 
         'Guardian', 'Contact', 'Unnamed: 6', 'Unnamed: 0_y', 'Unnamed: 9', 
         'Unnamed: 10', 'Unnamed: 11'
-    ]
+    ] + PROVENANCE_COLUMNS
     
     # Create a display dataframe without unwanted columns
     display_df = filtered.copy()
@@ -976,6 +944,18 @@ with tab3:
     # Drop duplicate columns
     if columns_to_drop:
         display_df = display_df.drop(columns=columns_to_drop)
+    return display_df
+
+@st.fragment
+def detailed_view():
+    st.markdown("### 📋 Detailed Student Data")
+    selection = current_selection()
+    
+    # Note about filtering
+    if canonical_selection(selection) != FILTER_DEFAULTS:
+        st.info("📊 Data shown below reflects the current filter settings from the Overall Analysis view.")
+    
+    display_df = get_detailed_rows(df_main, history, selection_revision(selection), selection_key(selection))
     
     # Show summary statistics
     col1, col2, col3 = st.columns(3)
@@ -1015,3 +995,198 @@ with tab3:
             file_name=f"student_data_filtered_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
             mime="text/csv"
         )
+
+    # ---- Student Reports ----
+    st.markdown("---")
+    st.markdown("#### 🗂️ Student Reports")
+    report_students = []
+    if "Student" in display_df.columns:
+        report_ids = student_ids(display_df)[student_name_mask(display_df["Student"])]
+        labels = get_student_labels(df_main, data_version)
+        report_students = sorted((key for key in report_ids.dropna().unique() if key in student_index), key=lambda key: labels.get(key, key))
+    st.caption(f"One HTML report per student in the current selection ({len(report_students)} students): "
+               "student information, subject scores, progress over time, subjects not appeared and detailed records.")
+    if report_students and st.button(f"🗂️ Generate Reports for {len(report_students)} Students"):
+        with st.spinner("Rendering student reports..."):
+            # Reports are compressed into the archive as they finish; it only spills to disk when large
+            report_file = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024)
+            report_history = history.load_students(report_students) if history is not None else None
+            payloads = build_report_payloads(df_main, report_students, student_index, progress, rankings, subject_columns,
+                                             history=report_history)
+            report_count = write_reports_zip(payloads, report_file, processes=dict(st.secrets.get("ingest", {})).get("processes"))
+            report_file.seek(0)
+        st.download_button(
+            label=f"📥 Download {report_count} Student Reports (zip)",
+            data=report_file.read(),
+            file_name=f"student_reports_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.zip",
+            mime="application/zip",
+            on_click="ignore"
+        )
+        report_file.close()
+
+# ---- At-Risk View ----
+@st.fragment
+def at_risk_view():
+    st.markdown("### ⚠️ At-Risk Students")
+    st.caption("Every student is scored on their M% trend across all periods (closed history periods included), subjects below the pass mark in the latest period, "
+               "how often subjects are \"Not Appeared\" and proximity to the dropout list.")
+
+    # Defaults come from [early_warning] in secrets and can be adjusted here
+    ew_config = {**DEFAULT_THRESHOLDS, **dict(st.secrets.get("early_warning", {}))}
+    with st.expander("⚙️ Thresholds"):
+        th_col1, th_col2, th_col3 = st.columns(3)
+        with th_col1:
+            below_score = st.number_input("Pass mark (%)", 0, 100, int(ew_config["below_score"]))
+            decline_per_period = st.number_input("M% drop per period counted as maximum trend risk", 0.5, 50.0, float(ew_config["decline_per_period"]), step=0.5)
+        with th_col2:
+            not_appeared_rate = st.slider("\"Not Appeared\" share counted as maximum attendance risk", 0.05, 1.0, float(ew_config["not_appeared_rate"]), step=0.05)
+        with th_col3:
+            high_risk = st.slider("High risk from score", 0.0, 1.0, float(ew_config["high_risk"]), step=0.05)
+            medium_risk = st.slider("Medium risk from score", 0.0, 1.0, float(ew_config["medium_risk"]), step=0.05)
+    thresholds = {
+        "below_score": below_score,
+        "decline_per_period": decline_per_period,
+        "not_appeared_rate": not_appeared_rate,
+        "high_risk": high_risk,
+        "medium_risk": medium_risk,
+    }
+
+    at_risk = get_at_risk_table(df_main, dropout_df, history, data_version, tuple(sorted(thresholds.items())))
+    if at_risk.empty:
+        st.info("No student data available for scoring.")
+    else:
+        level_counts = at_risk["Risk Level"].value_counts()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("High Risk", int(level_counts.get("High", 0)))
+        with col2:
+            st.metric("Medium Risk", int(level_counts.get("Medium", 0)))
+        with col3:
+            st.metric("Low Risk", int(level_counts.get("Low", 0)))
+
+        risk_levels = st.multiselect("Risk Level", options=["High", "Medium", "Low"], default=["High", "Medium"])
+        shown_risk = at_risk[at_risk["Risk Level"].isin(risk_levels)] if risk_levels else at_risk
+        st.dataframe(
+            shown_risk,
+            use_container_width=True,
+            hide_index=True,
+            height=600,
+            column_config={
+                "Risk Score": st.column_config.ProgressColumn("Risk Score", min_value=0, max_value=100, format="%.1f"),
+            },
+        )
+        st.download_button(
+            label="📥 Download At-Risk List as CSV",
+            data=shown_risk.to_csv(index=False),
+            file_name=f"at_risk_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+
+# ---- Data Quality View ----
+@st.fragment
+def data_quality_view():
+    st.markdown("### 🧪 Data Quality")
+    quality = dataset.quality
+    if quality is None:
+        st.info("No data-quality report for this snapshot yet; the next refresh produces one.")
+    elif quality.anomalies.empty:
+        st.success("No data-quality issues were found at ingest.")
+    else:
+        anomalies = quality.anomalies
+        action_counts = anomalies["Action"].value_counts()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Issues Found", len(anomalies))
+        with col2:
+            st.metric("Rows Quarantined", len(quality.quarantined))
+        with col3:
+            st.metric("Scores Cleared", int(action_counts.get("cleared", 0)))
+        with col4:
+            st.metric("Rows Flagged", int(action_counts.get("flagged", 0)))
+        st.caption("Summary rows and duplicate student/period rows are quarantined (the last duplicate is kept), "
+                   "scores that are not numbers in 0-100 are cleared, and unknown Mean Grades and students missing "
+                   "from the High School Data Sheet are flagged. Source Row is the row number in the Excel sheet.")
+
+        st.markdown("#### Issues by File and Sheet")
+        st.dataframe(get_quality_summary(quality, data_version), use_container_width=True, hide_index=True)
+
+        st.markdown("#### Issue Details")
+        checks = st.multiselect("Check", options=sorted(anomalies["Check"].unique()), format_func=lambda check: CHECK_LABELS.get(check, check))
+        shown_anomalies = anomalies[anomalies["Check"].isin(checks)] if checks else anomalies
+        shown_anomalies = shown_anomalies.assign(Check=shown_anomalies["Check"].map(CHECK_LABELS).fillna(shown_anomalies["Check"]))
+        st.dataframe(shown_anomalies, use_container_width=True, hide_index=True, height=400)
+        st.download_button(
+            label="📥 Download Data Quality Report as CSV",
+            data=shown_anomalies.to_csv(index=False),
+            file_name=f"data_quality_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+
+        if not quality.quarantined.empty:
+            with st.expander(f"🚫 Quarantined Rows ({len(quality.quarantined)})"):
+                st.dataframe(quality.quarantined, use_container_width=True, hide_index=True)
+
+# ---- What Changed View ----
+@st.cache_data(show_spinner="Comparing snapshots...", max_entries=8)
+def compare_with_version(_archive, _df, _history, data_version, version):
+    """Differences from a stored snapshot version to the current rows"""
+    diff = diff_rows(_archive.load(version), _df)
+    return drop_closed(diff, _history.closed_partitions()) if _history is not None else diff
+
+@st.fragment
+def changes_view():
+    st.markdown("### 🔄 What Changed")
+    archive = get_data_refresher().archive
+    versions = [entry["version"] for entry in archive.versions() if entry["version"] < data_version] if archive is not None else []
+    diff = dataset.diff
+    since = "the previous refresh"
+    if versions:
+        compare = st.selectbox(
+            "Compare with", options=[None] + versions[::-1],
+            format_func=lambda version: "Previous refresh" if version is None else f"Snapshot v{version}",
+        )
+        if compare is not None:
+            try:
+                diff = compare_with_version(archive, df_main, history, data_version, compare)
+            except Exception as e:
+                st.error(f"Could not read snapshot v{compare}: {str(e)}")
+                return
+            since = f"snapshot v{compare}"
+    if diff is None:
+        st.info("No earlier snapshot to compare with yet; changes show up here after the next refresh.")
+        return
+
+    counts = summarize_diff(diff)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Rows Added", counts["added"])
+    with col2:
+        st.metric("Rows Removed", counts["removed"])
+    with col3:
+        st.metric("Rows Changed", counts["changed"])
+    with col4:
+        st.metric("Values Changed", counts["cells"])
+    st.caption(f"Snapshot v{data_version} compared with {since}. Rows are matched by Student ID, Period and Team Name; "
+               "periods moved to the history store are not counted as removed.")
+    if not any(counts.values()):
+        st.success("Nothing changed in the data.")
+        return
+
+    if not diff.cells.empty:
+        st.markdown("#### Changed Values")
+        columns = st.multiselect("Column", options=sorted(diff.cells["Column"].unique()), key="changes_columns")
+        shown_cells = diff.cells[diff.cells["Column"].isin(columns)] if columns else diff.cells
+        st.dataframe(shown_cells, use_container_width=True, hide_index=True, height=400)
+        st.download_button(
+            label="📥 Download Changes as CSV",
+            data=shown_cells.to_csv(index=False),
+            file_name=f"changes_v{data_version}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+    for label, rows in [("➕ Added Rows", diff.added), ("➖ Removed Rows", diff.removed)]:
+        if not rows.empty:
+            with st.expander(f"{label} ({len(rows)})"):
+                st.dataframe(rows.loc[:, ~rows.columns.duplicated()], use_container_width=True, hide_index=True)
+
+VIEWS = dict(zip(VIEW_LABELS, [overall_view, student_view, detailed_view, dropouts_view, at_risk_view, data_quality_view, changes_view]))
+VIEWS[view]()
@@ -0,0 +1,105 @@
+"""Per-student lookups shared by the student page and the bulk reports.
+
+Both are built once per snapshot with vectorized pandas operations: finding a
+student's rows is a dictionary lookup instead of a scan of the whole dataset, and
+their progress across periods is already laid out per period. Students are keyed
+by their Student ID (see identity), so spelling variants share one entry.
+"""
+import pandas as pd
+
+from identity import ID_COLUMN
+from rankings import period_numbers
+
+
+def student_keys(names):
+    """Student names with surrounding whitespace removed"""
+    return names.astype("string").str.strip()
+
+def student_ids(df):
+    """Student ID of each row"""
+    return df[ID_COLUMN].astype("string")
+
+def student_name_mask(names):
+    """Vectorized check for real student names, excluding summary rows such as 'Category Distribution', 'Total' or 'Average'"""
+    names = names.astype("string").str.strip()
+    lowered = names.str.lower()
+    return (
+        names.notna()
+        & (names.str.len() > 2)
+        & ~lowered.str.startswith("category")
+        & ~lowered.str.startswith("total")
+        & ~lowered.str.startswith("average")
+    ).fillna(False).astype(bool)
+
+def build_student_index(df):
+    """Map each Student ID to the positions of its rows in df"""
+    if df.empty or "Student" not in df.columns:
+        return {}
+    # Positional labels, so the index holds iloc positions whatever df's index is
+    keys = student_ids(df).reset_index(drop=True)
+    keys = keys[keys.notna() & (keys != "")]
+    return {key: positions.to_numpy() for key, positions in keys.groupby(keys, sort=False).groups.items()}
+
+def student_labels(df):
+    """Display name of each Student ID: its latest spelling, with the school added where two students share a name"""
+    if df.empty or "Student" not in df.columns:
+        return {}
+    frame = pd.DataFrame({
+        "key": student_ids(df),
+        "name": df["Student"].astype("string").str.strip(),
+        "school": df["School"].astype("string").fillna("N/A") if "School" in df.columns else "N/A",
+        "order": period_numbers(df["Period"]) if "Period" in df.columns else 0.0,
+    }, index=df.index)
+    frame = frame[frame["key"].notna() & student_name_mask(df["Student"])]
+    latest = frame.sort_values("order", kind="stable").drop_duplicates("key", keep="last")
+    labels = latest["name"].where(~latest["name"].duplicated(keep=False), latest["name"] + " (" + latest["school"] + ")")
+    labels = labels.where(~labels.duplicated(keep=False), labels + " · " + latest["key"])
+    return dict(zip(latest["key"], labels))
+
+def valid_scores(values):
+    """Numeric scores in (0, 100]; "Not Appeared", blanks and out-of-range values become NaN"""
+    scores = pd.to_numeric(values, errors="coerce")
+    return scores.where((scores > 0) & (scores <= 100))
+
+def compute_progress(df, subjects):
+    """Overall % and subject scores of every student per period, in period order.
+
+    As on the student page, the last record of each student and period is used and
+    periods without any valid score are left out. Columns: Student ID, Period, Overall %
+    and one column per subject.
+    """
+    columns = [ID_COLUMN, "Period", "Overall %"] + list(subjects)
+    if df.empty or "Student" not in df.columns or "Period" not in df.columns:
+        return pd.DataFrame(columns=columns)
+    progress = pd.DataFrame({
+        ID_COLUMN: student_ids(df),
+        "Period": df["Period"].astype(str),
+        "order": period_numbers(df["Period"]),
+        "Overall %": valid_scores(df["M%"]) if "M%" in df.columns else float("nan"),
+    }, index=df.index)
+    for subject in subjects:
+        progress[subject] = valid_scores(df[subject]) if subject in df.columns else float("nan")
+    progress = progress[progress[ID_COLUMN].notna() & df["Period"].notna()]
+    progress = (
+        progress.sort_values([ID_COLUMN, "order"], kind="stable")
+        .drop_duplicates([ID_COLUMN, "Period"], keep="last")
+        .dropna(how="all", subset=columns[2:])
+    )
+    return progress[columns].reset_index(drop=True)
+
+def update_progress(previous_progress, df, students, subjects):
+    """compute_progress(df, subjects) from an earlier table, recomputing only the given Student IDs"""
+    columns = [ID_COLUMN, "Period", "Overall %"] + list(subjects)
+    if previous_progress is None or list(previous_progress.columns) != columns or ID_COLUMN not in df.columns:
+        return compute_progress(df, subjects)
+    students = set(students)
+    kept = previous_progress[~previous_progress[ID_COLUMN].isin(students)]
+    redone = compute_progress(df[student_ids(df).isin(students).fillna(False).to_numpy()], subjects)
+    progress = pd.concat([part for part in [kept, redone] if not part.empty] or [redone], ignore_index=True)
+    # Each student's rows are already in period order
+    return progress.sort_values(ID_COLUMN, kind="stable").reset_index(drop=True)
+
+def student_progress(progress, student):
+    """One student's rows of a compute_progress table, without columns that have no scores"""
+    rows = progress[progress[ID_COLUMN] == student].drop(columns=ID_COLUMN)
+    return rows.dropna(axis=1, how="all").reset_index(drop=True)
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import load_dataset
+from fixture_workbooks import app_secrets, write_fixtures
+from settings import create_data_source, get_file_ids
+
+
+@pytest.fixture(scope="session")
+def workbooks(tmp_path_factory):
+    """Folder of generated team, high school and dropout workbooks, read as a local fake Drive"""
+    root = str(tmp_path_factory.mktemp("workbooks"))
+    write_fixtures(root, teams=2, periods=3, students=12, seed=1)
+    return root
+
+@pytest.fixture
+def secrets(workbooks, tmp_path):
+    """App secrets over the fixture workbooks, with every cache under tmp_path"""
+    return app_secrets(workbooks, str(tmp_path))
+
+@pytest.fixture(scope="session")
+def dataset(workbooks, tmp_path_factory):
+    """Dataset prepared from the fixture workbooks"""
+    secrets = app_secrets(workbooks, str(tmp_path_factory.mktemp("cache")))
+    return load_dataset(create_data_source(secrets), get_file_ids(secrets), secrets["teams"], secrets["ingest"])
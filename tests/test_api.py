@@ -0,0 +1,87 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api import ApiServer
+from settings import create_refresher, create_snapshot_reader
+from test_refresher import wait_for
+
+
+def get(server, path, headers=None):
+    """(status, headers, JSON body) of a GET request"""
+    request = urllib.request.Request(server.url + path, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, e.headers, json.loads(body) if body else None
+
+@pytest.fixture
+def refresher(secrets):
+    refresher = create_refresher(secrets).start()
+    assert refresher.wait_for_snapshot(timeout=120) is not None, refresher.status()["last_error"]
+    assert wait_for(lambda: os.path.exists(refresher.cache_path))
+    yield refresher
+    refresher.stop()
+
+def serve(source):
+    return ApiServer(source, port=0).start()
+
+def test_data_responses_are_revalidated_with_etags(refresher):
+    server = serve(refresher)
+    try:
+        status, headers, _ = get(server, "/summary")
+        assert status == 200
+        status, _, _ = get(server, "/summary", {"If-None-Match": headers["ETag"]})
+        assert status == 304
+    finally:
+        server.stop()
+
+def test_health_has_no_etag(refresher):
+    server = serve(refresher)
+    try:
+        status, headers, body = get(server, "/health")
+        assert status == 200
+        assert "ETag" not in headers
+        assert body["version"] == 1
+    finally:
+        server.stop()
+
+def test_standalone_api_follows_the_persisted_snapshot(refresher, secrets):
+    files_before = sorted(os.listdir(os.path.dirname(refresher.cache_path)))
+    reader = create_snapshot_reader(secrets)
+    server = serve(reader)
+    try:
+        status, _, body = get(server, "/rows?limit=1")
+        assert status == 200
+        assert body["total"] == len(refresher.get_snapshot().dataset.df_main)
+
+        refresher.refresh_now()
+        assert wait_for(lambda: reader.get_snapshot().version == 2)
+        assert get(server, "/health")[2]["version"] == 2
+    finally:
+        server.stop()
+    # The reader never writes next to the dashboard's cache
+    assert sorted(os.listdir(os.path.dirname(refresher.cache_path))) == files_before
+
+def test_standalone_api_waits_for_the_dashboard(tmp_path):
+    reader = create_snapshot_reader({"refresh": {"cache_path": str(tmp_path / "snapshot.pkl")}})
+    server = serve(reader)
+    try:
+        assert get(server, "/summary")[0] == 503
+        assert reader.status()["state"] == "waiting"
+    finally:
+        server.stop()
+
+def test_non_finite_marks_are_a_bad_request(refresher):
+    server = serve(refresher)
+    try:
+        status, _, body = get(server, "/summary?marks_min=inf")
+        assert status == 400
+        assert "finite" in body["error"]
+    finally:
+        server.stop()
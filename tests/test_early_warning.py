@@ -0,0 +1,38 @@
+import pandas as pd
+
+from data_loader import subject_columns
+from early_warning import score_students
+
+
+def test_earlier_periods_count_in_the_trend(dataset):
+    df = dataset.df_main
+    latest = df["Period"] == df["Period"].max()
+    full = score_students(df, subject_columns).set_index("Student ID")
+
+    open_only = score_students(df[latest], subject_columns).set_index("Student ID")
+    with_earlier = score_students(df[latest], subject_columns, earlier=df[~latest]).set_index("Student ID")
+
+    assert open_only["M% Trend / Period"].isna().all()
+    trend = with_earlier["M% Trend / Period"]
+    assert trend.notna().any()
+    pd.testing.assert_series_equal(trend, full.loc[trend.index, "M% Trend / Period"])
+
+def test_earlier_rows_do_not_add_students(dataset):
+    df = dataset.df_main
+    latest = df["Period"] == df["Period"].max()
+    scored_rows = df[latest].iloc[5:]
+
+    scored = score_students(scored_rows, subject_columns, earlier=df[~latest])
+
+    assert set(scored["Student ID"]) == set(scored_rows["Student ID"])
+
+def test_text_period_labels_keep_their_order_in_the_trend(dataset):
+    df = dataset.df_main
+    order = sorted(df["Period"].dropna().unique(), key=float)
+    relabeled = df.assign(Period=df["Period"].map({period: f"Term {i} 2024" for i, period in enumerate(order, start=1)}))
+
+    trend = score_students(relabeled, subject_columns).set_index("Student ID")["M% Trend / Period"]
+
+    assert trend.notna().any()
+    expected = score_students(df, subject_columns).set_index("Student ID")["M% Trend / Period"]
+    pd.testing.assert_series_equal(trend, expected.loc[trend.index])
@@ -0,0 +1,49 @@
+import pytest
+
+from filters import (
+    DEFAULT_MARKS, FILTER_COLUMNS, MAX_PERIODS, canonical_selection, selection_from_params, selection_key,
+    selection_to_params,
+)
+
+
+def test_empty_selection_is_every_filter_at_its_default():
+    canonical = canonical_selection({})
+
+    assert canonical["team"] == "All"
+    assert all(canonical[key] == [] for key in FILTER_COLUMNS if key != "team")
+    assert canonical["marks"] == DEFAULT_MARKS
+
+def test_values_become_sorted_unique_strings():
+    canonical = canonical_selection({"team": None, "period": [2.1, "1.1", 2.1], "form": "Form 2"})
+
+    assert canonical["team"] == "All"
+    assert canonical["period"] == ["1.1", "2.1"]
+    assert canonical["form"] == ["Form 2"]
+
+def test_equal_views_share_a_key():
+    assert selection_key({"form": ["Form 2", "Form 1"]}) == selection_key({"form": ["Form 1", "Form 2", "Form 1"], "team": "All"})
+
+def test_periods_are_capped():
+    canonical = canonical_selection({"period": [f"{i}.1" for i in range(MAX_PERIODS + 3)]})
+
+    assert len(canonical["period"]) == MAX_PERIODS
+
+@pytest.mark.parametrize("marks, expected", [
+    ((-20, 150), (0, 100)),
+    ((80.6, 30.2), (30, 81)),
+    ((101, 120), (100, 100)),
+])
+def test_marks_are_whole_percents_within_range(marks, expected):
+    assert canonical_selection({"marks": marks})["marks"] == expected
+
+def test_params_round_trip():
+    selection = canonical_selection({"team": "Team 1", "period": ["1.2", "1.1"], "marks": (40, 90)})
+
+    assert canonical_selection(selection_from_params(selection_to_params(selection))) == selection
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "Infinity", "abc"])
+def test_non_finite_marks_are_rejected(value):
+    with pytest.raises(ValueError):
+        selection_from_params({"marks_min": [value]})
+    with pytest.raises(ValueError):
+        selection_from_params({"marks_max": [value]})
@@ -0,0 +1,52 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frame_codec import decode_frame, encode_frame
+
+
+def round_trip(df):
+    fmt, payload = encode_frame(df)
+    return fmt, decode_frame((fmt, payload))
+
+def test_mixed_columns_keep_their_value_types():
+    df = pd.DataFrame({
+        "Student": ["Mary Achieng", "Brian Otieno", None],
+        "Maths": [72, "Not Appeared", 64.5],
+        "English": [np.nan, 58, "Not Appeared"],
+        "M%": [70.25, 61.0, np.nan],
+    })
+
+    fmt, decoded = round_trip(df)
+
+    assert fmt == "arrow"
+    pd.testing.assert_frame_equal(decoded, df)
+    assert [type(value) for value in decoded["Maths"]] == [int, str, float]
+
+def test_all_nan_columns_round_trip():
+    df = pd.DataFrame({"Remark": [np.nan, np.nan], "Notes": pd.Series([np.nan, np.nan], dtype=object), "M%": [50.0, 60.0]})
+
+    fmt, decoded = round_trip(df)
+
+    assert fmt == "arrow"
+    pd.testing.assert_frame_equal(decoded, df)
+
+def test_duplicate_column_names_round_trip():
+    df = pd.DataFrame([[1, "Not Appeared", 2.5], [3, 4, np.nan]], columns=["Score", "Score", "Score"])
+
+    fmt, decoded = round_trip(df)
+
+    assert fmt == "arrow"
+    assert list(decoded.columns) == ["Score", "Score", "Score"]
+    pd.testing.assert_frame_equal(decoded, df)
+
+@pytest.mark.parametrize("value", [datetime.date(2024, 1, 5), {"term": 1}, True])
+def test_values_arrow_cannot_hold_fall_back_to_pickle(value):
+    df = pd.DataFrame({"Student": ["Mary Achieng", "Brian Otieno"], "Extra": [value, "text"]})
+
+    fmt, decoded = round_trip(df)
+
+    assert fmt == "pickle"
+    pd.testing.assert_frame_equal(decoded, df)
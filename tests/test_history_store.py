@@ -0,0 +1,39 @@
+import pandas as pd
+
+from history_store import HistoryStore
+
+
+def raw_rows(periods):
+    return pd.DataFrame([
+        {"Team Name": "Team 1", "Period": period, "Student": f"Student {i}", "Maths": 50 + i}
+        for period in periods for i in range(3)
+    ])
+
+def test_sync_closes_old_periods_and_keeps_the_open_ones(tmp_path):
+    store = HistoryStore(str(tmp_path), open_periods=2)
+
+    open_rows = store.sync(raw_rows(["1.1", "1.2", "2.1"]), lambda rows: rows)
+
+    assert sorted(open_rows["Period"].unique()) == ["1.2", "2.1"]
+    assert store.closed_partitions() == [("Team 1", "1.1")]
+    assert len(store.load(store.closed_partitions())) == 3
+
+def test_closed_partitions_follow_sync_without_rereading_the_manifest(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path), open_periods=1)
+    store.sync(raw_rows(["1.1", "1.2"]), lambda rows: rows)
+    assert store.closed_partitions() == [("Team 1", "1.1")]
+
+    reads = []
+    monkeypatch.setattr(store, "read_manifest", lambda: reads.append(1) or {})
+    store.closed_partitions(["Team 1"])
+    assert store.closed_partitions(["Team 2"]) == []
+    assert reads == []
+
+    monkeypatch.undo()
+    store.sync(raw_rows(["1.1", "1.2", "2.1"]), lambda rows: rows)
+    assert store.closed_partitions() == [("Team 1", "1.1"), ("Team 1", "1.2")]
+
+def test_a_new_store_reads_closed_partitions_from_disk(tmp_path):
+    HistoryStore(str(tmp_path), open_periods=1).sync(raw_rows(["1.1", "1.2"]), lambda rows: rows)
+
+    assert HistoryStore(str(tmp_path), open_periods=1).closed_partitions() == [("Team 1", "1.1")]
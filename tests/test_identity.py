@@ -0,0 +1,143 @@
+import pandas as pd
+
+from data_loader import assign_student_ids
+from identity import ID_COLUMN, StudentRegistry, normalize_names
+
+
+def records(rows):
+    """Student rows from (student, school, sheet) tuples, in Form 1, or (student, school, sheet, form) tuples"""
+    return pd.DataFrame([
+        {"Student": row[0], "School": row[1], "Form": row[3] if len(row) > 3 else "Form 1",
+         "Source File": "Team 1 Results.xlsx", "Source Sheet": row[2]}
+        for row in rows
+    ])
+
+def test_normalize_names_ignores_case_accents_punctuation_and_word_order():
+    names = pd.Series(["Mary  Achieng", "mary achieng", "Achieng Mary", "Mary Achieng'", "Márý Áchieng", None])
+
+    normalized = normalize_names(names)
+
+    assert normalized[:5].nunique() == 1
+    assert normalized.isna().tolist() == [False] * 5 + [True]
+
+def test_spelling_variants_on_different_sheets_are_merged():
+    ids = StudentRegistry().resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1"),
+        ("Mary Wanjiku Achiang", "School A", "1.2"),
+        ("Brian Kiprono Otieno", "School A", "1.2"),
+    ]))
+
+    assert ids[0] == ids[1]
+    assert ids[2] != ids[0]
+
+def test_similar_names_on_the_same_sheet_stay_apart():
+    ids = StudentRegistry().resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1"),
+        ("Mary Wanjiku Achiang", "School A", "1.1"),
+    ]))
+
+    assert ids[0] != ids[1]
+
+def test_same_name_in_another_school_is_another_student():
+    ids = StudentRegistry().resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1"),
+        ("Mary Wanjiku Achieng", "School B", "1.1"),
+    ]))
+
+    assert ids[0] != ids[1]
+
+def test_rows_without_a_name_get_no_id():
+    ids = StudentRegistry().resolve(records([("Mary Wanjiku Achieng", "School A", "1.1"), ("  ", "School A", "1.1")]))
+
+    assert ids.isna().tolist() == [False, True]
+
+def test_overrides_merge_and_split(tmp_path):
+    overrides = tmp_path / "overrides.csv"
+    pd.DataFrame([
+        # Merge two names the matcher would keep apart
+        {"Student": "Mary Wanjiku Achieng", "School": "School A", ID_COLUMN: "S-MARY"},
+        {"Student": "Achieng Wambui", "School": "", ID_COLUMN: "S-MARY"},
+        # Split two spellings the matcher would merge
+        {"Student": "Brian Kiprono Otieno", "School": "School A", ID_COLUMN: "S-BRIAN-1"},
+        {"Student": "Brian Kiprono Otieni", "School": "School A", ID_COLUMN: "S-BRIAN-2"},
+    ]).to_csv(overrides, index=False)
+    rows = records([
+        ("Mary Wanjiku Achieng", "School A", "1.1"),
+        ("Achieng Wambui", "School A", "1.2"),
+        ("Brian Kiprono Otieno", "School A", "1.1"),
+        ("Brian Kiprono Otieni", "School A", "1.2"),
+    ])
+
+    ids = StudentRegistry(overrides_path=str(overrides)).resolve(rows)
+
+    assert ids.tolist() == ["S-MARY", "S-MARY", "S-BRIAN-1", "S-BRIAN-2"]
+    matched = StudentRegistry().resolve(rows)
+    assert matched[0] != matched[1]
+    assert matched[2] == matched[3]
+
+def test_ids_are_remembered_between_runs(tmp_path):
+    registry = StudentRegistry(str(tmp_path / "student_ids.csv"))
+    first = registry.resolve(records([("Mary Wanjiku Achieng", "School A", "1.1"), ("Mary Wanjiku Achiang", "School A", "1.2")]))
+
+    # Without the first sheet the misspelling alone still maps to the merged student
+    later = registry.resolve(records([("Mary Wanjiku Achiang", "School A", "2.1")]))
+
+    assert first[0] == first[1] == later[0]
+    saved = pd.read_csv(tmp_path / "student_ids.csv", dtype=str)
+    assert sorted(saved["Student"]) == ["Mary Wanjiku Achiang", "Mary Wanjiku Achieng"]
+
+def test_same_name_in_two_forms_of_one_sheet_is_two_students():
+    ids = StudentRegistry().resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 1"),
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 3"),
+        ("Mary Wanjiku Achieng", "School A", "1.2", "Form 3"),
+    ]))
+
+    assert ids[0] != ids[1]
+    assert ids[1] == ids[2]
+
+def test_same_name_moving_up_a_form_is_one_student():
+    ids = StudentRegistry().resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 1"),
+        ("Mary Wanjiku Achieng", "School A", "2.1", "Form 2"),
+    ]))
+
+    assert ids[0] == ids[1]
+
+def test_overrides_split_one_name_by_form(tmp_path):
+    overrides = tmp_path / "overrides.csv"
+    pd.DataFrame([
+        {"Student": "Mary Wanjiku Achieng", "School": "School A", "Form": "Form 1", ID_COLUMN: "S-MARY-1"},
+        {"Student": "Mary Wanjiku Achieng", "School": "School A", "Form": "Form 2", ID_COLUMN: "S-MARY-2"},
+    ]).to_csv(overrides, index=False)
+
+    ids = StudentRegistry(overrides_path=str(overrides)).resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 1"),
+        ("Mary Wanjiku Achieng", "School A", "2.1", "Form 2"),
+    ]))
+
+    assert ids.tolist() == ["S-MARY-1", "S-MARY-2"]
+
+def test_ids_remembered_before_a_split_are_not_shared(tmp_path):
+    registry = StudentRegistry(str(tmp_path / "student_ids.csv"))
+    # A mapping written before forms were part of the key
+    pd.DataFrame([{"Student": "Mary Wanjiku Achieng", "School": "School A", ID_COLUMN: "S-MARY"}]).to_csv(
+        registry.path, index=False,
+    )
+
+    ids = registry.resolve(records([
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 1"),
+        ("Mary Wanjiku Achieng", "School A", "1.1", "Form 3"),
+    ]))
+
+    assert "S-MARY" in ids.tolist()
+    assert ids.nunique() == 2
+
+def test_high_school_sheet_without_valid_names_gets_no_ids():
+    team_rows = records([("Mary Wanjiku Achieng", "School A", "1.1")])
+    high_school = pd.DataFrame({"Student": ["  ", None], "School": ["School A", "School A"]})
+
+    team_rows, high_school = assign_student_ids(team_rows, high_school, StudentRegistry())
+
+    assert team_rows[ID_COLUMN].notna().all()
+    assert high_school[ID_COLUMN].isna().all()
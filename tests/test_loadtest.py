@@ -0,0 +1,46 @@
+import pytest
+
+from fixture_workbooks import app_secrets, write_fixtures
+from loadtest import SCENARIO, compare, run_level, start_server, stop_server, write_secrets
+from settings import load_secrets
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    """The dashboard served by `streamlit run` over small fixture workbooks"""
+    work_dir = tmp_path_factory.mktemp("loadtest")
+    write_fixtures(str(work_dir / "data"), teams=2, periods=2, students=8, seed=2)
+    process, url = start_server(app_secrets(str(work_dir / "data"), str(work_dir)), str(work_dir))
+    yield process, url
+    stop_server(process)
+
+def test_secrets_file_reads_back(tmp_path):
+    secrets = app_secrets(str(tmp_path / "data"), str(tmp_path))
+    path = str(tmp_path / ".streamlit" / "secrets.toml")
+
+    write_secrets(secrets, path)
+
+    assert load_secrets(path) == secrets
+
+def test_run_level_drives_concurrent_sessions(server):
+    process, url = server
+
+    level = run_level(url, sessions=2, iterations=1, seed=0, timeout=120, server_pid=process.pid)
+
+    assert level["errors"] == 0, level["error_samples"]
+    assert set(level["steps"]) >= {"open", "switch view"} | {name for name, _, _ in SCENARIO}
+    assert level["reruns"] >= 2 * (1 + len(SCENARIO))
+    assert level["p95_ms"] >= level["p50_ms"] > 0
+    assert level["rss_mb"] > 0
+
+def test_compare_flags_p95_regressions_beyond_the_tolerance():
+    baseline = {"levels": [{"sessions": 1, "p95_ms": 100.0}, {"sessions": 4, "p95_ms": 400.0}]}
+    results = {"levels": [
+        {"sessions": 1, "p95_ms": 115.0},
+        {"sessions": 4, "p95_ms": 500.0},
+        {"sessions": 8, "p95_ms": 900.0},
+    ]}
+
+    regressions = compare(results, baseline, tolerance=0.2)
+
+    assert regressions == ["4 sessions: p95 500 ms vs 400 ms in the baseline"]
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from data_loader import load_dataset, subject_columns
+from history_store import HistoryStore
+from rankings import compute_rankings, earlier_positions, period_numbers, rank_changes
+from settings import create_data_source, get_file_ids
+
+
+def test_earlier_positions_give_the_first_period_its_rank_change(dataset):
+    df = dataset.df_main
+    latest = df["Period"] == df["Period"].max()
+    full = compute_rankings(df, subject_columns)
+
+    later = compute_rankings(df[latest], subject_columns, earlier_positions(df[~latest], subject_columns))
+
+    assert later["Rank Change"].notna().any()
+    pd.testing.assert_series_equal(later["Rank Change"], full.loc[latest, "Rank Change"])
+
+def test_oldest_open_period_counts_rank_change_from_history(dataset, secrets, tmp_path):
+    history = HistoryStore(str(tmp_path / "history"), open_periods=2)
+
+    with_history = load_dataset(
+        create_data_source(secrets), get_file_ids(secrets), secrets["teams"], secrets["ingest"], history,
+    )
+
+    assert history.closed_partitions()
+    key = ["Student ID", "Period"]
+    expected = dataset.df_main[key].join(dataset.rankings["Rank Change"])
+    actual = with_history.df_main[key].join(with_history.rankings["Rank Change"])
+    merged = actual.merge(expected, on=key, suffixes=("", " (all periods)"))
+    assert len(merged) == len(actual)
+    assert merged["Rank Change"].notna().sum() == merged["Rank Change (all periods)"].notna().sum()
+    assert (merged["Rank Change"].fillna(0) == merged["Rank Change (all periods)"].fillna(0)).all()
+
+def test_period_labels_are_ordered_numbers_first_then_text():
+    periods = pd.Series(["2.1", "Term 2 2024", "1.2", "Term 1 2024", None, "2.10", " "])
+
+    assert period_numbers(periods).tolist() == [2.0, 4.0, 1.0, 3.0, 0.0, 2.0, 0.0]
+
+def test_rank_changes_follow_text_period_labels():
+    students = pd.Series(["S-1", "S-2", "S-1", "S-2"])
+    periods = pd.Series(["Term 1 2024", "Term 1 2024", "Term 2 2024", "Term 2 2024"])
+    positions = pd.Series([1, 2, 2, 1])
+    earlier = rank_changes(students[2:], periods[2:], positions[2:], earlier=pd.DataFrame({
+        "student": students[:2], "period": periods[:2], "position": positions[:2].astype("float64"),
+    }))
+
+    assert rank_changes(students, periods, positions).tolist() == [pd.NA, pd.NA, -1, 1]
+    assert earlier.tolist() == [-1, 1]
@@ -0,0 +1,124 @@
+import os
+import pickle
+import time
+
+from refresher import DataRefresher, Snapshot
+from settings import create_refresher
+
+
+def wait_for(condition, timeout=30):
+    """Poll condition until it holds; False when the timeout is up"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class FakeLoader:
+    """load_fn returning numbered datasets, failing on the loads listed in fail"""
+
+    def __init__(self, fail=()):
+        self.calls = 0
+        self.previous = []
+        self.fail = set(fail)
+
+    def __call__(self, previous):
+        self.calls += 1
+        self.previous.append(previous)
+        if self.calls in self.fail:
+            raise RuntimeError(f"load {self.calls} failed")
+        return {"load": self.calls}
+
+
+def test_refresh_swaps_in_a_new_snapshot():
+    loader = FakeLoader()
+    refresher = DataRefresher(loader, poll_seconds=0.05).start()
+    try:
+        first = refresher.wait_for_snapshot(timeout=10)
+        assert first.dataset == {"load": 1}
+        assert first.version == 1
+
+        refresher.refresh_now()
+        assert wait_for(lambda: refresher.get_snapshot().version == 2)
+        assert refresher.get_snapshot().dataset == {"load": 2}
+        assert loader.previous == [None, {"load": 1}]
+        assert refresher.status()["state"] == "ok"
+    finally:
+        refresher.stop()
+
+def test_failed_refresh_keeps_the_last_good_snapshot():
+    loader = FakeLoader(fail={2})
+    refresher = DataRefresher(loader, poll_seconds=0.05).start()
+    try:
+        good = refresher.wait_for_snapshot(timeout=10)
+        refresher.refresh_now()
+        assert wait_for(lambda: refresher.status()["state"] == "error")
+
+        assert refresher.get_snapshot() is good
+        assert refresher.status()["last_error"] == "load 2 failed"
+    finally:
+        refresher.stop()
+
+def test_first_load_failure_leaves_no_snapshot():
+    refresher = DataRefresher(FakeLoader(fail={1}), poll_seconds=10).start()
+    try:
+        assert refresher.wait_for_snapshot(timeout=10) is None
+        assert refresher.status()["state"] == "error"
+    finally:
+        refresher.stop()
+
+def test_source_revision_change_triggers_a_refresh():
+    revisions = {"team": "1"}
+    refresher = DataRefresher(FakeLoader(), revision_fn=lambda: dict(revisions), poll_seconds=0.05).start()
+    try:
+        assert refresher.wait_for_snapshot(timeout=10).revisions == {"team": "1"}
+        time.sleep(0.2)
+        assert refresher.get_snapshot().version == 1
+
+        revisions["team"] = "2"
+        assert wait_for(lambda: refresher.get_snapshot().version == 2)
+        assert refresher.get_snapshot().revisions == {"team": "2"}
+    finally:
+        refresher.stop()
+
+def test_restart_serves_the_persisted_snapshot(tmp_path):
+    cache_path = str(tmp_path / "snapshot.pkl")
+    refresher = DataRefresher(FakeLoader(), cache_path=cache_path).start()
+    refresher.wait_for_snapshot(timeout=10)
+    # The snapshot is written to disk just after it is swapped in
+    assert wait_for(lambda: os.path.exists(cache_path))
+    refresher.stop()
+
+    restarted = DataRefresher(FakeLoader(), cache_path=cache_path)
+
+    assert restarted.get_snapshot().dataset == {"load": 1}
+    assert restarted.status()["state"] == "restored"
+
+def test_restart_discards_a_snapshot_in_another_format(tmp_path):
+    cache_path = str(tmp_path / "snapshot.pkl")
+    old = Snapshot(dataset={"load": "old"}, version=7)
+    # A snapshot written before the format was recorded
+    del old.format_version
+    with open(cache_path, "wb") as f:
+        pickle.dump(old, f)
+
+    restarted = DataRefresher(FakeLoader(), cache_path=cache_path)
+
+    assert restarted.get_snapshot() is None
+    restarted.start()
+    assert restarted.wait_for_snapshot(timeout=10).dataset == {"load": 1}
+    assert restarted.get_snapshot().version == 1
+    restarted.stop()
+
+def test_refresher_loads_workbooks_from_a_local_source(secrets):
+    refresher = create_refresher(secrets).start()
+    try:
+        snapshot = refresher.wait_for_snapshot(timeout=120)
+        assert snapshot is not None, refresher.status()["last_error"]
+        df = snapshot.dataset.df_main
+        assert sorted(df["Team Name"].unique()) == ["Team 1", "Team 2"]
+        assert len(df) == 2 * 3 * 12
+    finally:
+        refresher.stop()
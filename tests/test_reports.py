@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import reports
+from data_loader import load_dataset, subject_columns
+from history_store import HistoryStore
+from reports import build_report_payloads, render_student_report
+from settings import create_data_source, get_file_ids
+from student_profiles import build_student_index
+
+
+def payloads(dataset, students, history=None):
+    df = dataset.df_main
+    return list(build_report_payloads(df, students, build_student_index(df), dataset.progress, dataset.rankings,
+                                      subject_columns, static=False, history=history))
+
+def test_report_progress_includes_closed_history_periods(dataset, secrets, tmp_path):
+    history = HistoryStore(str(tmp_path / "history"), open_periods=1)
+    with_history = load_dataset(
+        create_data_source(secrets), get_file_ids(secrets), secrets["teams"], secrets["ingest"], history,
+    )
+    students = sorted(build_student_index(with_history.df_main))[:3]
+
+    open_only = payloads(with_history, students)
+    merged = payloads(with_history, students, history=history.load_students(students))
+    expected = payloads(dataset, students)
+
+    assert all(len(payload["progress"]) == 1 for payload in open_only)
+    for payload, current, full in zip(merged, open_only, expected):
+        assert payload["progress"]["Period"].tolist() == full["progress"]["Period"].tolist()
+        assert payload["progress"]["Overall %"].tolist() == full["progress"]["Overall %"].tolist()
+        # Detailed records stay the open periods', as on the student page
+        assert len(payload["records"]) == len(current["records"])
+
+def test_report_renders_the_progress_trend(dataset):
+    student = sorted(build_student_index(dataset.df_main))[0]
+
+    file_name, page = render_student_report(payloads(dataset, [student])[0])
+
+    assert file_name.endswith(".html")
+    assert b"Overall Performance Trend" in page
+
+class BreakingPool:
+    """Pool that renders in process and breaks on the submit after `breaks_after` tasks"""
+
+    def __init__(self, breaks_after):
+        self.breaks_after = breaks_after
+        self.submitted = 0
+
+    def submit(self, fn, payload):
+        if self.submitted == self.breaks_after:
+            raise BrokenProcessPool("worker killed")
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(payload))
+        return future
+
+@pytest.mark.parametrize("breaks_after", [0, 1, 5])
+def test_every_student_gets_a_report_when_the_pool_breaks(dataset, monkeypatch, breaks_after):
+    monkeypatch.setattr(reports, "get_pool", lambda processes: BreakingPool(breaks_after))
+    monkeypatch.setattr(reports, "discard_pool", lambda: None)
+    students = sorted(build_student_index(dataset.df_main))[:8]
+
+    rendered = [file_name for file_name, _ in reports.render_reports(payloads(dataset, students), processes=2)]
+
+    assert rendered == [payload["file_name"] for payload in payloads(dataset, students)]
@@ -0,0 +1,84 @@
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sheet_parser
+from data_loader import clean_team_sheet
+from sheet_parser import parse_workbook, parse_workbook_serial
+
+
+@pytest.fixture(scope="module")
+def workbook():
+    """Workbook bytes with sheets of different sizes and mixed number/text columns"""
+    buffer = io.BytesIO()
+    rng = np.random.default_rng(3)
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for i, period in enumerate(["1.1", "1.2", "2.1", "2.2", "3.1"]):
+            rows = 5 + 10 * i
+            scores = rng.integers(1, 100, size=rows).astype(object)
+            scores[::4] = "N.A."
+            pd.DataFrame({
+                "Student": [f"Student {j}" for j in range(rows)],
+                "Period": period,
+                "Maths": scores,
+                "M%": rng.uniform(20, 90, size=rows).round(2),
+            }).to_excel(writer, sheet_name=period, index=False)
+    return buffer.getvalue()
+
+def assert_same_sheets(actual, expected):
+    assert list(actual) == list(expected)
+    for sheet_name in expected:
+        pd.testing.assert_frame_equal(actual[sheet_name], expected[sheet_name])
+
+def test_pool_parsing_matches_serial_parsing(workbook):
+    serial = parse_workbook_serial(workbook, clean_team_sheet, ("Team 1",))
+
+    parallel = parse_workbook(workbook, clean_team_sheet, ("Team 1",), processes=2)
+
+    assert_same_sheets(parallel, serial)
+    assert (serial["1.1"]["Maths"] == "Not Appeared").any()
+
+class BreakingPool:
+    """Pool that parses in process, breaking on submit or on the result of the task after `breaks_after`"""
+
+    def __init__(self, breaks_after, on_submit):
+        self.breaks_after = breaks_after
+        self.on_submit = on_submit
+        self.batches = []
+
+    def submit(self, fn, file_content, sheet_names, *args):
+        self.batches.append(sheet_names)
+        future = Future()
+        if len(self.batches) <= self.breaks_after:
+            future.set_result(fn(file_content, sheet_names, *args))
+        elif self.on_submit:
+            raise BrokenProcessPool("worker died")
+        else:
+            future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+@pytest.mark.parametrize("breaks_after", [0, 1])
+@pytest.mark.parametrize("on_submit", [True, False])
+def test_broken_pool_falls_back_to_serial_parsing(workbook, monkeypatch, breaks_after, on_submit):
+    pool = BreakingPool(breaks_after, on_submit)
+    discarded = []
+    monkeypatch.setattr(sheet_parser, "get_pool", lambda processes: pool)
+    monkeypatch.setattr(sheet_parser, "discard_pool", lambda: discarded.append(pool))
+
+    sheets = parse_workbook(workbook, clean_team_sheet, ("Team 1",), processes=2)
+
+    assert_same_sheets(sheets, parse_workbook_serial(workbook, clean_team_sheet, ("Team 1",)))
+    assert discarded == [pool]
+
+def test_each_worker_gets_one_batch_of_sheets(workbook, monkeypatch):
+    pool = BreakingPool(breaks_after=10, on_submit=True)
+    monkeypatch.setattr(sheet_parser, "get_pool", lambda processes: pool)
+
+    sheets = parse_workbook(workbook, processes=2)
+
+    assert pool.batches == [["1.1", "2.1", "3.1"], ["1.2", "2.2"]]
+    assert_same_sheets(sheets, parse_workbook_serial(workbook))
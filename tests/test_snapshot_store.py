@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import derive_dataset, subject_columns
+from rankings import compute_rankings
+from snapshot_store import SnapshotStore, diff_rows, drop_closed, summarize_diff
+from student_profiles import compute_progress
+
+
+def edited(df, rng, edits=4, removed=2, added=2):
+    """Copy of df with some scores changed, some rows removed and some rows added in a new period"""
+    new = df.copy()
+    rows = rng.choice(len(new), edits + removed + added, replace=False)
+    subjects = [col for col in subject_columns if col in new.columns] + ["M%"]
+    for row in rows[:edits]:
+        new.iloc[row, new.columns.get_loc(rng.choice(subjects))] = float(rng.integers(0, 100))
+    new = new.drop(new.index[rows[edits:edits + removed]])
+    extra = df.iloc[rows[edits + removed:]].assign(Period=9.1)
+    return pd.concat([new, extra], ignore_index=True)
+
+def test_unchanged_rows_have_an_empty_diff(dataset):
+    diff = diff_rows(dataset.df_main, dataset.df_main.copy())
+    assert summarize_diff(diff) == {"added": 0, "removed": 0, "changed": 0, "cells": 0}
+
+def test_diff_reports_added_removed_and_changed_cells(dataset):
+    df = dataset.df_main
+    scored = df.index[df["Maths"].notna()][0]
+    new = df.drop(index=df.index[-1])
+    new.loc[scored, "Maths"] = 1.0
+    new = pd.concat([new, df.iloc[[0]].assign(Period=9.1)], ignore_index=True)
+
+    diff = diff_rows(df, new)
+
+    assert summarize_diff(diff)["added"] == 1
+    assert summarize_diff(diff)["removed"] == 1
+    assert diff.removed["Student"].tolist() == [df["Student"].iloc[-1]]
+    maths = diff.cells[diff.cells["Column"] == "Maths"]
+    assert maths["Student"].tolist() == [df.loc[scored, "Student"]]
+    assert maths["Old"].tolist() == [str(df.loc[scored, "Maths"])]
+    assert maths["New"].tolist() == ["1.0"]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_update_matches_full_recompute(dataset, seed):
+    new = edited(dataset.df_main, np.random.default_rng(seed))
+
+    rankings, progress, diff, revisions = derive_dataset(new, dataset)
+
+    pd.testing.assert_frame_equal(rankings, compute_rankings(new, subject_columns), check_dtype=False)
+    pd.testing.assert_frame_equal(progress, compute_progress(new, subject_columns), check_dtype=False)
+    assert summarize_diff(diff)["added"] == 2
+    assert summarize_diff(diff)["removed"] == 2
+
+def test_revisions_change_only_for_touched_groups(dataset):
+    df = dataset.df_main
+    latest = df["Period"].max()
+    new = df.copy()
+    new.loc[new.index[new["Period"] == latest][0], "Maths"] = 1.0
+
+    _, _, _, revisions = derive_dataset(new, dataset)
+
+    changed = {group for group, revision in revisions.items() if revision != dataset.revisions[group]}
+    assert changed
+    assert {period for _, period in changed} == {str(latest)}
+
+def test_drop_closed_keeps_other_removed_rows(dataset):
+    diff = diff_rows(dataset.df_main, dataset.df_main.iloc[:0])
+
+    kept = drop_closed(diff, [("Team 1", "1.1")])
+
+    assert len(kept.removed) == len(dataset.df_main) - ((dataset.df_main["Team Name"] == "Team 1") & (dataset.df_main["Period"] == 1.1)).sum()
+
+def test_store_keeps_the_latest_versions(dataset, tmp_path):
+    store = SnapshotStore(str(tmp_path), keep=2)
+    for version in [1, 2, 3]:
+        store.save(version, dataset._replace(df_main=dataset.df_main.head(version)))
+
+    assert [entry["version"] for entry in store.versions()] == [2, 3]
+    assert len(store.load(3)) == 3
+    assert not list(tmp_path.glob("v1.*"))
+
+def test_store_drops_versions_in_another_format(dataset, tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.save(1, dataset._replace(df_main=dataset.df_main.head(1)))
+    # An archive written before the format was recorded
+    (tmp_path / "manifest.json").write_text('{"versions": [{"version": 1, "saved_at": 0, "rows": 1}]}')
+
+    assert store.versions() == []
+    store.save(2, dataset._replace(df_main=dataset.df_main.head(2)))
+    assert [entry["version"] for entry in store.versions()] == [2]
+    assert not list(tmp_path.glob("v1.*"))
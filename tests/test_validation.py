@@ -0,0 +1,112 @@
+import pandas as pd
+
+from identity import ID_COLUMN
+from validation import add_provenance, dedupe_high_school, summarize_anomalies, validate_rows
+
+SUBJECTS = ["Maths", "English"]
+
+
+def with_ids(df):
+    """Rows as validation gets them, with a Student ID per name"""
+    df[ID_COLUMN] = "S-" + df["Student"].astype("string").str.strip()
+    return df
+
+def team_rows(rows):
+    df = pd.DataFrame(rows, columns=["Team Name", "School", "Student", "Period", "Maths", "English", "Mean Grade"])
+    return add_provenance(with_ids(df), "Team 1 Results.xlsx", "Sheet1")
+
+def checks(anomalies):
+    return sorted(zip(anomalies["Check"], anomalies["Source Row"]))
+
+def test_clean_rows_pass_through():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 70, 80, "B+"],
+        ["Team 1", "School A", "Brian Otieno", "1.1", "Not Appeared", "", "a-"],
+    ])
+
+    cleaned, anomalies, quarantined = validate_rows(df, SUBJECTS)
+
+    assert len(cleaned) == 2
+    assert anomalies.empty
+    assert quarantined.empty
+
+def test_summary_rows_are_quarantined():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 70, 80, "B+"],
+        ["Team 1", "School A", "Category Distribution", "1.1", 5, 3, None],
+        ["Team 1", "School A", "Average", "1.1", 60, 61, None],
+    ])
+
+    cleaned, anomalies, quarantined = validate_rows(df, SUBJECTS)
+
+    assert cleaned["Student"].tolist() == ["Alice Wanjiru"]
+    assert quarantined["Student"].tolist() == ["Category Distribution", "Average"]
+    # Excel rows: the header is row 1
+    assert checks(anomalies) == [("summary_row", 3), ("summary_row", 4)]
+
+def test_duplicates_keep_the_last_row():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 50, 80, "B+"],
+        ["Team 1", "School A", "Alice Wanjiru ", "1.1", 70, 80, "B+"],
+        ["Team 1", "School B", "Alice Wanjiru", "1.1", 40, 45, "C"],
+        ["Team 1", "School A", "Alice Wanjiru", "1.2", 75, 80, "B+"],
+    ])
+
+    cleaned, anomalies, quarantined = validate_rows(df, SUBJECTS)
+
+    assert cleaned["Maths"].tolist() == [70, 40, 75]
+    assert quarantined["Source Row"].tolist() == [2]
+    assert checks(anomalies) == [("duplicate", 2)]
+
+def test_bad_scores_are_cleared_cell_by_cell():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 170, "abs", "B+"],
+        ["Team 1", "School A", "Brian Otieno", "1.1", -1, 55, "B"],
+    ])
+
+    cleaned, anomalies, _ = validate_rows(df, SUBJECTS)
+
+    assert cleaned["Maths"].isna().all()
+    assert cleaned["English"].isna().tolist() == [True, False]
+    bad = anomalies[anomalies["Check"] == "bad_score"]
+    assert sorted(zip(bad["Source Row"], bad["Column"], bad["Value"])) == [
+        (2, "English", "abs"), (2, "Maths", "170"), (3, "Maths", "-1"),
+    ]
+    assert (bad["Action"] == "cleared").all()
+
+def test_unknown_grades_are_flagged_and_kept():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 70, 80, "B+"],
+        ["Team 1", "School A", "Brian Otieno", "1.1", 60, 65, "Z"],
+        ["Team 1", "School A", "Total", "1.1", 130, 145, "Q"],
+    ])
+
+    cleaned, anomalies, _ = validate_rows(df, SUBJECTS)
+
+    assert "Brian Otieno" in cleaned["Student"].tolist()
+    flagged = anomalies[anomalies["Check"] == "unknown_grade"]
+    assert flagged["Student"].tolist() == ["Brian Otieno"]
+    assert flagged["Action"].tolist() == ["flagged"]
+
+def test_high_school_duplicates_keep_the_first_row():
+    high_school = add_provenance(with_ids(pd.DataFrame({
+        "Student": ["Alice Wanjiru", "Brian Otieno", "Alice Wanjiru"],
+        "Home County": ["Nairobi", "Kisumu", "Mombasa"],
+    })), "High School Data Sheet.xlsx", "Sheet1")
+
+    deduped, anomalies = dedupe_high_school(high_school)
+
+    assert deduped["Home County"].tolist() == ["Nairobi", "Kisumu"]
+    assert anomalies["Source Row"].tolist() == [4]
+
+def test_summary_counts_anomalies_per_check():
+    df = team_rows([
+        ["Team 1", "School A", "Alice Wanjiru", "1.1", 170, 180, "B+"],
+        ["Team 1", "School A", "Total", "1.1", 70, 80, None],
+    ])
+
+    counts = summarize_anomalies(validate_rows(df, SUBJECTS)[1])
+
+    assert counts[["Check", "Count"]].values.tolist() == [
+        ["Score not a number in 0-100", 2], ["Summary row", 1],
+    ]
@@ -0,0 +1,144 @@
+"""Data-quality validation of the raw team rows at ingest.
+
+Every check is a vectorized pass over the whole frame and records its findings with
+the source file, sheet and Excel row, so a bad cell can be traced back to the
+workbook. Findings are handled in the same pass:
+
+- summary rows ("Category Distribution", "Total", "Average", ...) are quarantined
+- duplicate student/period rows are quarantined, keeping the last one
+- scores that are not numbers in 0-100 are cleared, so no aggregate counts them
+- unknown Mean Grade values and students missing from the High School Data Sheet
+  are flagged and kept
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from identity import ID_COLUMN
+from student_profiles import student_ids, student_keys, student_name_mask
+
+# Where each raw row came from; Source Row is the Excel row number
+PROVENANCE_COLUMNS = ["Source File", "Source Sheet", "Source Row"]
+
+ANOMALY_COLUMNS = PROVENANCE_COLUMNS + ["Team Name", "Student", ID_COLUMN, "Period", "Check", "Column", "Value", "Action"]
+
+KNOWN_GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "D-", "E"]
+
+CHECK_LABELS = {
+    "summary_row": "Summary row",
+    "duplicate": "Duplicate student/period",
+    "bad_score": "Score not a number in 0-100",
+    "unknown_grade": "Unknown Mean Grade",
+    "unmatched_join": "Not in High School Data Sheet",
+    "duplicate_high_school": "Duplicate in High School Data Sheet",
+}
+
+# Anomalies found at ingest and the rows taken out of the dataset because of them
+QualityReport = namedtuple("QualityReport", ["anomalies", "quarantined"])
+
+
+def add_provenance(df, file_name, sheet_name, header_rows=1):
+    """Tag parsed sheet rows with their file, sheet and Excel row number"""
+    df["Source File"] = file_name
+    df["Source Sheet"] = sheet_name
+    df["Source Row"] = np.arange(len(df)) + header_rows + 1
+    return df
+
+def _merged_column(df, name):
+    """A column that may have been split into _x/_y by a merge"""
+    if name in df.columns:
+        return df[name]
+    parts = [df[f"{name}{suffix}"] for suffix in ["_x", "_y"] if f"{name}{suffix}" in df.columns]
+    if not parts:
+        return pd.Series(pd.NA, index=df.index, dtype=object)
+    return parts[0].combine_first(parts[1]) if len(parts) == 2 else parts[0]
+
+def anomaly_rows(df, mask, check, column, values, action):
+    """One anomaly record per masked row of df"""
+    rows = df.loc[mask]
+    records = pd.DataFrame(index=rows.index)
+    for col in PROVENANCE_COLUMNS + ["Team Name", "Student", ID_COLUMN, "Period"]:
+        records[col] = rows[col] if col in rows.columns else pd.NA
+    records["Check"] = check
+    records["Column"] = column
+    records["Value"] = values[mask].astype("string") if values is not None else pd.NA
+    records["Action"] = action
+    return records
+
+def bad_score_cells(df, subjects):
+    """Boolean frame of subject cells holding something other than a 0-100 score, blank or "Not Appeared" """
+    existing = [subject for subject in subjects if subject in df.columns]
+    raw = df[existing]
+    text = raw.astype("string").apply(lambda col: col.str.strip())
+    numeric = raw.apply(pd.to_numeric, errors="coerce")
+    present = raw.notna() & text.ne("").fillna(False) & text.ne("Not Appeared").fillna(False)
+    return present & ~((numeric >= 0) & (numeric <= 100))
+
+def validate_rows(df, subjects):
+    """Run every row check on raw team rows.
+
+    Returns the cleaned frame (index reset), the anomaly records and the quarantined rows.
+    """
+    df = df.reset_index(drop=True)
+    found = []
+    names = df["Student"] if "Student" in df.columns else pd.Series(pd.NA, index=df.index, dtype=object)
+    named = (names.notna() & (names.astype("string").str.strip() != "")).fillna(False).astype(bool)
+
+    summary = named & ~student_name_mask(names)
+    found.append(anomaly_rows(df, summary, "summary_row", "Student", names, "quarantined"))
+
+    duplicate = pd.Series(False, index=df.index)
+    if "Period" in df.columns:
+        keys = pd.DataFrame({
+            "team": _merged_column(df, "Team Name").astype(str),
+            "school": _merged_column(df, "School").astype(str),
+            "student": student_ids(df).fillna(student_keys(names)) if "Student" in df.columns else pd.NA,
+            "period": df["Period"].astype(str),
+        })
+        # The last row wins, as it did in the progress trend
+        duplicate = named & ~summary & keys.duplicated(keep="last")
+        found.append(anomaly_rows(df, duplicate, "duplicate", "Student", names, "quarantined"))
+
+    bad = bad_score_cells(df, subjects)
+    cells = bad.stack()
+    cells = cells[cells].index
+    if len(cells):
+        # One record per bad cell; rows are positions since the index was reset
+        rows, columns = cells.get_level_values(0), cells.get_level_values(1)
+        records = anomaly_rows(df, df.index.isin(rows), "bad_score", None, None, "cleared").loc[rows]
+        records["Column"] = columns.to_numpy()
+        records["Value"] = pd.Series(df[bad.columns].to_numpy()[rows, bad.columns.get_indexer(columns)]).astype("string").to_numpy()
+        found.append(records)
+        df[bad.columns] = df[bad.columns].mask(bad)
+
+    if "Mean Grade" in df.columns:
+        grades = df["Mean Grade"].astype("string").str.strip().str.upper()
+        unknown = (grades.notna() & (grades != "") & ~grades.isin(KNOWN_GRADES)).fillna(False).astype(bool)
+        found.append(anomaly_rows(df, unknown & ~summary, "unknown_grade", "Mean Grade", df["Mean Grade"], "flagged"))
+
+    quarantine = summary | duplicate
+    anomalies = pd.concat([frame for frame in found if not frame.empty] or [pd.DataFrame(columns=ANOMALY_COLUMNS)], ignore_index=True)
+    return df[~quarantine].reset_index(drop=True), anomalies[ANOMALY_COLUMNS], df[quarantine]
+
+def dedupe_high_school(high_school_df):
+    """Drop repeated students from the High School Data Sheet so the join cannot multiply rows"""
+    keys = student_ids(high_school_df)
+    duplicate = keys.notna() & keys.duplicated(keep="first")
+    anomalies = anomaly_rows(high_school_df, duplicate, "duplicate_high_school", "Student", high_school_df["Student"], "ignored")
+    return high_school_df[~duplicate], anomalies
+
+def unmatched_join_rows(df, matched):
+    """Anomalies for real student rows that found no match in the High School Data Sheet"""
+    names = df["Student"]
+    return anomaly_rows(df, ~matched & student_name_mask(names), "unmatched_join", "Student", names, "flagged")
+
+def summarize_anomalies(anomalies):
+    """Anomaly counts per file, sheet, check and action"""
+    if anomalies.empty:
+        return pd.DataFrame(columns=["Source File", "Source Sheet", "Check", "Action", "Count"])
+    keys = ["Source File", "Source Sheet", "Check", "Action"]
+    counts = anomalies.fillna({"Source File": "", "Source Sheet": ""}).groupby(keys, dropna=False).size()
+    counts = counts.rename("Count").reset_index()
+    counts["Check"] = counts["Check"].map(CHECK_LABELS).fillna(counts["Check"])
+    return counts.sort_values("Count", ascending=False, kind="stable").reset_index(drop=True)